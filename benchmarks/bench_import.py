@@ -0,0 +1,64 @@
+"""
+Cold import benchmark.
+Every measurement runs in a fresh interpreter, reports median seconds of `import quickbe`, of the first
+AWS Lambda request and of importing the web server. Exits with error when cold import is over budget.
+
+    PYTHONPATH=. python benchmarks/bench_import.py [budget milliseconds]
+"""
+import sys
+import statistics
+import subprocess
+
+RUNS = 7
+DEFAULT_BUDGET_MS = 200
+
+TIMER = '''
+import time
+_start = time.perf_counter()
+{statement}
+print(time.perf_counter() - _start)
+'''
+
+LAMBDA_REQUEST = '''
+from quickbe import endpoint, HttpSession, aws_lambda_handler
+
+@endpoint(path='bench', validation={'name': {'type': 'string', 'default': 'world'}})
+def bench(session: HttpSession):
+    return {'hello': session.get('name')}
+
+aws_lambda_handler(event={'path': 'bench', 'body': None})
+'''
+
+CASES = {
+    'import quickbe': 'import quickbe',
+    'first lambda request': LAMBDA_REQUEST,
+    'import web server': 'from quickbe import WebServer',
+}
+
+
+def measure(statement: str, runs: int = RUNS) -> float:
+    """
+    Median seconds of a statement, each run in a fresh interpreter
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', TIMER.format(statement=statement)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    results = {name: measure(statement=statement) for name, statement in CASES.items()}
+    for name, seconds in results.items():
+        print(f'{name:<22} {seconds * 1000:8.2f} ms')
+    if results['import quickbe'] * 1000 > budget_ms:
+        print(f'Cold import is over budget ({budget_ms} ms)')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
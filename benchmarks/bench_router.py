@@ -0,0 +1,65 @@
+"""
+Router lookup benchmark.
+Registers a few thousand routes and compares the radix tree router with a linear scan over compiled regular
+expressions (what a list of routes would cost).
+
+    PYTHONPATH=. python benchmarks/bench_router.py
+"""
+import re
+import timeit
+from quickbe.router import Router
+
+ROUTES_COUNT = 1500
+LOOKUPS = 20000
+
+
+def build_routes(count: int) -> list:
+    routes = []
+    for i in range(count):
+        if i % 3 == 0:
+            routes.append(f'service{i}/items')
+        elif i % 3 == 1:
+            routes.append(f'service{i}/items/<int:item_id>')
+        else:
+            routes.append(f'service{i}/users/<user_id>/orders/<int:order_id>')
+    return routes
+
+
+def to_regex(path: str):
+    pattern = re.sub(r'<int:[^>]+>', r'(\\d+)', path)
+    pattern = re.sub(r'<[^>]+>', r'([^/]+)', pattern)
+    return re.compile(f'^{pattern}$')
+
+
+def main():
+    routes = build_routes(count=ROUTES_COUNT)
+    router = Router()
+    for path in routes:
+        router.add(path, path)
+    regexes = [(to_regex(path), path) for path in routes]
+
+    last = ROUTES_COUNT - 1
+    requests = {
+        'static (first)': 'service0/items',
+        'static (last)': f'service{last - last % 3}/items',
+        'dynamic (last)': f'service{last}/users/john/orders/12',
+    }
+
+    def linear(path: str):
+        for regex, value in regexes:
+            if regex.match(path):
+                return value
+
+    print(f'Registered routes: {len(router)}, lookups per case: {LOOKUPS}')
+    for name, path in requests.items():
+        assert router.match(path)[0] is not None
+        tree_seconds = timeit.timeit(lambda: router.match(path), number=LOOKUPS)
+        linear_seconds = timeit.timeit(lambda: linear(path), number=LOOKUPS // 100) * 100
+        print(
+            f'{name:<16} radix: {tree_seconds / LOOKUPS * 1e6:8.2f} us/lookup   '
+            f'linear scan: {linear_seconds / LOOKUPS * 1e6:8.2f} us/lookup'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+HttpSession allocation benchmark.
+Measures memory allocated (tracemalloc) and time per request through the web server, for a request that a
+web filter rejects by a query parameter, and for a request that is validated and executed.
+Body JSON is parsed only when the endpoint (or a filter) reads a body field.
+
+    PYTHONPATH=. python benchmarks/bench_session.py
+"""
+import json
+import timeit
+import warnings
+import tracemalloc
+from quickbe import WebServer, HttpSession, endpoint
+
+ITERATIONS = 2000
+
+BODY = json.dumps({'text': 'Hello', 'items': [{'id': i, 'name': f'item {i}'} for i in range(200)]})
+
+
+@endpoint(path='bench/items', validation={'text': {'type': 'string', 'required': True}})
+def items(session: HttpSession):
+    return {'count': len(session.get('items'))}
+
+
+def persona_non_grata(session: HttpSession):
+    if session.get('name', '').lower() == 'sauron':
+        session.set_status(401)
+        return 'You are not welcome here!'
+
+
+CASES = {
+    'rejected by filter': '/bench/items?name=sauron',
+    'executed': '/bench/items?name=frodo',
+}
+
+
+def measure_allocations(func, runs: int = 200) -> (float, float):
+    """
+    :return: Tuple of average allocated KB and allocated blocks per call
+    """
+    func()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(runs):
+        func()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    # Allocations that were freed are not in snapshots, peak usage covers them
+    return size / runs / 1024, blocks / runs
+
+
+def measure_peak(func, runs: int = 200) -> float:
+    """
+    :return: Average peak KB allocated while a call runs
+    """
+    func()
+    total = 0
+    for _ in range(runs):
+        tracemalloc.start()
+        func()
+        total += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return total / runs / 1024
+
+
+def main():
+    warnings.simplefilter('ignore', UserWarning)
+    WebServer.web_filters.append(persona_non_grata)
+    client = WebServer.app.test_client()
+
+    print(f'Body size: {len(BODY)} bytes, iterations: {ITERATIONS}')
+    for name, url in CASES.items():
+        def request():
+            return client.post(url, data=BODY, content_type='application/json')
+        seconds = timeit.timeit(request, number=ITERATIONS)
+        peak_kb = measure_peak(request)
+        retained_kb, blocks = measure_allocations(request)
+        print(
+            f'{name:<20} {seconds / ITERATIONS * 1e6:8.1f} us   peak: {peak_kb:8.1f} KB   '
+            f'retained: {retained_kb:6.2f} KB ({blocks:.1f} blocks)'
+        )
+
+    session = HttpSession(parameters={'name': 'sauron'}, body_loader=lambda: json.loads(BODY))
+    print(f'HttpSession has __dict__: {hasattr(session, "__dict__")}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Validation benchmark.
+Compares Cerberus validate() + normalized() (what every request used to do) with the compiled schema,
+using the nested `echo` schema from examples/run_web_server.py.
+
+    PYTHONPATH=. python benchmarks/bench_validation.py
+"""
+import timeit
+import warnings
+from quickbe import EndPointValidator
+from quickbe.schema import compile_schema
+
+ITERATIONS = 5000
+
+ECHO_SCHEMA = {
+    'text': {'required': True, 'type': 'string', 'doc': 'Some text to echo', 'example': 'Hello world'},
+    'name': {'required': False, 'type': 'string', 'doc': 'Name, just for testing', 'example': 'John Doe'},
+    'age': {'required': False, 'type': 'integer', 'doc': 'Persons age', 'example': 42},
+    'other_info': {
+        'doc': 'Other info for this person',
+        'type': 'dict',
+        'allow_unknown': False,
+        'required': True,
+        'schema': {
+            'address': {'type': 'string', 'required': True},
+            'description': {'type': 'string', 'required': True},
+            'zip_code': {'type': 'integer', 'default': -1, 'example': 1234567},
+        }
+    }
+}
+
+DOCUMENTS = {
+    'valid': {'text': 'Hello', 'name': 'John', 'age': 42, 'other_info': {'address': 'Main st.', 'description': 'd'}},
+    'invalid': {'text': 5, 'age': 'old', 'other_info': {'address': 'Main st.'}},
+}
+
+
+def main():
+    warnings.simplefilter('ignore', UserWarning)
+    validator = EndPointValidator.for_endpoint(schema=ECHO_SCHEMA)
+    compiled = compile_schema(schema=ECHO_SCHEMA)
+
+    def cerberus(document: dict):
+        if validator.validate(document):
+            return validator.normalized(document)
+        return validator.errors
+
+    print(f'Iterations: {ITERATIONS}')
+    for name, document in DOCUMENTS.items():
+        cerberus_seconds = timeit.timeit(lambda: cerberus(document), number=ITERATIONS)
+        compiled_seconds = timeit.timeit(lambda: compiled(document), number=ITERATIONS)
+        print(
+            f'{name:<8} cerberus: {cerberus_seconds / ITERATIONS * 1e6:8.2f} us   '
+            f'compiled: {compiled_seconds / ITERATIONS * 1e6:8.2f} us   '
+            f'speedup: x{cerberus_seconds / compiled_seconds:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
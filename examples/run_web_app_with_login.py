@@ -1,13 +1,9 @@
 import os
 import pathlib
 import datetime
-import requests
 from cachetools import TTLCache
 from dotenv import load_dotenv
-from google.oauth2 import id_token
-from pip._vendor import cachecontrol
-import google.auth.transport.requests
-from quickbe.oauth import get_authorization_flow
+from quickbe.oauth import get_authorization_flow, TokenVerifier
 from flask import redirect, request
 from quickbe import WebServer, HttpSession, endpoint, Log, get_env_var
 
@@ -29,6 +25,7 @@ HELLO_PAGE_HTML = """
 client_secrets_file = os.path.join(pathlib.Path(__file__).parent, "client_secret.json")
 
 AUTHORIZATION_FLOW = get_authorization_flow()
+TOKEN_VERIFIER = TokenVerifier(audience=GOOGLE_CLIENT_ID)
 
 WebServer.app.secret_key = os.getenv("APP_SECRET_KEY")
 Log.info(f'App secret key: {WebServer.app.secret_key}')
@@ -81,15 +78,8 @@ def oauth_filter(h_session: HttpSession):
     try:
         user_token = get_user_token(h_session=h_session)
         credentials = AUTHORIZATION_FLOW.credentials
-        request_session = requests.session()
-        cached_session = cachecontrol.CacheControl(request_session)
-        token_request = google.auth.transport.requests.Request(session=cached_session)
-
-        id_info = id_token.verify_oauth2_token(
-            id_token=credentials._id_token,
-            request=token_request,
-            audience=GOOGLE_CLIENT_ID
-        )
+        # Signing keys and verified tokens are cached, no network call on most requests
+        id_info = TOKEN_VERIFIER.verify(token=credentials._id_token)
         if user_token not in users_session_token:
             raise KeyError('State does not match')
         h_session.response.headers['user-name'] = id_info.get("name")
@@ -102,5 +92,5 @@ def oauth_filter(h_session: HttpSession):
 
 
 if __name__ == '__main__':
-    WebServer.add_filter(oauth_filter)
+    WebServer.add_filter(oauth_filter, paths=['hello', 'logout'])
     WebServer.start()
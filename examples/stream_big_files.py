@@ -1,5 +1,4 @@
 import uuid
-from flask import stream_with_context, Response
 from quickbe import WebServer, HttpSession, endpoint, Log
 
 BIG_FILES_FOLDER = '/tmp'
@@ -7,14 +6,12 @@ BIG_FILES_FOLDER = '/tmp'
 
 @endpoint(path='download')
 def stream_file(session: HttpSession):
-    file_name = session.get_parameter('file_name')
+    file_name = session.get('file_name')
     suggested_file_name = f'{uuid.uuid4()}_{file_name}'
-    headers = {
-        'x-filename': suggested_file_name,
-        'X-Suggested-Filename': suggested_file_name,
-        'Access-Control-Expose-Headers': 'x-filename',
-        'Content-Disposition': f'attachment; filename="{suggested_file_name}"'
-    }
+    session.set_response_header('x-filename', suggested_file_name)
+    session.set_response_header('X-Suggested-Filename', suggested_file_name)
+    session.set_response_header('Access-Control-Expose-Headers', 'x-filename')
+    session.set_response_header('Content-Disposition', f'attachment; filename="{suggested_file_name}"')
 
     Log.debug(f'Downloading {file_name}')
 
@@ -23,7 +20,16 @@ def stream_file(session: HttpSession):
             for line in f:
                 yield line
 
-    return Response(stream_with_context(get_file_content()), mimetype='text/csv', headers=headers)
+    session.stream(mimetype='text/csv')
+    return get_file_content()
+
+
+@endpoint(path='export')
+def export_rows(session: HttpSession):
+    rows = int(session.get('rows', 1000000))
+    # Rows are encoded and sent as they are produced, the result set is never in memory at once
+    session.stream(encoder=session.get('format', 'ndjson'))
+    return ({'id': i, 'name': f'row {i}'} for i in range(rows))
 
 
 if __name__ == '__main__':
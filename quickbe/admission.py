@@ -0,0 +1,303 @@
+import os
+import math
+import time
+import ctypes
+import random
+import hashlib
+import multiprocessing
+from threading import Lock
+from multiprocessing.sharedctypes import RawArray
+
+QUICKBE_RATE_LIMIT_KEY = 'QUICKBE_RATE_LIMIT'
+QUICKBE_RATE_LIMIT_BURST_KEY = 'QUICKBE_RATE_LIMIT_BURST'
+QUICKBE_RATE_LIMIT_BY_KEY = 'QUICKBE_RATE_LIMIT_BY'
+QUICKBE_RATE_LIMIT_SLOTS_KEY = 'QUICKBE_RATE_LIMIT_SLOTS'
+QUICKBE_SHED_MAX_IN_FLIGHT_KEY = 'QUICKBE_SHED_MAX_IN_FLIGHT'
+QUICKBE_SHED_MAX_LATENCY_MS_KEY = 'QUICKBE_SHED_MAX_LATENCY_MS'
+
+CLIENT_BY_IP = 'ip'
+CLIENT_BY_DEVKEY = 'devkey'
+CLIENT_BY_HEADER_PREFIX = 'header:'
+
+# Requests per second of a single client, 0 turns client rate limit off
+CLIENT_RATE_LIMIT = float(os.getenv(QUICKBE_RATE_LIMIT_KEY, 0))
+CLIENT_RATE_LIMIT_BURST = float(os.getenv(QUICKBE_RATE_LIMIT_BURST_KEY, 0)) or max(CLIENT_RATE_LIMIT, 1)
+# How clients are told apart: `ip`, `devkey` parameter or `header:<name>` (e.g `header:X-Api-Key`)
+CLIENT_RATE_LIMIT_BY = os.getenv(QUICKBE_RATE_LIMIT_BY_KEY, CLIENT_BY_IP)
+BUCKET_SLOTS = int(os.getenv(QUICKBE_RATE_LIMIT_SLOTS_KEY, 4096))
+# In-flight requests of a process above which new requests are shed, 0 turns it off
+SHED_MAX_IN_FLIGHT = int(os.getenv(QUICKBE_SHED_MAX_IN_FLIGHT_KEY, 0))
+# Average request latency above which requests are shed (some still run to measure it), 0 turns it off
+SHED_MAX_LATENCY_SECONDS = float(os.getenv(QUICKBE_SHED_MAX_LATENCY_MS_KEY, 0)) / 1000
+
+# Buckets are looked up in this many slots from the key hash, a full neighborhood drops the idlest bucket
+BUCKET_PROBES = 8
+# A bucket lock that is not released (e.g worker killed while holding it) admits requests rather than blocking
+BUCKET_LOCK_TIMEOUT_SECONDS = 0.1
+LATENCY_SMOOTHING = 0.1
+# Latency that was not measured in this time is out of date, requests are not shed by it
+LATENCY_MAX_AGE_SECONDS = 1
+
+RATE_LIMITED_STATUS = 429
+OVERLOADED_STATUS = 503
+RETRY_AFTER_HEADER = 'Retry-After'
+
+
+class _Bucket(ctypes.Structure):
+    _fields_ = [
+        ('key', ctypes.c_uint64),
+        ('tokens', ctypes.c_double),
+        ('updated_at', ctypes.c_double),
+    ]
+
+
+class TokenBuckets:
+    """
+    Token buckets in a fixed size hash table in shared memory. Tables that are created before pre-fork workers
+    start are shared by all workers, so limits apply to the server and not to every worker.
+    """
+
+    def __init__(self, slots: int = BUCKET_SLOTS):
+        self.slots = max(slots, 1)
+        self._buckets = RawArray(_Bucket, self.slots)
+        self._lock = multiprocessing.Lock()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Stable in all processes, 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def _find(self, key_hash: int) -> (_Bucket, bool):
+        start = key_hash % self.slots
+        idlest = None
+        for probe in range(min(BUCKET_PROBES, self.slots)):
+            bucket = self._buckets[(start + probe) % self.slots]
+            if bucket.key == key_hash:
+                return bucket, True
+            if bucket.key == 0:
+                return bucket, False
+            if idlest is None or bucket.updated_at < idlest.updated_at:
+                idlest = bucket
+        return idlest, False
+
+    def take(self, key: str, rate: float, burst: float, now: float = None) -> float:
+        """
+        Take a token from a bucket
+        :param key: Bucket key
+        :param rate: Tokens added per second
+        :param burst: Bucket size
+        :param now: Current time (seconds since epoch)
+        :return: 0 when a token was taken, otherwise seconds until the next token
+        """
+        key_hash = self._hash(key=key)
+        now = time.time() if now is None else now
+        if not self._lock.acquire(timeout=BUCKET_LOCK_TIMEOUT_SECONDS):
+            return 0
+        try:
+            bucket, found = self._find(key_hash=key_hash)
+            if found:
+                bucket.tokens = min(burst, bucket.tokens + max(now - bucket.updated_at, 0) * rate)
+            else:
+                bucket.key = key_hash
+                bucket.tokens = burst
+            bucket.updated_at = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0
+            return (1 - bucket.tokens) / rate
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        with self._lock:
+            ctypes.memset(ctypes.addressof(self._buckets), 0, ctypes.sizeof(self._buckets))
+
+
+class RateLimit:
+    """
+    Endpoint rate limit
+    """
+
+    def __init__(self, rate: float, burst: float = None, per_client: bool = False):
+        """
+        :param rate: Requests per second
+        :param burst: Requests that may come at once, default is one second of requests
+        :param per_client: Limit every client (see QUICKBE_RATE_LIMIT_BY) separately, otherwise all requests together
+        """
+        if rate <= 0:
+            raise ValueError(f'Rate limit must be positive, got {rate}.')
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.per_client = per_client
+
+    @classmethod
+    def from_definition(cls, definition):
+        """
+        :param definition: RateLimit, dict of RateLimit arguments or requests per second
+        """
+        if isinstance(definition, RateLimit):
+            return definition
+        if isinstance(definition, dict):
+            return cls(**definition)
+        if isinstance(definition, (int, float)) and not isinstance(definition, bool):
+            return cls(rate=definition)
+        raise TypeError(f'Rate limit must be RateLimit, dict or number, got {type(definition)}.')
+
+
+class LoadTracker:
+    """
+    In-flight requests and smoothed latency of this process, shed requests by them
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.in_flight = 0
+        self.latency = 0.0
+        self.measured_at = 0.0
+        self.shed = 0
+        self.rate_limited = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, seconds: float):
+        with self._lock:
+            self.in_flight -= 1
+            self.latency += (seconds - self.latency) * LATENCY_SMOOTHING
+            self.measured_at = time.monotonic()
+
+    def is_overloaded(self) -> bool:
+        if 0 < SHED_MAX_IN_FLIGHT <= self.in_flight:
+            return True
+        if SHED_MAX_LATENCY_SECONDS <= 0 or self.latency <= SHED_MAX_LATENCY_SECONDS:
+            return False
+        if time.monotonic() - self.measured_at > LATENCY_MAX_AGE_SECONDS:
+            return False
+        # Admit part of requests, the slower the server the fewer, so latency keeps being measured
+        return random.random() > SHED_MAX_LATENCY_SECONDS / self.latency
+
+    def count(self, status: int):
+        with self._lock:
+            if status == RATE_LIMITED_STATUS:
+                self.rate_limited += 1
+            else:
+                self.shed += 1
+
+    def status(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'latency_ms': self.latency * 1000,
+            'shed': self.shed,
+            'rate_limited': self.rate_limited,
+        }
+
+
+class _Tracking:
+
+    __slots__ = ('_start',)
+
+    def __enter__(self):
+        LOAD.started()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        LOAD.finished(seconds=time.perf_counter() - self._start)
+        return False
+
+
+# Created on import, before pre-fork workers start, so workers share them
+BUCKETS = TokenBuckets()
+LOAD = LoadTracker()
+
+
+def _reset_after_fork():
+    """
+    Load is measured per process, buckets stay shared
+    """
+    global LOAD
+    LOAD = LoadTracker()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def track() -> _Tracking:
+    """
+    Count a request as in-flight and measure its latency, use as context manager
+    """
+    return _Tracking()
+
+
+def load_status() -> dict:
+    """
+    Load of this process and requests rejected by admission control, for server status endpoint
+    """
+    return LOAD.status()
+
+
+def client_key(remote_addr: str, headers, parameters) -> str:
+    """
+    Client identity for rate limits, by QUICKBE_RATE_LIMIT_BY (IP when the parameter or header is missing)
+    """
+    if CLIENT_RATE_LIMIT_BY == CLIENT_BY_DEVKEY:
+        value = parameters.get(CLIENT_BY_DEVKEY)
+    elif CLIENT_RATE_LIMIT_BY.startswith(CLIENT_BY_HEADER_PREFIX):
+        value = headers.get(CLIENT_RATE_LIMIT_BY[len(CLIENT_BY_HEADER_PREFIX):])
+    else:
+        value = None
+    return f'{CLIENT_RATE_LIMIT_BY}:{value}' if value else f'ip:{remote_addr}'
+
+
+def _reject(status: int, retry_after: float) -> tuple:
+    LOAD.count(status=status)
+    body = 'Too many requests' if status == RATE_LIMITED_STATUS else 'Server is busy'
+    return body, status, {RETRY_AFTER_HEADER: str(max(math.ceil(retry_after), 1))}
+
+
+def admit_endpoint(remote_addr: str, headers, parameters, endpoint_path: str, rate_limit: RateLimit) -> tuple:
+    """
+    Endpoint rate limit, e.g of a batch item (load and client rate limit were checked for the batch)
+    :param remote_addr: Client address
+    :param headers: Request headers
+    :param parameters: Query parameters
+    :param endpoint_path: Endpoint path as registered
+    :param rate_limit: Endpoint rate limit
+    :return: Tuple of response body, status 429 and headers when request is rejected, otherwise None
+    """
+    key = f'endpoint:{endpoint_path}'
+    if rate_limit.per_client:
+        key = f'{key}:{client_key(remote_addr=remote_addr, headers=headers, parameters=parameters)}'
+    retry_after = BUCKETS.take(key=key, rate=rate_limit.rate, burst=rate_limit.burst)
+    if retry_after > 0:
+        return _reject(status=RATE_LIMITED_STATUS, retry_after=retry_after)
+    return None
+
+
+def admit(remote_addr: str, headers, parameters, endpoint_path: str = None, rate_limit: RateLimit = None) -> tuple:
+    """
+    Admission control, runs before request body is read
+    :param remote_addr: Client address
+    :param headers: Request headers
+    :param parameters: Query parameters
+    :param endpoint_path: Requested endpoint path as registered
+    :param rate_limit: Endpoint rate limit
+    :return: Tuple of response body, status (429 or 503) and headers when request is rejected, otherwise None
+    """
+    if LOAD.is_overloaded():
+        return _reject(status=OVERLOADED_STATUS, retry_after=1)
+    if rate_limit is not None:
+        rejection = admit_endpoint(
+            remote_addr=remote_addr, headers=headers, parameters=parameters, endpoint_path=endpoint_path,
+            rate_limit=rate_limit
+        )
+        if rejection is not None:
+            return rejection
+    if CLIENT_RATE_LIMIT > 0:
+        client = client_key(remote_addr=remote_addr, headers=headers, parameters=parameters)
+        retry_after = BUCKETS.take(key=f'client:{client}', rate=CLIENT_RATE_LIMIT, burst=CLIENT_RATE_LIMIT_BURST)
+        if retry_after > 0:
+            return _reject(status=RATE_LIMITED_STATUS, retry_after=retry_after)
+    return None
@@ -0,0 +1,87 @@
+import os
+import asyncio
+from threading import Thread, Lock, get_ident
+from concurrent.futures import ThreadPoolExecutor
+
+QUICKBE_ENDPOINT_THREAD_POOL_SIZE_KEY = 'QUICKBE_ENDPOINT_THREAD_POOL_SIZE'
+
+_lock = Lock()
+_event_loop = None
+_event_loop_thread = None
+_executor = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Persistent event loop, running in a background thread, that executes coroutine endpoints.
+    The loop lives for the whole process so it is reused by consecutive requests (and warm Lambda invocations).
+    :return: Event loop
+    """
+    global _event_loop, _event_loop_thread
+    if _event_loop is None:
+        with _lock:
+            if _event_loop is None:
+                loop = asyncio.new_event_loop()
+                _event_loop_thread = Thread(target=loop.run_forever, name='quickbe-event-loop', daemon=True)
+                _event_loop_thread.start()
+                _event_loop = loop
+    return _event_loop
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Bounded thread pool for running synchronous endpoints from asynchronous code.
+    Pool size is taken from QUICKBE_ENDPOINT_THREAD_POOL_SIZE environment variable.
+    :return: Executor
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                max_workers = int(os.getenv(QUICKBE_ENDPOINT_THREAD_POOL_SIZE_KEY, min(32, (os.cpu_count() or 1) + 4)))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quickbe-endpoint')
+    return _executor
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), start over in the child
+    """
+    global _lock, _event_loop, _event_loop_thread, _executor
+    _lock = Lock()
+    _event_loop = None
+    _event_loop_thread = None
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def run_coroutine(coro, timeout: float = None):
+    """
+    Run a coroutine on the persistent event loop and wait for its result
+    :param coro: Coroutine (or any awaitable)
+    :param timeout: Seconds to wait, None for no limit
+    :return: Coroutine result
+    """
+    loop = get_event_loop()
+    if _event_loop_thread is not None and _event_loop_thread.ident == get_ident():
+        raise RuntimeError('Can not wait for a coroutine from the event loop thread, await it instead.')
+    if not asyncio.iscoroutine(coro):
+        coro = _await(coro)
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=timeout)
+
+
+async def run_in_executor(func, *args):
+    """
+    Run synchronous function on the bounded endpoints thread pool
+    :param func: Function to execute
+    :param args: Function arguments
+    :return: Function result
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+async def _await(awaitable):
+    return await awaitable
@@ -0,0 +1,161 @@
+import os
+import json
+import base64
+from quickbelog import Log
+from quickbe.compression import compress_payload, not_modified_vary, CONTENT_ENCODING_HEADER, ACCEPT_ENCODING_HEADER
+from quickbe.etag import apply_conditional, NOT_MODIFIED_STATUS
+from quickbe.headers import get_header
+from quickbe.serializers import serialize, is_structured, is_text_content_type, json_dumps, JSON_MIMETYPE
+from quickbe.aws_records import aws_records_handler, event_source, RECORD_PARSERS
+from quickbe.batch import batch_response, BATCH_PATH
+from quickbe.streams import as_stream, StreamingBody, ResponseTooLarge
+from quickbe.timing import new_server_timing, measure, SERIALIZE_PHASE
+from quickbe.endpoints import HttpSession, execute_endpoint_with_session, is_endpoint_etag_on, \
+    is_endpoint_compression_on, is_stream_body_request, match_endpoint
+
+AWS_LAMBDA_EVENT_BODY_KEY = 'body'
+AWS_LAMBDA_EVENT_HEADERS_KEY = 'headers'
+AWS_LAMBDA_EVENT_QUERY_STRING_KEY = 'queryStringParameters'
+AWS_LAMBDA_EVENT_IS_BASE64_ENCODED_KEY = 'isBase64Encoded'
+AWS_LAMBDA_EVENT_HTTP_METHOD_KEY = 'httpMethod'
+QUICKBE_LAMBDA_MAX_PAYLOAD_SIZE_KEY = 'QUICKBE_LAMBDA_MAX_PAYLOAD_SIZE'
+
+# Synchronous invocation response limit, streamed responses are buffered up to this size
+AWS_LAMBDA_MAX_PAYLOAD_SIZE = int(os.getenv(QUICKBE_LAMBDA_MAX_PAYLOAD_SIZE_KEY, 6 * 1024**2))
+
+
+def _parse_body(body):
+    try:
+        if body is None:
+            body = {}
+        elif isinstance(body, dict):
+            pass
+        elif isinstance(body, str):
+            body = json.loads(body)
+    except (ValueError, TypeError):
+        pass
+    return body
+
+
+def aws_lambda_handler(event: dict, context=None):
+    """
+    AWS Lambda entry point, for API Gateway proxy events and SQS, Kinesis and SNS records events
+    :param event: AWS Lambda event
+    :param context: AWS Lambda context
+    :return: API Gateway proxy response, or partial batch response for records events
+    """
+    source = event_source(event=event)
+    if source in RECORD_PARSERS:
+        return aws_records_handler(event=event, context=context)
+    if source is not None:
+        msg = f'Event source {source} is not supported, only SQS, Kinesis and SNS records are routed to endpoints.'
+        Log.warning(msg)
+        return {
+            "statusCode": 400,
+            AWS_LAMBDA_EVENT_HEADERS_KEY: {'Content-Type': JSON_MIMETYPE},
+            AWS_LAMBDA_EVENT_BODY_KEY: json_dumps(msg),
+            AWS_LAMBDA_EVENT_IS_BASE64_ENCODED_KEY: False
+        }
+
+    path = event.get('path', '/error')
+
+    if context is not None:
+        Log.debug(f'Lambda function: {context.function_name}, path: {path}.')
+
+    body = event.get(AWS_LAMBDA_EVENT_BODY_KEY, '{}')
+    request_headers = event.get(AWS_LAMBDA_EVENT_HEADERS_KEY) or {}
+    parameters = event.get(AWS_LAMBDA_EVENT_QUERY_STRING_KEY, {})
+    endpoint_path = None
+    timing = None
+    if path.strip('/') == BATCH_PATH:
+        resp_body, response_headers, status_code = batch_response(items=_parse_body(body), headers=request_headers)
+    else:
+        timing = new_server_timing()
+        match = match_endpoint(path=path)
+        if is_stream_body_request(path=path, match=match):
+            if event.get(AWS_LAMBDA_EVENT_IS_BASE64_ENCODED_KEY) and isinstance(body, str):
+                body = base64.b64decode(body)
+            session = HttpSession(
+                parameters=parameters, headers=request_headers, body_stream=as_stream(body), timing=timing
+            )
+        else:
+            session = HttpSession(
+                parameters=parameters, headers=request_headers, body_loader=lambda: _parse_body(body), timing=timing
+            )
+        resp_body, response_headers, status_code = execute_endpoint_with_session(
+            path=path, session=session, match=match
+        )
+        endpoint_path = session.endpoint_path
+
+    is_streamed = isinstance(resp_body, StreamingBody)
+    if is_streamed:
+        # API Gateway does not support chunked responses, stream is buffered up to payload limit
+        try:
+            if get_header(response_headers, 'Content-Type') is None:
+                response_headers['Content-Type'] = resp_body.mimetype
+            resp_body = resp_body.read(limit=AWS_LAMBDA_MAX_PAYLOAD_SIZE)
+        except ResponseTooLarge:
+            resp_body = f'Streamed response is larger than AWS Lambda payload limit ' \
+                        f'({AWS_LAMBDA_MAX_PAYLOAD_SIZE} bytes), use pagination or a smaller result set.'
+            Log.error(f'{resp_body} Path: {path}.')
+            response_headers['Content-Type'] = JSON_MIMETYPE
+            is_streamed = False
+            status_code = 500
+
+    try:
+        with measure(timing=timing, name=SERIALIZE_PHASE):
+            if is_streamed:
+                pass
+            elif is_structured(resp_body):
+                resp_body, content_type = serialize(value=resp_body, accept=get_header(request_headers, 'Accept'))
+            else:
+                resp_body, content_type = json_dumps(resp_body), JSON_MIMETYPE
+        if get_header(response_headers, 'Content-Type') is None:
+            response_headers['Content-Type'] = content_type
+    except (TypeError, ValueError):
+        msg = 'Can not convert response body to JSON format.'
+        Log.exception(msg)
+        resp_body = msg
+        status_code = 500
+    if timing is not None:
+        timing.add_header(response_headers=response_headers)
+
+    resp_body, status_code = apply_conditional(
+        body=resp_body,
+        status=status_code,
+        response_headers=response_headers,
+        request_headers=request_headers,
+        request_method=event.get(AWS_LAMBDA_EVENT_HTTP_METHOD_KEY, 'GET'),
+        auto=is_endpoint_etag_on(path=endpoint_path)
+    )
+
+    content_type = get_header(response_headers, 'Content-Type', '')
+    if is_endpoint_compression_on(path=endpoint_path) and status_code not in [204, NOT_MODIFIED_STATUS]:
+        resp_body = compress_payload(
+            payload=resp_body,
+            response_headers=response_headers,
+            accept_encoding=get_header(request_headers, ACCEPT_ENCODING_HEADER),
+            content_type=content_type
+        )
+    elif is_endpoint_compression_on(path=endpoint_path) and status_code == NOT_MODIFIED_STATUS:
+        not_modified_vary(
+            response_headers=response_headers,
+            accept_encoding=get_header(request_headers, ACCEPT_ENCODING_HEADER),
+            content_type=content_type
+        )
+
+    is_base64_encoded = False
+    if isinstance(resp_body, bytes):
+        if is_text_content_type(content_type) and get_header(response_headers, CONTENT_ENCODING_HEADER) is None:
+            resp_body = resp_body.decode()
+        else:
+            resp_body = base64.b64encode(resp_body).decode()
+            is_base64_encoded = True
+
+    return {
+
+        "statusCode": status_code,
+        AWS_LAMBDA_EVENT_HEADERS_KEY: response_headers,
+        AWS_LAMBDA_EVENT_BODY_KEY: resp_body,
+        AWS_LAMBDA_EVENT_IS_BASE64_ENCODED_KEY: is_base64_encoded
+    }
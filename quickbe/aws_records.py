@@ -0,0 +1,227 @@
+import os
+import json
+import base64
+from threading import Lock
+from quickbelog import Log
+from concurrent.futures import ThreadPoolExecutor
+from quickbe.streams import StreamingBody
+from quickbe.endpoints import HttpSession, execute_endpoint_with_session
+
+QUICKBE_RECORDS_PATH_ATTRIBUTE_KEY = 'QUICKBE_RECORDS_PATH_ATTRIBUTE'
+QUICKBE_RECORDS_DEFAULT_PATH_KEY = 'QUICKBE_RECORDS_DEFAULT_PATH'
+QUICKBE_RECORDS_WORKERS_KEY = 'QUICKBE_RECORDS_WORKERS'
+
+AWS_LAMBDA_EVENT_RECORDS_KEY = 'Records'
+BATCH_ITEM_FAILURES_KEY = 'batchItemFailures'
+ITEM_IDENTIFIER_KEY = 'itemIdentifier'
+# Record body that is not a JSON object is passed to the endpoint under this key
+RECORD_BODY_KEY = 'record_body'
+
+SQS_EVENT_SOURCE = 'aws:sqs'
+KINESIS_EVENT_SOURCE = 'aws:kinesis'
+SNS_EVENT_SOURCE = 'aws:sns'
+
+PATH_ATTRIBUTE = os.getenv(QUICKBE_RECORDS_PATH_ATTRIBUTE_KEY, 'path')
+DEFAULT_PATH = os.getenv(QUICKBE_RECORDS_DEFAULT_PATH_KEY)
+WORKERS = int(os.getenv(QUICKBE_RECORDS_WORKERS_KEY, 8))
+
+_lock = Lock()
+_executor = None
+
+
+class RecordsProcessingError(Exception):
+    pass
+
+
+def configure(path_attribute: str = None, default_path: str = None, workers: int = None):
+    """
+    Set records routing and concurrency (defaults are taken from environment variables)
+    :param path_attribute: Message attribute (or body key) that holds the endpoint path of a record
+    :param default_path: Endpoint path for records without path attribute
+    :param workers: Records processed concurrently
+    :return:
+    """
+    global PATH_ATTRIBUTE, DEFAULT_PATH, WORKERS, _executor
+    if path_attribute is not None:
+        PATH_ATTRIBUTE = path_attribute
+    if default_path is not None:
+        DEFAULT_PATH = default_path
+    if workers is not None and workers != WORKERS:
+        with _lock:
+            WORKERS = workers
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='quickbe-records')
+    return _executor
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), start over in the child
+    """
+    global _lock, _executor
+    _lock = Lock()
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def event_source(event: dict) -> str:
+    """
+    Get source of a records event (SQS, Kinesis or SNS)
+    :param event: AWS Lambda event
+    :return: Event source, e.g `aws:sqs`, None if event is not a records event
+    """
+    records = event.get(AWS_LAMBDA_EVENT_RECORDS_KEY)
+    if not isinstance(records, list) or len(records) == 0 or not isinstance(records[0], dict):
+        return None
+    return records[0].get('eventSource') or records[0].get('EventSource')
+
+
+def _parse_body(body) -> dict:
+    if isinstance(body, (bytes, str)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            pass
+    if isinstance(body, dict):
+        return body
+    return {RECORD_BODY_KEY: body}
+
+
+class _Record:
+
+    __slots__ = ('identifier', 'group', 'body', 'attributes')
+
+    def __init__(self, identifier: str, group, body: dict, attributes: dict):
+        self.identifier = identifier
+        self.group = group
+        self.body = body
+        self.attributes = attributes
+
+    @staticmethod
+    def from_sqs(record: dict):
+        attributes = {
+            name: value.get('stringValue')
+            for name, value in (record.get('messageAttributes') or {}).items() if 'stringValue' in value
+        }
+        # FIFO queues, messages of a group are processed in order
+        group = (record.get('attributes') or {}).get('MessageGroupId')
+        return _Record(
+            identifier=record.get('messageId'), group=group, body=_parse_body(record.get('body')), attributes=attributes
+        )
+
+    @staticmethod
+    def from_kinesis(record: dict):
+        kinesis = record.get('kinesis', {})
+        data = base64.b64decode(kinesis.get('data', ''))
+        # Records of a partition key are processed in order, same as the shard
+        return _Record(
+            identifier=kinesis.get('sequenceNumber'), group=kinesis.get('partitionKey'), body=_parse_body(data),
+            attributes={}
+        )
+
+    @staticmethod
+    def from_sns(record: dict):
+        sns = record.get('Sns', {})
+        attributes = {name: value.get('Value') for name, value in (sns.get('MessageAttributes') or {}).items()}
+        return _Record(
+            identifier=sns.get('MessageId'), group=None, body=_parse_body(sns.get('Message')), attributes=attributes
+        )
+
+    @property
+    def path(self) -> str:
+        path = self.attributes.get(PATH_ATTRIBUTE) or self.body.get(PATH_ATTRIBUTE) or DEFAULT_PATH
+        if isinstance(path, str):
+            return path.strip().lstrip('/')
+        return None
+
+
+RECORD_PARSERS = {
+    SQS_EVENT_SOURCE: _Record.from_sqs,
+    KINESIS_EVENT_SOURCE: _Record.from_kinesis,
+    SNS_EVENT_SOURCE: _Record.from_sns,
+}
+
+
+def _execute_record(record: _Record) -> bool:
+    """
+    :return: True if endpoint handled the record, responses with status 400 and above are failures
+    """
+    path = record.path
+    if path is None:
+        Log.warning(f'Record {record.identifier} has no `{PATH_ATTRIBUTE}` attribute, and there is no default path.')
+        return False
+    session = HttpSession(body=record.body, headers=record.attributes)
+    try:
+        resp_body, _, status = execute_endpoint_with_session(path=path, session=session)
+        if isinstance(resp_body, StreamingBody):
+            # Response is not returned, but the generator must run for the record to be processed
+            for _ in resp_body.chunks():
+                pass
+    except Exception:
+        Log.exception(f'Record {record.identifier} for endpoint {path} raised an exception')
+        return False
+    if status >= 400:
+        Log.warning(f'Record {record.identifier} for endpoint {path} failed with status {status}')
+        return False
+    return True
+
+
+def _execute_group(records: list) -> list:
+    """
+    Execute records in order, stop on first failure so later records of the group are not processed before it
+    :return: Identifiers of failed (and not processed) records
+    """
+    for index, record in enumerate(records):
+        if not _execute_record(record=record):
+            return [failed.identifier for failed in records[index:]]
+    return []
+
+
+def aws_records_handler(event: dict, context=None) -> dict:
+    """
+    Route SQS, Kinesis and SNS records to endpoints, by PATH_ATTRIBUTE message attribute or body key.
+    Records are processed concurrently, records of the same SQS message group or Kinesis partition key
+    are processed in order.
+    :param event: AWS Lambda records event
+    :param context: AWS Lambda context
+    :return: Partial batch response, `{"batchItemFailures": [{"itemIdentifier": ...}]}`
+    """
+    source = event_source(event=event)
+    parser = RECORD_PARSERS.get(source)
+    if parser is None:
+        raise ValueError(f'Event source {source} is not supported.')
+    records = [parser(record) for record in event[AWS_LAMBDA_EVENT_RECORDS_KEY]]
+    if context is not None:
+        Log.debug(f'Lambda function: {context.function_name}, {len(records)} records from {source}.')
+
+    groups = {}
+    for index, record in enumerate(records):
+        key = index if record.group is None else ('group', record.group)
+        groups.setdefault(key, []).append(record)
+
+    if len(groups) == 1:
+        failures = [_execute_group(records=group) for group in groups.values()]
+    else:
+        failures = list(get_executor().map(_execute_group, groups.values()))
+    failed_identifiers = {identifier for group_failures in failures for identifier in group_failures}
+
+    if source == SNS_EVENT_SOURCE and failed_identifiers:
+        # SNS does not support partial batch response, fail the invocation so it is retried
+        raise RecordsProcessingError(f'Failed to process SNS messages {sorted(failed_identifiers)}.')
+    return {
+        BATCH_ITEM_FAILURES_KEY: [
+            {ITEM_IDENTIFIER_KEY: record.identifier} for record in records if record.identifier in failed_identifiers
+        ]
+    }
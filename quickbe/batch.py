@@ -0,0 +1,207 @@
+import os
+import contextvars
+from threading import Lock
+from quickbelog import Log
+from concurrent.futures import ThreadPoolExecutor, wait
+from quickbe.serializers import is_text_content_type
+from quickbe.streams import StreamingBody
+from quickbe.filters import apply_filter_chain
+from quickbe.endpoints import HttpSession, execute_endpoint_with_session, resolve_filter_chain, resolve_rate_limit, \
+    match_endpoint
+
+QUICKBE_BATCH_MAX_ITEMS_KEY = 'QUICKBE_BATCH_MAX_ITEMS'
+QUICKBE_BATCH_TIMEOUT_KEY = 'QUICKBE_BATCH_TIMEOUT'
+QUICKBE_BATCH_THREAD_POOL_SIZE_KEY = 'QUICKBE_BATCH_THREAD_POOL_SIZE'
+
+BATCH_PATH = 'quickbe-batch'
+BATCH_ITEM_PATH_KEY = 'path'
+BATCH_ITEM_BODY_KEY = 'body'
+BATCH_ITEM_PARAMETERS_KEY = 'parameters'
+BATCH_ITEM_HEADERS_KEY = 'headers'
+BATCH_ITEM_STATUS_KEY = 'status'
+
+TIMEOUT_STATUS = 504
+
+MAX_ITEMS = int(os.getenv(QUICKBE_BATCH_MAX_ITEMS_KEY, 50))
+TIMEOUT_SECONDS = float(os.getenv(QUICKBE_BATCH_TIMEOUT_KEY, 30))
+
+_lock = Lock()
+_executor = None
+
+
+class BatchLimitExceeded(ValueError):
+    pass
+
+
+def configure(max_items: int = None, timeout: float = None):
+    """
+    Set batch limits (defaults are taken from environment variables)
+    :param max_items: Maximum items in a batch
+    :param timeout: Seconds to wait for all items of a batch, items that are not done get status 504
+    :return:
+    """
+    global MAX_ITEMS, TIMEOUT_SECONDS
+    if max_items is not None:
+        MAX_ITEMS = max_items
+    if timeout is not None:
+        TIMEOUT_SECONDS = timeout
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Bounded thread pool for batch items, shared by all batches.
+    Pool size is taken from QUICKBE_BATCH_THREAD_POOL_SIZE environment variable.
+    :return: Executor
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                max_workers = int(os.getenv(QUICKBE_BATCH_THREAD_POOL_SIZE_KEY, min(32, (os.cpu_count() or 1) + 4)))
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quickbe-batch')
+    return _executor
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), start over in the child
+    """
+    global _lock, _executor
+    _lock = Lock()
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _item_response(body, headers: dict, status: int) -> dict:
+    return {
+        BATCH_ITEM_BODY_KEY: body,
+        BATCH_ITEM_HEADERS_KEY: dict(headers),
+        BATCH_ITEM_STATUS_KEY: status,
+    }
+
+
+def _admit_item(path: str, match: tuple, parameters, headers, remote_addr: str) -> dict:
+    """
+    Endpoint rate limit of a batch item, so batches do not get around it
+    :return: Item response when item is rejected, otherwise None
+    """
+    endpoint_path, rate_limit = resolve_rate_limit(path=path, match=match)
+    if rate_limit is None:
+        return None
+    from quickbe.admission import admit_endpoint
+    rejection = admit_endpoint(
+        remote_addr=remote_addr, headers=headers, parameters=parameters or {}, endpoint_path=endpoint_path,
+        rate_limit=rate_limit
+    )
+    if rejection is None:
+        return None
+    body, status, rejection_headers = rejection
+    return _item_response(body=body, headers=rejection_headers, status=status)
+
+
+def _execute_item(item: dict, headers, user_id, remote_addr: str = None, rate_limited: bool = False) -> dict:
+    if not isinstance(item, dict) or not isinstance(item.get(BATCH_ITEM_PATH_KEY), str):
+        return _item_response(
+            body=f'Batch item must be an object with `{BATCH_ITEM_PATH_KEY}`.', headers={}, status=400
+        )
+
+    path = item[BATCH_ITEM_PATH_KEY].strip()
+    if path.startswith('/'):
+        path = path[1:]
+    match = match_endpoint(path=path)
+    if rate_limited:
+        rejection = _admit_item(
+            path=path, match=match, parameters=item.get(BATCH_ITEM_PARAMETERS_KEY), headers=headers,
+            remote_addr=remote_addr
+        )
+        if rejection is not None:
+            return rejection
+    body = item.get(BATCH_ITEM_BODY_KEY)
+    session = HttpSession(
+        body=dict(body) if isinstance(body, dict) else None,
+        parameters=item.get(BATCH_ITEM_PARAMETERS_KEY),
+        headers=headers
+    )
+    session.set_user_id(user_id)
+    try:
+        # Item body is not known to filters that ran for the batch, only batch safe global filters are not run again
+        chain = resolve_filter_chain(path=path, batch_item=True, match=match)
+        filter_response = apply_filter_chain(chain=chain, session=session)
+        if filter_response is not None:
+            return _item_response(body=filter_response[0], headers=session.response_headers, status=filter_response[1])
+        resp_body, resp_headers, status = execute_endpoint_with_session(path=path, session=session, match=match)
+        if isinstance(resp_body, StreamingBody):
+            # Batch response is a single document, streamed items are read whole (binary bodies are base64 encoded)
+            mimetype = resp_body.mimetype
+            resp_body = resp_body.read()
+            if is_text_content_type(mimetype):
+                resp_body = resp_body.decode()
+    except NotImplementedError:
+        resp_body, resp_headers, status = 'File not found', {}, 404
+    except Exception as e:
+        Log.exception(f'Batch item {path} raised an exception')
+        resp_body, resp_headers, status = f'{e}', {}, 500
+    return _item_response(body=resp_body, headers=resp_headers, status=status)
+
+
+def execute_batch(
+        items: list, headers=None, user_id: str = None, remote_addr: str = None, rate_limited: bool = False
+) -> list:
+    """
+    Execute endpoints of batch items concurrently, on a bounded thread pool
+    :param items: List of `{path, body, parameters}` dicts
+    :param headers: Request headers, shared by all items
+    :param user_id: User of the batch (e.g set by a web filter), shared by all items
+    :param remote_addr: Client address, for per client rate limits
+    :param rate_limited: Apply endpoint rate limits to items, items over the limit get status 429
+    :return: Ordered list of `{body, headers, status}` dicts, items that did not finish in time get status 504
+    """
+    if not isinstance(items, list):
+        raise ValueError('Batch must be a list of items.')
+    if len(items) > MAX_ITEMS:
+        raise BatchLimitExceeded(f'Batch is limited to {MAX_ITEMS} items, got {len(items)}.')
+
+    executor = get_executor()
+    # Items run in a copy of the caller context, so filters and endpoints see the request context
+    futures = [
+        executor.submit(
+            contextvars.copy_context().run, _execute_item, item, headers, user_id, remote_addr, rate_limited
+        ) for item in items
+    ]
+    done, _ = wait(futures, timeout=TIMEOUT_SECONDS)
+
+    responses = []
+    for future in futures:
+        if future in done:
+            responses.append(future.result())
+        else:
+            # Items that already started keep running in the background, pending ones are dropped
+            future.cancel()
+            responses.append(_item_response(body='Batch timeout', headers={}, status=TIMEOUT_STATUS))
+    return responses
+
+
+def batch_response(
+        items, headers=None, user_id: str = None, remote_addr: str = None, rate_limited: bool = False
+) -> (list, dict, int):
+    """
+    Execute batch and map invalid batches to HTTP status, for web server and AWS Lambda handlers
+    :param items: Request body, list of `{path, body, parameters}` dicts
+    :param headers: Request headers
+    :param user_id: User of the batch
+    :param remote_addr: Client address, for per client rate limits
+    :param rate_limited: Apply endpoint rate limits to items
+    :return: Tuple of response body, headers and status code
+    """
+    try:
+        batch = execute_batch(
+            items=items, headers=headers, user_id=user_id, remote_addr=remote_addr, rate_limited=rate_limited
+        )
+        return batch, {}, 200
+    except BatchLimitExceeded as e:
+        return f'{e}', {}, 413
+    except ValueError as e:
+        return f'{e}', {}, 400
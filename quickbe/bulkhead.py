@@ -0,0 +1,237 @@
+import os
+import time
+import contextvars
+from inspect import iscoroutinefunction
+from weakref import WeakSet
+from threading import Condition
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+REJECTED_STATUS = 503
+TIMED_OUT_STATUS = 504
+REJECTED_MESSAGE = 'Endpoint is busy'
+TIMED_OUT_MESSAGE = 'Endpoint timed out'
+
+_bulkheads = WeakSet()
+
+
+class Bulkhead:
+    """
+    Concurrency limit of an endpoint, so a slow endpoint can not take every worker thread. Requests over
+    max_concurrency wait in a bounded queue, when the queue is full they are rejected at once.
+    Runs with a timeout take a thread of the bulkhead pool, requests wait for a free thread (in the same queue)
+    also when max_concurrency is not set, so work that timed out does not pile up.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queue: int = 0, timeout: float = None):
+        """
+        :param max_concurrency: Requests that run at once, None for no limit
+        :param max_queue: Requests that may wait for a free slot
+        :param timeout: Seconds a request may take, waiting included. Coroutine functions are cancelled, other
+            functions can not be interrupted and are abandoned (they keep their thread until they return).
+            Functions run on a bulkhead thread in a copy of the caller context, so context variables (e.g Flask
+            request context) are available. Abandoned functions must not use them after the timeout, the request
+            is already answered.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f'Max concurrency must be at least 1, got {max_concurrency}.')
+        if timeout is not None and timeout <= 0:
+            raise ValueError(f'Timeout must be positive, got {timeout}.')
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(max_queue or 0, 0)
+        self.timeout = timeout
+        self.max_threads = max_concurrency or min(32, (os.cpu_count() or 1) + 4)
+        self.rejected = 0
+        self.timeouts = 0
+        self._init_state()
+        _bulkheads.add(self)
+
+    def _init_state(self):
+        self.active = 0
+        self.threads = 0
+        self.waiting = 0
+        self._condition = Condition()
+        self._executor = None
+
+    def _has_slot(self, threaded: bool = False) -> bool:
+        if threaded and self.threads >= self.max_threads:
+            return False
+        return self.max_concurrency is None or self.active < self.max_concurrency
+
+    def enter(self, deadline: float = None, threaded: bool = False) -> int:
+        """
+        Take a slot, wait in queue when all slots are taken
+        :param deadline: time.monotonic() value to stop waiting at
+        :param threaded: Slot also takes a thread of the bulkhead pool
+        :return: None when a slot was taken, otherwise response status (503 queue is full, 504 deadline passed)
+        """
+        with self._condition:
+            if self._has_slot(threaded=threaded):
+                self._take(threaded=threaded)
+                return None
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return REJECTED_STATUS
+            self.waiting += 1
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if not self._condition.wait_for(lambda: self._has_slot(threaded=threaded), timeout=timeout):
+                    self.timeouts += 1
+                    return TIMED_OUT_STATUS
+            finally:
+                self.waiting -= 1
+            self._take(threaded=threaded)
+            return None
+
+    def _take(self, threaded: bool):
+        self.active += 1
+        if threaded:
+            self.threads += 1
+
+    def leave(self, threaded: bool = False):
+        with self._condition:
+            self.active -= 1
+            if threaded:
+                self.threads -= 1
+            self._condition.notify()
+
+    def deadline(self) -> float:
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._condition:
+                if self._executor is None:
+                    # Runs are bounded by threads, abandoned runs keep their thread, so submitted runs never queue
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_threads, thread_name_prefix='quickbe-bulkhead'
+                    )
+        return self._executor
+
+    def run(self, func, *args):
+        """
+        Run a function in a slot, coroutine functions run on the persistent event loop
+        :return: Tuple of function result and None, or None and response status when request was not run in time
+        """
+        if iscoroutinefunction(func):
+            from quickbe.aio import run_coroutine
+            return run_coroutine(self.run_async(func, *args))
+        deadline = self.deadline()
+        threaded = deadline is not None
+        status = self.enter(deadline=deadline, threaded=threaded)
+        if status is not None:
+            return None, status
+        if not threaded:
+            try:
+                return func(*args), None
+            finally:
+                self.leave()
+        try:
+            future = self._get_executor().submit(contextvars.copy_context().run, func, *args)
+        except BaseException:
+            self.leave(threaded=True)
+            raise
+        # Slot is free when the run ends, also when it is abandoned
+        future.add_done_callback(lambda done: self.leave(threaded=True))
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0)), None
+        except FutureTimeoutError:
+            # A run that did not start yet is dropped, a running one can not be interrupted
+            future.cancel()
+            with self._condition:
+                self.timeouts += 1
+            return None, TIMED_OUT_STATUS
+
+    async def run_async(self, func, *args):
+        """
+        Run a function in a slot, from the event loop. Coroutine functions are awaited, other functions run on
+        a thread (of the bulkhead pool when there is a timeout, they keep their slot when they are abandoned).
+        :return: Tuple of function result and None, or None and response status when request was not run in time
+        """
+        import asyncio
+        deadline = self.deadline()
+        threaded = deadline is not None and not iscoroutinefunction(func)
+        status = await self._enter_async(deadline=deadline, threaded=threaded)
+        if status is not None:
+            return None, status
+        if threaded:
+            return await self._run_threaded_async(deadline, func, *args)
+        try:
+            if iscoroutinefunction(func):
+                awaitable = func(*args)
+            else:
+                from quickbe.aio import run_in_executor
+                awaitable = run_in_executor(contextvars.copy_context().run, func, *args)
+            if deadline is None:
+                return await awaitable, None
+            return await asyncio.wait_for(awaitable, timeout=max(deadline - time.monotonic(), 0)), None
+        except asyncio.TimeoutError:
+            with self._condition:
+                self.timeouts += 1
+            return None, TIMED_OUT_STATUS
+        finally:
+            self.leave()
+
+    async def _run_threaded_async(self, deadline: float, func, *args):
+        import asyncio
+        try:
+            future = self._get_executor().submit(contextvars.copy_context().run, func, *args)
+        except BaseException:
+            self.leave(threaded=True)
+            raise
+        # Slot is free when the run ends, also when it is abandoned
+        future.add_done_callback(lambda done: self.leave(threaded=True))
+        try:
+            # Timeout cancels the wrapped future, so a run that did not start yet is dropped
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=max(deadline - time.monotonic(), 0)
+            ), None
+        except asyncio.TimeoutError:
+            with self._condition:
+                self.timeouts += 1
+            return None, TIMED_OUT_STATUS
+
+    async def _enter_async(self, deadline: float, threaded: bool) -> int:
+        status = self._try_enter(threaded=threaded)
+        if status is False:
+            from quickbe.aio import run_in_executor
+            status = await run_in_executor(self.enter, deadline, threaded)
+        return status
+
+    def _try_enter(self, threaded: bool = False):
+        """
+        Take a slot without waiting, so the event loop is not blocked
+        :param threaded: Slot also takes a thread of the bulkhead pool
+        :return: None when a slot was taken, 503 when queue is full, False when request has to wait
+        """
+        with self._condition:
+            if self._has_slot(threaded=threaded):
+                self._take(threaded=threaded)
+                return None
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return REJECTED_STATUS
+            return False
+
+    def status(self) -> dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'timeout': self.timeout,
+            'active': self.active,
+            'threads': self.threads,
+            'waiting': self.waiting,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+        }
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), start over in the child
+    """
+    for bulkhead in list(_bulkheads):
+        bulkhead._init_state()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
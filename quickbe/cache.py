@@ -0,0 +1,205 @@
+import asyncio
+from threading import Lock
+from inspect import isawaitable
+from cachetools import Cache, TTLCache
+from concurrent.futures import Future
+from quickbe.headers import get_header
+from quickbe.streams import StreamingBody
+
+
+class _CountingTTLCache(TTLCache):
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+    def expire(self, time=None):
+        # TTLCache.__len__ skips expired items, count the stored ones
+        size = Cache.__len__(self)
+        result = super().expire(time)
+        self.expirations += size - Cache.__len__(self)
+        return result
+
+
+def _freeze(value):
+    """
+    Convert value to hashable value, for cache keys
+    """
+    if isinstance(value, dict):
+        return tuple(sorted(((key, _freeze(item)) for key, item in value.items()), key=lambda pair: str(pair[0])))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+class EndpointCache:
+    """
+    Response cache for endpoints that are pure functions of their (validated) input.
+    Only responses with status 200 are cached. Concurrent misses for the same key are coalesced
+    into a single endpoint call, other callers wait for its result and get it when it is cached.
+    """
+
+    def __init__(
+            self, ttl: float = 60, max_entries: int = 1024, keys: list = None, headers: list = None,
+            per_user: bool = False
+    ):
+        """
+        :param ttl: Seconds to keep a response
+        :param max_entries: Maximum responses to keep, least recently used are evicted
+        :param keys: Session data keys that form the cache key, None for all data (after validation)
+        :param headers: Request headers that form the cache key
+        :param per_user: Add session user_id to the cache key
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.keys = keys
+        self.headers = headers or []
+        self.per_user = per_user
+        self._cache = _CountingTTLCache(maxsize=max_entries, ttl=ttl)
+        self._in_flight = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def from_definition(definition):
+        """
+        Create cache from endpoint definition
+        :param definition: EndpointCache, dict of EndpointCache arguments or TTL in seconds
+        :return: EndpointCache
+        """
+        if isinstance(definition, EndpointCache):
+            return definition
+        if isinstance(definition, dict):
+            return EndpointCache(**definition)
+        if isinstance(definition, (int, float)) and not isinstance(definition, bool):
+            return EndpointCache(ttl=definition)
+        raise TypeError(f'Cache definition is not valid! Got this {type(definition)}.')
+
+    def key(self, session) -> tuple:
+        data = session.data
+        if self.keys is None:
+            data_key = _freeze(data)
+        else:
+            data_key = tuple(_freeze(data.get(name)) for name in self.keys)
+        headers_key = tuple(get_header(session.request_headers, name) for name in self.headers)
+        user_key = session.user_id if self.per_user else None
+        return data_key, headers_key, user_key
+
+    def _lookup(self, key) -> (tuple, Future, bool):
+        """
+        :return: Tuple of cached response, future of in-flight call and True if caller should execute the endpoint
+        """
+        with self._lock:
+            try:
+                response = self._cache[key]
+                self.hits += 1
+                return response, None, False
+            except KeyError:
+                pass
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+            return None, future, True
+
+    def _done(self, key, future: Future, response: tuple = None, error: BaseException = None):
+        if response is not None and isinstance(response[0], StreamingBody):
+            # A stream is consumed once, it is not cached and waiting callers execute the endpoint themselves
+            response = None
+        if response is not None and response[2] != 200:
+            # Not cached (e.g 304 of a conditional request, 503 busy), waiting callers execute the endpoint themselves
+            response = None
+        with self._lock:
+            if response is not None:
+                self._cache[key] = response
+            self._in_flight.pop(key, None)
+        if error is None:
+            future.set_result(response)
+        else:
+            future.set_exception(error)
+
+    @staticmethod
+    def _apply(session, response: tuple):
+        body, headers, status = response
+        session.response_headers.update(headers)
+        session.set_status(status)
+        return body
+
+    def execute(self, session, func):
+        """
+        Get response from cache or execute endpoint
+        :param session: HTTP session
+        :param func: Function that gets the session and returns response body
+        :return: Response body
+        """
+        key = self.key(session=session)
+        response, future, is_owner = self._lookup(key=key)
+        if response is not None:
+            return self._apply(session=session, response=response)
+        if not is_owner:
+            response = future.result()
+            if response is None:
+                return func(session)
+            return self._apply(session=session, response=response)
+        try:
+            body = func(session)
+            response = body, dict(session.response_headers), session.response_status
+        except BaseException as error:
+            self._done(key=key, future=future, error=error)
+            raise
+        self._done(key=key, future=future, response=response)
+        return body
+
+    async def execute_async(self, session, func):
+        """
+        Same as execute, for asynchronous code. func may return an awaitable.
+        """
+        key = self.key(session=session)
+        response, future, is_owner = self._lookup(key=key)
+        if response is not None:
+            return self._apply(session=session, response=response)
+        if not is_owner:
+            response = await asyncio.wrap_future(future)
+            if response is None:
+                body = func(session)
+                return (await body) if isawaitable(body) else body
+            return self._apply(session=session, response=response)
+        try:
+            body = func(session)
+            if isawaitable(body):
+                body = await body
+            response = body, dict(session.response_headers), session.response_status
+        except BaseException as error:
+            self._done(key=key, future=future, error=error)
+            raise
+        self._done(key=key, future=future, response=response)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self._cache.evictions,
+            'expirations': self._cache.expirations,
+        }
@@ -0,0 +1,190 @@
+import os
+import zlib
+from quickbe.headers import get_header
+
+QUICKBE_COMPRESSION_KEY = 'QUICKBE_COMPRESSION'
+QUICKBE_COMPRESSION_MIN_SIZE_KEY = 'QUICKBE_COMPRESSION_MIN_SIZE'
+QUICKBE_COMPRESSION_LEVEL_KEY = 'QUICKBE_COMPRESSION_LEVEL'
+
+CONTENT_ENCODING_HEADER = 'Content-Encoding'
+ACCEPT_ENCODING_HEADER = 'Accept-Encoding'
+
+GZIP = 'gzip'
+DEFLATE = 'deflate'
+# zlib window bits: gzip container for gzip, zlib container for HTTP deflate
+ENCODINGS_WBITS = {GZIP: 16 + zlib.MAX_WBITS, DEFLATE: zlib.MAX_WBITS}
+
+INCOMPRESSIBLE_CONTENT_TYPES = [
+    'image/', 'video/', 'audio/', 'font/woff', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/x-7z-compressed', 'application/x-bzip2', 'application/pdf', 'application/octet-stream',
+]
+
+ENABLED = os.getenv(QUICKBE_COMPRESSION_KEY, 'on').lower().strip() in ['1', 'true', 'y', 'yes', 'on']
+MIN_SIZE = int(os.getenv(QUICKBE_COMPRESSION_MIN_SIZE_KEY, 1024))
+LEVEL = int(os.getenv(QUICKBE_COMPRESSION_LEVEL_KEY, 6))
+
+
+def configure(enabled: bool = None, min_size: int = None, level: int = None):
+    """
+    Set response compression settings (defaults are taken from environment variables)
+    :param enabled: Compress responses
+    :param min_size: Minimum body size in bytes to compress, streamed responses are always compressed
+    :param level: Compression level, 1 (fastest) to 9 (smallest)
+    :return:
+    """
+    global ENABLED, MIN_SIZE, LEVEL
+    if enabled is not None:
+        ENABLED = enabled
+    if min_size is not None:
+        MIN_SIZE = min_size
+    if level is not None:
+        LEVEL = level
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Choose content encoding by `Accept-Encoding` header, gzip is preferred
+    :param accept_encoding: Accept-Encoding header value
+    :return: Encoding name or None
+    """
+    if not ENABLED or not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[name] = quality
+    wildcard = qualities.get('*', 0)
+    best, best_quality = None, 0
+    for encoding in [GZIP, DEFLATE]:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = (content_type or '').lower()
+    return not any(content_type.startswith(prefix) for prefix in INCOMPRESSIBLE_CONTENT_TYPES)
+
+
+def compress(payload: bytes, encoding: str, level: int = None) -> bytes:
+    compressor = zlib.compressobj(LEVEL if level is None else level, zlib.DEFLATED, ENCODINGS_WBITS[encoding])
+    return compressor.compress(payload) + compressor.flush()
+
+
+def compress_stream(chunks, encoding: str, level: int = None):
+    """
+    Compress a streamed body chunk by chunk. Every chunk is flushed so clients get data as it is produced,
+    the body is never buffered as a whole.
+    :param chunks: Iterable of bytes or str
+    :param encoding: gzip or deflate
+    :param level: Compression level
+    :return: Generator of compressed chunks
+    """
+    compressor = zlib.compressobj(LEVEL if level is None else level, zlib.DEFLATED, ENCODINGS_WBITS[encoding])
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def weaken_etag(headers, etag_header: str = 'ETag'):
+    """
+    Compressed body is not byte identical to the one the ETag was computed from, make the ETag weak
+    """
+    etag = headers.get(etag_header)
+    if etag is not None and not etag.startswith('W/'):
+        headers[etag_header] = f'W/{etag}'
+
+
+def _vary_accept_encoding(response_headers: dict):
+    vary = get_header(response_headers, 'Vary')
+    response_headers['Vary'] = ACCEPT_ENCODING_HEADER if not vary else f'{vary}, {ACCEPT_ENCODING_HEADER}'
+
+
+def not_modified_vary(response_headers: dict, accept_encoding: str, content_type: str = None):
+    """
+    Set Vary header of a 304 response (e.g for AWS Lambda response), it carries the Vary header that the 200 response
+    it stands for would have (RFC 9110 15.4.5), so caches do not mix up encoded and plain versions
+    :param response_headers: Response headers
+    :param accept_encoding: Accept-Encoding header value
+    :param content_type: Response content type
+    """
+    if get_header(response_headers, CONTENT_ENCODING_HEADER) is None and is_compressible(content_type) \
+            and negotiate_encoding(accept_encoding=accept_encoding) is not None:
+        _vary_accept_encoding(response_headers=response_headers)
+
+
+def compress_payload(payload, response_headers: dict, accept_encoding: str, content_type: str = None):
+    """
+    Compress a response body (e.g for AWS Lambda response), sets Content-Encoding and Vary headers
+    :param payload: Response body, bytes or str
+    :param response_headers: Response headers
+    :param accept_encoding: Accept-Encoding header value
+    :param content_type: Response content type
+    :return: Compressed bytes, or the original payload when it should not be compressed
+    """
+    if not isinstance(payload, (bytes, str)) or get_header(response_headers, CONTENT_ENCODING_HEADER) is not None \
+            or not is_compressible(content_type):
+        return payload
+    encoding = negotiate_encoding(accept_encoding=accept_encoding)
+    if encoding is None:
+        return payload
+    _vary_accept_encoding(response_headers=response_headers)
+    data = payload.encode() if isinstance(payload, str) else payload
+    if len(data) < MIN_SIZE:
+        return payload
+    response_headers[CONTENT_ENCODING_HEADER] = encoding
+    weaken_etag(headers=response_headers)
+    return compress(payload=data, encoding=encoding)
+
+
+def compress_flask_response(response, accept_encoding: str):
+    """
+    Compress Flask response in place, streamed responses are compressed incrementally
+    :param response: Flask response
+    :param accept_encoding: Accept-Encoding header value
+    :return: Response
+    """
+    if response.status_code < 200 or response.status_code == 204 \
+            or CONTENT_ENCODING_HEADER in response.headers or not is_compressible(response.content_type):
+        return response
+    encoding = negotiate_encoding(accept_encoding=accept_encoding)
+    if encoding is None:
+        return response
+
+    response.vary.add(ACCEPT_ENCODING_HEADER)
+    if response.status_code == 304:
+        # Not modified has no body, it carries the Vary header of the 200 response it stands for (RFC 9110 15.4.5)
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(chunks=response.response, encoding=encoding)
+        response.headers.pop('Content-Length', None)
+        response.direct_passthrough = False
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        response.set_data(compress(payload=data, encoding=encoding))
+    response.headers[CONTENT_ENCODING_HEADER] = encoding
+    weaken_etag(headers=response.headers)
+    return response
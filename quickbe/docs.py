@@ -0,0 +1,300 @@
+import os
+import json
+from threading import Lock
+from urllib.parse import quote
+from quickbe.etag import compute_etag
+from quickbe.router import PATH_PARAMETER_PATTERN
+from quickbe.endpoints import WEB_SERVER_ENDPOINTS, WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS, \
+    WEB_SERVER_ENDPOINTS_DOCS, WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES
+
+QUICKBE_DOCUMENTATION_MODE_KEY = 'QUICKBE_DOCUMENTATION_MODE'
+QUICKBE_DEVELOPERS_KEYS_KEY = 'QUICKBE_DEVELOPERS_KEYS'
+QUICKBE_API_TITLE_KEY = 'QUICKBE_API_TITLE'
+QUICKBE_API_VERSION_KEY = 'QUICKBE_API_VERSION'
+
+ENDPOINT_DOC_PATH = '/endpoint-doc/'
+# Serve endpoint docs to everyone, otherwise only to developers (`devkey` parameter)
+DOCUMENTATION_MODE = os.getenv(QUICKBE_DOCUMENTATION_MODE_KEY, '').lower().strip() in ['1', 'true', 'y', 'yes', 'on']
+OPENAPI_VERSION = '3.0.3'
+
+OPENAPI_TYPES = {
+    'string': {'type': 'string'},
+    'integer': {'type': 'integer'},
+    'float': {'type': 'number'},
+    'number': {'type': 'number'},
+    'boolean': {'type': 'boolean'},
+    'dict': {'type': 'object'},
+    'list': {'type': 'array'},
+    'date': {'type': 'string', 'format': 'date'},
+    'datetime': {'type': 'string', 'format': 'date-time'},
+    'binary': {'type': 'string', 'format': 'binary'},
+}
+PATH_CONVERTER_TYPES = {
+    'int': {'type': 'integer'},
+    'float': {'type': 'number'},
+    'uuid': {'type': 'string', 'format': 'uuid'},
+}
+
+_lock = Lock()
+# Pages and documents are built once, and again only when endpoints are added
+_built_for = None
+_doc_pages = {}
+_index_parts = []
+_openapi = None
+_dev_keys = (None, {})
+
+
+def is_documentation_mode() -> bool:
+    return DOCUMENTATION_MODE
+
+
+def developer_name(key: str) -> str:
+    """
+    Get developer name by developer key, keys are parsed again only when QUICKBE_DEVELOPERS_KEYS changes
+    :param key: Developer key (`devkey` parameter)
+    :return: Developer name or None
+    """
+    global _dev_keys
+    raw = os.getenv(QUICKBE_DEVELOPERS_KEYS_KEY, '')
+    if _dev_keys[0] != raw:
+        keys = {}
+        for dev_key in raw.split(','):
+            dev_key, _, dev_name = dev_key.strip().partition(':')
+            if dev_key:
+                keys[dev_key] = dev_name
+        _dev_keys = (raw, keys)
+    if not key:
+        return None
+    return _dev_keys[1].get(key.strip())
+
+
+def _schema_rows(schema: dict, rows: list, prefix: str = ''):
+    for name, value in schema.items():
+        row = [f'<tr><td><b>{prefix}{name}</b>']
+        if value.get('required', False):
+            row.append(' *required')
+        row.append(f'</td> <td>{value.get("type", "string")}</td><td>{value.get("doc", "")}')
+        if 'default' in value:
+            row.append(f'<br>Default: <b>{value.get("default")}</b>')
+        if 'allowed' in value:
+            row.append(f'<br>Allowed: <b>{", ".join([str(item) for item in value.get("allowed")])}</b>')
+        if 'min' in value:
+            row.append(f'<br>Minimum: <b>{value.get("min")}</b>')
+        if 'max' in value:
+            row.append(f'<br>Maximum: <b>{value.get("max")}</b>')
+        if 'example' in value:
+            row.append(f'<br>Example: <b>{value.get("example")}</b>')
+        row.append('</td></tr>')
+        rows.append(''.join(row))
+        if value.get('type') == 'dict' and isinstance(value.get('schema'), dict):
+            _schema_rows(schema=value['schema'], rows=rows, prefix=f'{prefix}{name}.')
+
+
+def schema_documentation(schema: dict, prefix: str = '') -> str:
+    """
+    Generate documentation table rows by schema
+    :param schema: Validation schema
+    :param prefix: Prefix of field names (e.g `parent.` for nested fields)
+    :return: HTML
+    """
+    rows = []
+    _schema_rows(schema=schema, rows=rows, prefix=prefix)
+    return ''.join(rows)
+
+
+def _endpoint_schema(path: str) -> dict:
+    compiled_validation = WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS.get(path)
+    return None if compiled_validation is None else compiled_validation.schema
+
+
+def _render_endpoint_doc(path: str) -> str:
+    parts = [f'<html><body><h2>Path: /{path}</h2>{WEB_SERVER_ENDPOINTS_DOCS.get(path, "")}']
+    schema = _endpoint_schema(path=path)
+    if schema:
+        parts.append(
+            '<h3>Parameters</h3><table cellpadding="10"><tr><th>Name</td><th>Type</td><th>Description</td></tr>'
+        )
+        parts.append(f'{schema_documentation(schema=schema)}</table>')
+    if path in WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES:
+        example_response = WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES.get(path)
+        parts.append(f'<h3>Response</h3><pre>{json.dumps(example_response, indent=4, default=str)}</pre>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def _openapi_schema(rules: dict) -> dict:
+    schema = dict(OPENAPI_TYPES.get(rules.get('type'), {}))
+    if 'doc' in rules:
+        schema['description'] = str(rules['doc'])
+    if 'example' in rules:
+        schema['example'] = rules['example']
+    if 'default' in rules:
+        schema['default'] = rules['default']
+    if 'allowed' in rules:
+        schema['enum'] = list(rules['allowed'])
+    if rules.get('nullable', False):
+        schema['nullable'] = True
+    is_text = schema.get('type') == 'string'
+    if 'min' in rules:
+        schema['minimum'] = rules['min']
+    if 'max' in rules:
+        schema['maximum'] = rules['max']
+    if 'minlength' in rules:
+        schema['minItems' if schema.get('type') == 'array' else 'minLength'] = rules['minlength']
+    if 'maxlength' in rules:
+        schema['maxItems' if schema.get('type') == 'array' else 'maxLength'] = rules['maxlength']
+    if is_text and 'regex' in rules:
+        schema['pattern'] = rules['regex']
+    nested = rules.get('schema')
+    if schema.get('type') == 'object' and isinstance(nested, dict):
+        schema.update(_openapi_object(schema=nested, allow_unknown=rules.get('allow_unknown', True)))
+    elif schema.get('type') == 'array':
+        schema['items'] = _openapi_schema(rules=nested) if isinstance(nested, dict) else {}
+    return schema
+
+
+def _openapi_object(schema: dict, allow_unknown: bool = True) -> dict:
+    result = {
+        'type': 'object',
+        'properties': {name: _openapi_schema(rules=rules) for name, rules in schema.items()},
+    }
+    required = [name for name, rules in schema.items() if rules.get('required', False)]
+    if required:
+        result['required'] = required
+    if allow_unknown is False:
+        result['additionalProperties'] = False
+    return result
+
+
+def _openapi_path(path: str) -> (str, list):
+    """
+    :return: Tuple of OpenAPI path template and path parameters
+    """
+    segments = []
+    parameters = []
+    for segment in path.split('/'):
+        match = PATH_PARAMETER_PATTERN.match(segment)
+        if match is None:
+            segments.append(segment)
+            continue
+        name = match.group('name')
+        segments.append(f'{{{name}}}')
+        parameters.append({
+            'name': name,
+            'in': 'path',
+            'required': True,
+            'schema': dict(PATH_CONVERTER_TYPES.get(match.group('converter'), {'type': 'string'})),
+        })
+    return '/' + '/'.join(segments), parameters
+
+
+def _openapi_operations(path: str) -> (str, dict):
+    openapi_path, path_parameters = _openapi_path(path=path)
+    doc = WEB_SERVER_ENDPOINTS_DOCS.get(path)
+    response = {'description': 'Success'}
+    if path in WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES:
+        response['content'] = {'application/json': {'example': WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES[path]}}
+    responses = {'200': response}
+    operation_id = ''.join(char if char.isalnum() else '_' for char in path).strip('_') or 'root'
+
+    get_operation = {'operationId': f'get_{operation_id}', 'responses': responses}
+    post_operation = {'operationId': f'post_{operation_id}', 'responses': responses}
+    if doc is not None:
+        get_operation['summary'] = post_operation['summary'] = str(doc)
+
+    parameters = list(path_parameters)
+    schema = _endpoint_schema(path=path)
+    if schema:
+        path_names = {parameter['name'] for parameter in path_parameters}
+        body_schema = {name: rules for name, rules in schema.items() if name not in path_names}
+        if body_schema:
+            responses['400'] = {'description': 'Validation errors, by field name'}
+            post_operation['requestBody'] = {
+                'content': {'application/json': {'schema': _openapi_object(schema=body_schema)}}
+            }
+            # Query string carries flat fields only
+            parameters.extend(
+                {
+                    'name': name,
+                    'in': 'query',
+                    'required': bool(rules.get('required', False)),
+                    'schema': _openapi_schema(rules=rules),
+                }
+                for name, rules in body_schema.items() if rules.get('type') not in ['dict', 'list']
+            )
+        for parameter in path_parameters:
+            if parameter['name'] in schema:
+                parameter['schema'] = _openapi_schema(rules=schema[parameter['name']])
+    if parameters:
+        get_operation['parameters'] = parameters
+    if path_parameters:
+        post_operation['parameters'] = path_parameters
+    return openapi_path, {'get': get_operation, 'post': post_operation}
+
+
+def _build_openapi() -> dict:
+    paths = {}
+    for path in sorted(WEB_SERVER_ENDPOINTS):
+        openapi_path, operations = _openapi_operations(path=path)
+        paths[openapi_path] = operations
+    return {
+        'openapi': OPENAPI_VERSION,
+        'info': {
+            'title': os.getenv(QUICKBE_API_TITLE_KEY, 'Quickbe API'),
+            'version': os.getenv(QUICKBE_API_VERSION_KEY, '1.0.0'),
+        },
+        'paths': paths,
+    }
+
+
+def _build():
+    global _built_for, _doc_pages, _index_parts, _openapi
+    with _lock:
+        if _built_for == len(WEB_SERVER_ENDPOINTS):
+            return
+        doc_pages = {path: _render_endpoint_doc(path=path) for path in WEB_SERVER_ENDPOINTS}
+        index_parts = [
+            (f'<a href="{ENDPOINT_DOC_PATH}{path}', f'"><h3>{path}</h3></a>{doc}<br>')
+            for path, doc in sorted(WEB_SERVER_ENDPOINTS_DOCS.items())
+        ]
+        document = json.dumps(_build_openapi(), indent=2, default=str).encode()
+        _doc_pages, _index_parts, _openapi = doc_pages, index_parts, (document, compute_etag(payload=document))
+        # Endpoints are never removed, number of endpoints tells if documentation is current
+        _built_for = len(WEB_SERVER_ENDPOINTS)
+
+
+def _ensure_built():
+    if _built_for != len(WEB_SERVER_ENDPOINTS):
+        _build()
+
+
+def endpoint_doc_html(path: str) -> str:
+    """
+    Documentation page of an endpoint, rendered once
+    :param path: Endpoint path as registered
+    :return: HTML, None if there is no such endpoint
+    """
+    _ensure_built()
+    return _doc_pages.get(path)
+
+
+def endpoints_index_html(devkey: str = None) -> str:
+    """
+    Endpoints index page, rendered once (links carry developer key)
+    :param devkey: Developer key to add to documentation links
+    :return: HTML
+    """
+    _ensure_built()
+    query = f'?devkey={quote(devkey)}' if devkey else ''
+    links = ''.join(f'{link}{query}{rest}' for link, rest in _index_parts)
+    return f'<html><title>Endpoints index</title><body><h1>Endpoints Index</h1><div style="margin-left:20px">' \
+           f'{links}</div></body></html>'
+
+
+def openapi_document() -> (bytes, str):
+    """
+    OpenAPI 3 document of all endpoints, built from validation schemas, docs and examples
+    :return: Tuple of JSON document and its ETag
+    """
+    _ensure_built()
+    return _openapi
@@ -0,0 +1,660 @@
+from quickbelog import Log
+from inspect import getfullargspec, iscoroutinefunction, isawaitable
+from quickbe.router import Router
+from quickbe.schema import CompiledSchema, compile_schema
+from quickbe.etag import etag_matches, quote_etag, ETAG_HEADER, IF_NONE_MATCH_HEADER, NOT_MODIFIED_STATUS
+from quickbe.metrics import ENDPOINTS_METRICS, UNMATCHED_ENDPOINT
+from quickbe.headers import get_header
+from quickbe.filters import get_filter_chain, set_endpoint_filters, endpoint_filter_entries
+from quickbe.timing import measure, PARSE_PHASE, VALIDATE_PHASE, HANDLER_PHASE
+from quickbe.streams import iter_records, as_stream, is_streamable, InvalidRequestBody, StreamingBody
+
+WEB_SERVER_ENDPOINTS = {}
+WEB_SERVER_ROUTER = Router()
+WEB_SERVER_ENDPOINTS_VALIDATIONS = {}
+WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS = {}
+WEB_SERVER_ENDPOINTS_DOCS = {}
+WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES = {}
+WEB_SERVER_ENDPOINTS_CACHES = {}
+WEB_SERVER_ENDPOINTS_ETAGS = {}
+WEB_SERVER_ENDPOINTS_COMPRESSION = {}
+WEB_SERVER_ENDPOINTS_STREAM_BODY = {}
+WEB_SERVER_ENDPOINTS_RATE_LIMITS = {}
+WEB_SERVER_ENDPOINTS_BULKHEADS = {}
+
+
+def _endpoint_validator_factory(schema: dict):
+    """
+    Cerberus is imported on first use only, endpoints with compiled schemas (and AWS Lambda cold starts) do not need it
+    """
+    def factory():
+        from quickbe.validator import EndPointValidator
+        return EndPointValidator.for_endpoint(schema=schema)
+    return factory
+
+
+def get_endpoint_validator(path: str):
+    """
+    Get endpoint Cerberus validator, for schema information. Validator is created on first call.
+    The instance is shared, use get_endpoint_compiled_validation to validate data.
+    :return: EndPointValidator or None
+    """
+    validator = WEB_SERVER_ENDPOINTS_VALIDATIONS.get(path)
+    if validator is None:
+        compiled_validation = WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS.get(path)
+        if compiled_validation is not None:
+            validator = _endpoint_validator_factory(schema=compiled_validation.schema)()
+            WEB_SERVER_ENDPOINTS_VALIDATIONS[path] = validator
+    return validator
+
+
+def get_endpoint_compiled_validation(path: str) -> CompiledSchema:
+    return WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS.get(path)
+
+
+def get_endpoint_bulkhead(path: str):
+    return WEB_SERVER_ENDPOINTS_BULKHEADS.get(path)
+
+
+def get_endpoint_cache(path: str):
+    return WEB_SERVER_ENDPOINTS_CACHES.get(path)
+
+
+def is_endpoint_etag_on(path: str) -> bool:
+    return WEB_SERVER_ENDPOINTS_ETAGS.get(path, False)
+
+
+def is_endpoint_compression_on(path: str) -> bool:
+    return WEB_SERVER_ENDPOINTS_COMPRESSION.get(path, True)
+
+
+def is_endpoint_stream_body(path: str) -> bool:
+    return WEB_SERVER_ENDPOINTS_STREAM_BODY.get(path, False)
+
+
+def match_endpoint(path: str) -> tuple:
+    """
+    Match a requested path once per request, functions that take `match` do not match it again
+    :param path: Requested path
+    :return: Tuple of route and path parameters, (None, None) if no endpoint matches
+    """
+    return WEB_SERVER_ROUTER.match(path=path)
+
+
+def is_stream_body_request(path: str, match: tuple = None) -> bool:
+    """
+    Check if a requested path is handled by a `stream_body` endpoint, before the request body is read
+    :param path: Requested path
+    :param match: Result of match_endpoint for the path
+    :return: True if request body should not be parsed
+    """
+    if not WEB_SERVER_ENDPOINTS_STREAM_BODY:
+        return False
+    route, _ = WEB_SERVER_ROUTER.match(path=path) if match is None else match
+    return route is not None and is_endpoint_stream_body(path=route.path)
+
+
+def resolve_rate_limit(path: str, match: tuple = None) -> (str, object):
+    """
+    Rate limit of a requested path, before the request body is read
+    :param path: Requested path
+    :param match: Result of match_endpoint for the path
+    :return: Tuple of endpoint path and RateLimit, (None, None) if endpoint has no rate limit
+    """
+    if not WEB_SERVER_ENDPOINTS_RATE_LIMITS:
+        return None, None
+    route, _ = WEB_SERVER_ROUTER.match(path=path) if match is None else match
+    if route is None:
+        return None, None
+    return route.path, WEB_SERVER_ENDPOINTS_RATE_LIMITS.get(route.path)
+
+
+def resolve_filter_chain(path: str, batch_item: bool = False, match: tuple = None) -> tuple:
+    """
+    Web filters for a requested path, resolved once per endpoint
+    :param path: Requested path
+    :param batch_item: Skip global filters that are batch safe, they already ran for the batch
+    :param match: Result of match_endpoint for the path
+    :return: Tuple of filter functions
+    """
+    route, _ = WEB_SERVER_ROUTER.match(path=path) if match is None else match
+    return get_filter_chain(endpoint_path=None if route is None else route.path, batch_item=batch_item)
+
+
+def is_valid_http_handler(func) -> bool:
+    args_spec = getfullargspec(func=func)
+    try:
+        args_spec.annotations.pop('return')
+    except KeyError:
+        pass
+    arg_types = args_spec.annotations.values()
+    if len(arg_types) == 1 and issubclass(list(arg_types)[0], HttpSession):
+        return True
+    else:
+        raise TypeError(
+            f'Function {func.__qualname__} needs one argument, type {HttpSession.__qualname__}.Got spec: {args_spec}'
+        )
+
+
+def endpoint(
+        path: str = None, validation: dict = None, doc: str = None, example=None, cache=None, etag: bool = False,
+        compress: bool = True, stream_body: bool = False, filters: list = None, rate_limit=None,
+        max_concurrency: int = None, max_queue: int = 0, timeout: float = None
+):
+    """
+    Endpoint decorator
+    :param path: Web path (route) to map, may contain parameters, e.g `users/<int:user_id>/orders`.
+        Supported converters are string (default), int, float, uuid and path.
+        Parameters are added to session data before validation.
+    :param validation: Validation schema, check this for more info https://docs.python-cerberus.org/en/stable/
+    :param doc: Documentation text
+    :param example: Example for function response
+    :param cache: Cache responses, EndpointCache, dict of EndpointCache arguments (ttl, max_entries, keys, headers,
+        per_user) or TTL in seconds. Cache key is built from session data after validation.
+    :param etag: Add strong ETag (hash of response body) to GET responses and answer If-None-Match with 304
+    :param compress: Compress response by Accept-Encoding header (gzip or deflate), set False to opt out
+    :param stream_body: Do not parse request body, the endpoint reads records (NDJSON lines or JSON array items)
+        incrementally with `session.records()`. Validation schema applies to every record
+        (`session.validated_records()`), not to session data.
+    :param filters: Web filters for this endpoint only, functions or tuples of function and priority (default 0).
+        They run after route filters of the same priority.
+    :param rate_limit: Requests per second, RateLimit or dict of RateLimit arguments (rate, burst, per_client).
+        Requests over the limit get status 429 before the request body is read.
+    :param max_concurrency: Requests of this endpoint that run at once, so a slow endpoint does not take every
+        worker thread
+    :param max_queue: Requests that wait for a free slot, requests over it get status 503 at once
+    :param timeout: Seconds a request may take (waiting included), then it gets status 504. Coroutine endpoints
+        are cancelled, other endpoints are abandoned and run on a bulkhead thread, with a copy of the request
+        context (Flask `request` is available until the request is answered).
+    :return:
+    """
+
+    def decorator(func):
+        global WEB_SERVER_ENDPOINTS
+        global WEB_SERVER_ENDPOINTS_VALIDATIONS
+        global WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS
+        global WEB_SERVER_ENDPOINTS_DOCS
+        global WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES
+        global WEB_SERVER_ENDPOINTS_CACHES
+        global WEB_SERVER_ENDPOINTS_ETAGS
+        global WEB_SERVER_ENDPOINTS_COMPRESSION
+        global WEB_SERVER_ENDPOINTS_STREAM_BODY
+        global WEB_SERVER_ENDPOINTS_RATE_LIMITS
+        global WEB_SERVER_ENDPOINTS_BULKHEADS
+        if path is None:
+            web_path = str(func.__qualname__).lower().replace('.', '/').strip()
+        else:
+            web_path = path.strip()
+
+        if web_path.startswith('/') and len(web_path) > 0:
+            web_path = web_path[1:]
+
+        if is_valid_http_handler(func=func):
+            Log.debug(f'Registering endpoint: Path={web_path}, Function={func.__qualname__}')
+            if web_path in WEB_SERVER_ENDPOINTS:
+                raise FileExistsError(f'Endpoint {web_path} already exists.')
+            if stream_body and cache is not None:
+                raise ValueError(f'Endpoint {web_path} can not cache responses of a streamed request body.')
+            for web_filter, _ in endpoint_filter_entries(filters=filters or []):
+                is_valid_http_handler(func=web_filter)
+            endpoint_rate_limit = None
+            if rate_limit is not None:
+                from quickbe.admission import RateLimit
+                endpoint_rate_limit = RateLimit.from_definition(definition=rate_limit)
+            bulkhead = None
+            if max_concurrency is not None or timeout is not None:
+                from quickbe.bulkhead import Bulkhead
+                bulkhead = Bulkhead(max_concurrency=max_concurrency, max_queue=max_queue, timeout=timeout)
+
+            WEB_SERVER_ROUTER.add(path=web_path, value=func)
+            WEB_SERVER_ENDPOINTS[web_path] = func
+
+            if isinstance(validation, dict):
+                validator_factory = _endpoint_validator_factory(schema=validation)
+                compiled_validation = compile_schema(schema=validation, fallback_factory=validator_factory)
+                if not compiled_validation.is_compiled:
+                    # Cerberus checks the schema, so a bad one still fails on registration
+                    WEB_SERVER_ENDPOINTS_VALIDATIONS[web_path] = validator_factory()
+                WEB_SERVER_ENDPOINTS_COMPILED_VALIDATIONS[web_path] = compiled_validation
+
+            if doc is not None:
+                WEB_SERVER_ENDPOINTS_DOCS[web_path] = doc
+
+            if example is not None:
+                WEB_SERVER_ENDPOINTS_EXAMPLE_RESPONSES[web_path] = example
+
+            if cache is not None:
+                from quickbe.cache import EndpointCache
+                WEB_SERVER_ENDPOINTS_CACHES[web_path] = EndpointCache.from_definition(definition=cache)
+
+            if etag:
+                WEB_SERVER_ENDPOINTS_ETAGS[web_path] = True
+
+            if not compress:
+                WEB_SERVER_ENDPOINTS_COMPRESSION[web_path] = False
+
+            if stream_body:
+                WEB_SERVER_ENDPOINTS_STREAM_BODY[web_path] = True
+
+            if filters:
+                set_endpoint_filters(endpoint_path=web_path, filters=filters)
+
+            if endpoint_rate_limit is not None:
+                WEB_SERVER_ENDPOINTS_RATE_LIMITS[web_path] = endpoint_rate_limit
+
+            if bulkhead is not None:
+                WEB_SERVER_ENDPOINTS_BULKHEADS[web_path] = bulkhead
+            return func
+
+    return decorator
+
+
+class HttpSession:
+    """
+    Request data and response status of an endpoint call. Request body is parsed (by body_loader) and merged
+    with parameters on first access to data, so requests rejected by web filters do not pay for it.
+    """
+
+    __slots__ = (
+        '_response_status', '_response_headers', '_user_id', '_endpoint_path', '_body_stream', '_stream_options',
+        '_headers', '_body', '_body_loader', '_parameters', '_path_parameters', '_data', '_timing'
+    )
+
+    def __init__(
+            self, body: dict = None, parameters: dict = None, headers: dict = None, body_stream=None, body_loader=None,
+            timing=None
+    ):
+        """
+        :param body: Request body
+        :param parameters: Request parameters (e.g query string), override body fields
+        :param headers: Request headers
+        :param body_stream: Unparsed request body, for `stream_body` endpoints
+        :param body_loader: Function that parses and returns request body, called on first access to data
+        :param timing: quickbe.timing.ServerTiming, to measure request phases
+        """
+        self._response_status = 200
+        self._response_headers = {}
+        self._user_id = None
+        self._endpoint_path = None
+        self._body_stream = body_stream
+        self._stream_options = None
+        self._headers = headers
+        self._body = body
+        self._body_loader = body_loader
+        self._parameters = parameters if isinstance(parameters, dict) else None
+        self._path_parameters = None
+        self._data = None
+        self._timing = timing
+
+    def _copy(self):
+        """
+        :return: Session with the same request data and its own response status and headers
+        """
+        session = HttpSession.__new__(HttpSession)
+        for name in HttpSession.__slots__:
+            setattr(session, name, getattr(self, name))
+        session._response_headers = dict(self._response_headers)
+        return session
+
+    def _update(self, session):
+        """
+        Take request data and response of a session copy (e.g a bulkhead run that finished in time)
+        """
+        for name in HttpSession.__slots__:
+            setattr(self, name, getattr(session, name))
+
+    def _load_data(self) -> dict:
+        if self._body_loader is None:
+            body = self._body
+        elif self._timing is None:
+            body = self._body_loader()
+        else:
+            with self._timing.measure(name=PARSE_PHASE):
+                body = self._body_loader()
+        if body is None:
+            body = {}
+        if self._parameters:
+            body.update(self._parameters)
+        if self._path_parameters:
+            body.update(self._path_parameters)
+        self._body = self._body_loader = self._parameters = self._path_parameters = None
+        return body
+
+    def _add_path_parameters(self, path_parameters: dict):
+        if self._data is None:
+            self._path_parameters = path_parameters
+        else:
+            self._data.update(path_parameters)
+
+    @property
+    def request_headers(self) -> dict:
+        return self._headers
+
+    @property
+    def body_stream(self):
+        """
+        Unparsed request body (binary stream), for `stream_body` endpoints
+        """
+        return self._body_stream
+
+    def records(self):
+        """
+        Records of a streamed request body (NDJSON lines or JSON array items), parsed as they are read
+        :return: Generator of records
+        """
+        return iter_records(body=self._body_stream)
+
+    def validated_records(self):
+        """
+        Records of a streamed request body, normalized and validated by endpoint schema
+        :return: Generator of tuples (record, errors), errors is None if record is valid
+        """
+        compiled_validation = get_endpoint_compiled_validation(path=self._endpoint_path)
+        for record in self.records():
+            if compiled_validation is None:
+                yield record, None
+            else:
+                yield compiled_validation(record)
+
+    def stream(self, mimetype: str = None, chunk_size: int = None, encoder=None):
+        """
+        Set how a generator (or any iterator) returned by the endpoint is streamed
+        :param mimetype: Content type, default is taken from encoder
+        :param chunk_size: Group items up to this number of bytes, 0 to send every item as it comes
+        :param encoder: Function that gets an item and returns bytes, or encoder name (`ndjson` or `csv`)
+        :return:
+        """
+        self._stream_options = {'mimetype': mimetype, 'chunk_size': chunk_size, 'encoder': encoder}
+
+    @property
+    def data(self) -> dict:
+        data = self._data
+        if data is None:
+            data = self._data = self._load_data()
+        return data
+
+    @property
+    def response_status(self) -> int:
+        return self._response_status
+
+    @property
+    def response_headers(self) -> dict:
+        return self._response_headers
+
+    def get(self, name: str, default=None):
+        if self._data is None:
+            # Path and query parameters override body fields, they are read without parsing the body
+            if self._path_parameters and name in self._path_parameters:
+                return self._path_parameters[name]
+            if self._parameters and name in self._parameters:
+                return self._parameters[name]
+        return self.data.get(name, default)
+
+    def set_status(self, status: int):
+        self._response_status = status
+
+    def set_response_header(self, key: str, value: str):
+        self._response_headers[key] = value
+
+    @property
+    def user_id(self) -> str:
+        return self._user_id
+
+    def set_user_id(self, user_id: str):
+        self._user_id = user_id
+
+    @property
+    def endpoint_path(self) -> str:
+        """
+        Path of the endpoint (as registered) that handles this session, None before it is resolved
+        """
+        return self._endpoint_path
+
+    def set_etag(self, version, weak: bool = False):
+        """
+        Set response ETag from a version value
+        :param version: Version of the response content (e.g: revision number or update timestamp)
+        :param weak: Weak ETag
+        :return:
+        """
+        self._response_headers[ETAG_HEADER] = quote_etag(version=version, weak=weak)
+
+    def is_not_modified(self, version=None, weak: bool = False) -> bool:
+        """
+        Check if client version is current (by If-None-Match header), before doing expensive work.
+        If it is, response status is set to 304 and endpoint may return without a body.
+        :param version: Version of the response content, sets response ETag
+        :param weak: Weak ETag
+        :return: True if client version is current
+        """
+        if version is not None:
+            self.set_etag(version=version, weak=weak)
+        etag = get_header(self._response_headers, ETAG_HEADER)
+        if etag_matches(if_none_match=get_header(self._headers, IF_NONE_MATCH_HEADER), etag=etag):
+            self.set_status(NOT_MODIFIED_STATUS)
+            return True
+        return False
+
+
+def _resolve_endpoint(path: str, match: tuple = None) -> (str, object, dict):
+    """
+    Find the endpoint for a requested path
+    :param path: Requested path
+    :param match: Result of match_endpoint for the path
+    :return: Tuple of endpoint path (as registered), function and path parameters
+    """
+    route, path_params = WEB_SERVER_ROUTER.match(path=path) if match is None else match
+    if route is None:
+        raise NotImplementedError(f'No implementation for path /{path}.')
+    return route.path, route.value, path_params
+
+
+def _endpoint_function(path: str):
+    return _resolve_endpoint(path=path)[1]
+
+
+def _new_session(path: str, headers: dict, body, parameters: dict, match: tuple = None) -> HttpSession:
+    if is_stream_body_request(path=path, match=match):
+        return HttpSession(parameters=parameters, headers=headers, body_stream=as_stream(body))
+    return HttpSession(body=body, parameters=parameters, headers=headers)
+
+
+def execute_endpoint(path: str, headers: dict, body: dict, parameters: dict) -> (dict, dict, int):
+    """
+    Execute endpoint
+    :param path: Requested path
+    :param headers: Request headers
+    :param body: Request body, for `stream_body` endpoints bytes, str, binary stream or list of records
+    :param parameters: Request parameters
+    :return: Tuple of response body, headers and status code
+    """
+    match = match_endpoint(path=path)
+    session = _new_session(path=path, headers=headers, body=body, parameters=parameters, match=match)
+    return execute_endpoint_with_session(path=path, session=session, match=match)
+
+
+async def execute_endpoint_async(path: str, headers: dict, body: dict, parameters: dict) -> (dict, dict, int):
+
+    match = match_endpoint(path=path)
+    session = _new_session(path=path, headers=headers, body=body, parameters=parameters, match=match)
+    return await execute_endpoint_with_session_async(path=path, session=session, match=match)
+
+
+def _session_endpoint(path: str, session: HttpSession, match: tuple = None) -> (str, object):
+    """
+    Resolve endpoint and add path parameters to session data
+    :param path: Requested path
+    :param session: HTTP session
+    :param match: Result of match_endpoint for the path
+    :return: Tuple of endpoint path (as registered) and function
+    """
+    try:
+        endpoint_path, func, path_params = _resolve_endpoint(path=path, match=match)
+    except NotImplementedError:
+        ENDPOINTS_METRICS.record(endpoint=UNMATCHED_ENDPOINT, status=404)
+        raise
+    if path_params:
+        session._add_path_parameters(path_params)
+    session._endpoint_path = endpoint_path
+    return endpoint_path, func
+
+
+def _validate_session(endpoint_path: str, session: HttpSession) -> dict:
+    """
+    Validate and normalize session data
+    :param endpoint_path: Endpoint path (as registered)
+    :param session: HTTP session
+    :return: Validation errors, None if data is valid
+    """
+    compiled_validation = get_endpoint_compiled_validation(path=endpoint_path)
+    if compiled_validation is not None and not is_endpoint_stream_body(path=endpoint_path):
+        data, errors = compiled_validation(session.data)
+        if errors is not None:
+            return errors
+        # Compiled schemas copy data only when normalization changes it
+        if data is not session._data:
+            session._data = data
+    return None
+
+
+def _streaming_body(session: HttpSession, resp_body):
+    """
+    Wrap iterator responses (e.g generators) so web server and AWS Lambda handlers stream them
+    """
+    if is_streamable(resp_body):
+        return StreamingBody(iterable=resp_body, **(session._stream_options or {}))
+    return resp_body
+
+
+def _run_endpoint_function(func, session: HttpSession):
+    try:
+        resp_body = func(session)
+        if isawaitable(resp_body):
+            from quickbe.aio import run_coroutine
+            resp_body = run_coroutine(resp_body)
+    except InvalidRequestBody as e:
+        session.set_status(400)
+        return f'{e}'
+    return _streaming_body(session=session, resp_body=resp_body)
+
+
+async def _run_endpoint_function_async(func, session: HttpSession):
+    try:
+        if iscoroutinefunction(func):
+            resp_body = await func(session)
+        else:
+            from quickbe.aio import run_in_executor
+            resp_body = await run_in_executor(func, session)
+            if isawaitable(resp_body):
+                resp_body = await resp_body
+    except InvalidRequestBody as e:
+        session.set_status(400)
+        return f'{e}'
+    return _streaming_body(session=session, resp_body=resp_body)
+
+
+def _bulkhead_runner(func):
+    # Coroutine is awaited on the event loop, so timeout cancels it, other functions run on a bulkhead thread
+    return _run_endpoint_function_async if iscoroutinefunction(func) else _run_endpoint_function
+
+
+def _run_session(bulkhead, session: HttpSession) -> HttpSession:
+    # Run that times out is abandoned, it gets a copy of the session so it can not change the 504 response
+    return session if bulkhead.timeout is None else session._copy()
+
+
+def _bulkhead_response(session: HttpSession, run_session: HttpSession, resp_body, status: int):
+    if status is not None:
+        return _bulkhead_rejection(session=session, status=status)
+    if run_session is not session:
+        session._update(run_session)
+    return resp_body
+
+
+def _run_in_bulkhead(endpoint_path: str, func, session: HttpSession):
+    bulkhead = get_endpoint_bulkhead(path=endpoint_path)
+    if bulkhead is None:
+        return _run_endpoint_function(func=func, session=session)
+    run_session = _run_session(bulkhead=bulkhead, session=session)
+    resp_body, status = bulkhead.run(_bulkhead_runner(func), func, run_session)
+    return _bulkhead_response(session=session, run_session=run_session, resp_body=resp_body, status=status)
+
+
+async def _run_in_bulkhead_async(endpoint_path: str, func, session: HttpSession):
+    bulkhead = get_endpoint_bulkhead(path=endpoint_path)
+    if bulkhead is None:
+        return await _run_endpoint_function_async(func=func, session=session)
+    run_session = _run_session(bulkhead=bulkhead, session=session)
+    resp_body, status = await bulkhead.run_async(_bulkhead_runner(func), func, run_session)
+    return _bulkhead_response(session=session, run_session=run_session, resp_body=resp_body, status=status)
+
+
+def _bulkhead_rejection(session: HttpSession, status: int) -> str:
+    from quickbe.bulkhead import REJECTED_STATUS, REJECTED_MESSAGE, TIMED_OUT_MESSAGE
+    session.set_status(status)
+    return REJECTED_MESSAGE if status == REJECTED_STATUS else TIMED_OUT_MESSAGE
+
+
+def execute_endpoint_with_session(path: str, session: HttpSession, match: tuple = None) -> (dict, dict, int):
+    """
+    Execute endpoint
+    :param path: Requested path
+    :param session: HTTP session
+    :param match: Result of match_endpoint for the path, when the caller matched it already
+    :return: Tuple of response body, headers and status code
+    """
+    endpoint_path, func = _session_endpoint(path=path, session=session, match=match)
+    with ENDPOINTS_METRICS.measure(endpoint=endpoint_path) as measurement:
+        with measure(timing=session._timing, name=VALIDATE_PHASE):
+            errors = _validate_session(endpoint_path=endpoint_path, session=session)
+        if errors is not None:
+            measurement.status = 400
+            return errors, session.response_headers, 400
+
+        endpoint_cache = get_endpoint_cache(path=endpoint_path)
+        with measure(timing=session._timing, name=HANDLER_PHASE):
+            if endpoint_cache is None:
+                resp_body = _run_in_bulkhead(endpoint_path=endpoint_path, func=func, session=session)
+            else:
+                resp_body = endpoint_cache.execute(
+                    session=session,
+                    func=lambda cached_session: _run_in_bulkhead(
+                        endpoint_path=endpoint_path, func=func, session=cached_session
+                    )
+                )
+        measurement.status = session.response_status
+    return resp_body, session.response_headers, session.response_status
+
+
+async def execute_endpoint_with_session_async(
+        path: str, session: HttpSession, match: tuple = None
+) -> (dict, dict, int):
+    """
+    Execute endpoint from asynchronous code. Coroutine endpoints are awaited,
+    other endpoints run on a bounded thread pool so they do not block the event loop.
+    :param path: Requested path
+    :param session: HTTP session
+    :param match: Result of match_endpoint for the path, when the caller matched it already
+    :return: Tuple of response body, headers and status code
+    """
+    endpoint_path, func = _session_endpoint(path=path, session=session, match=match)
+    with ENDPOINTS_METRICS.measure(endpoint=endpoint_path) as measurement:
+        with measure(timing=session._timing, name=VALIDATE_PHASE):
+            errors = _validate_session(endpoint_path=endpoint_path, session=session)
+        if errors is not None:
+            measurement.status = 400
+            return errors, session.response_headers, 400
+
+        endpoint_cache = get_endpoint_cache(path=endpoint_path)
+        with measure(timing=session._timing, name=HANDLER_PHASE):
+            if endpoint_cache is None:
+                resp_body = await _run_in_bulkhead_async(endpoint_path=endpoint_path, func=func, session=session)
+            else:
+                resp_body = await endpoint_cache.execute_async(
+                    session=session,
+                    func=lambda cached_session: _run_in_bulkhead_async(
+                        endpoint_path=endpoint_path, func=func, session=cached_session
+                    )
+                )
+        measurement.status = session.response_status
+    return resp_body, session.response_headers, session.response_status
@@ -0,0 +1,81 @@
+from hashlib import blake2b
+from quickbe.headers import get_header
+
+ETAG_HEADER = 'ETag'
+IF_NONE_MATCH_HEADER = 'If-None-Match'
+NOT_MODIFIED_STATUS = 304
+CONDITIONAL_METHODS = ['GET', 'HEAD']
+
+
+def compute_etag(payload) -> str:
+    """
+    Strong ETag of a response body
+    :param payload: Response body, bytes or str
+    :return: Quoted ETag
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return f'"{blake2b(payload, digest_size=16).hexdigest()}"'
+
+
+def quote_etag(version, weak: bool = False) -> str:
+    """
+    Make ETag from a version value (e.g: revision number or update timestamp)
+    :param version: Version
+    :param weak: Weak ETag
+    :return: Quoted ETag
+    """
+    etag = f'"{str(version).replace(chr(34), "")}"'
+    if weak:
+        etag = f'W/{etag}'
+    return etag
+
+
+def _opaque(etag: str) -> str:
+    etag = etag.strip()
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    return etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check If-None-Match header against ETag, using weak comparison (RFC 7232)
+    :param if_none_match: If-None-Match header value
+    :param etag: Quoted ETag
+    :return: True if client version is current
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etag = _opaque(etag)
+    return any(_opaque(candidate) == etag for candidate in if_none_match.split(','))
+
+
+def apply_conditional(
+        body, status: int, response_headers: dict, request_headers, request_method: str = 'GET', auto: bool = False
+) -> (object, int):
+    """
+    Response fingerprinting stage: set ETag and answer If-None-Match with 304 and no body
+    :param body: Serialized response body
+    :param status: Response status
+    :param response_headers: Response headers, ETag is added to it
+    :param request_headers: Request headers
+    :param request_method: HTTP method, conditional responses apply to GET and HEAD only
+    :param auto: Compute ETag from body when endpoint did not supply one
+    :return: Tuple of response body and status
+    """
+    if status == NOT_MODIFIED_STATUS:
+        return '', status
+    if status != 200 or (request_method or 'GET').upper() not in CONDITIONAL_METHODS:
+        return body, status
+
+    etag = get_header(response_headers, ETAG_HEADER)
+    if etag is None and auto and isinstance(body, (bytes, str)):
+        etag = compute_etag(payload=body)
+        response_headers[ETAG_HEADER] = etag
+
+    if etag is not None and etag_matches(if_none_match=get_header(request_headers, IF_NONE_MATCH_HEADER), etag=etag):
+        return '', NOT_MODIFIED_STATUS
+    return body, status
@@ -0,0 +1,204 @@
+import re
+from inspect import isawaitable
+
+DEFAULT_PRIORITY = 0
+
+
+class _FilterScope:
+
+    __slots__ = ('prefixes', 'pattern', 'priority')
+
+    def __init__(self, prefixes: list = None, pattern: str = None, priority: int = DEFAULT_PRIORITY):
+        self.prefixes = None if prefixes is None else [prefix.strip().strip('/') for prefix in prefixes]
+        self.pattern = None if pattern is None else re.compile(pattern.strip().lstrip('/'))
+        self.priority = priority
+
+    @property
+    def is_global(self) -> bool:
+        return self.prefixes is None and self.pattern is None
+
+    def applies(self, endpoint_path: str) -> bool:
+        """
+        :param endpoint_path: Endpoint path as registered (e.g `users/<int:user_id>`), None for unmatched requests
+        """
+        if self.is_global:
+            return True
+        if endpoint_path is None:
+            return False
+        if self.prefixes is not None:
+            for prefix in self.prefixes:
+                if prefix == '' or endpoint_path == prefix or endpoint_path.startswith(f'{prefix}/'):
+                    return True
+        return self.pattern is not None and self.pattern.match(endpoint_path) is not None
+
+
+_GLOBAL_SCOPE = _FilterScope()
+_SCOPES = {}
+_BATCH_SAFE = set()
+_ENDPOINT_FILTERS = {}
+_CHAINS = {}
+_version = 0
+
+
+def invalidate_filter_chains():
+    """
+    Drop resolved filter chains, they are resolved again on next use
+    """
+    global _version
+    _version += 1
+    _CHAINS.clear()
+
+
+class FilterList(list):
+    """
+    Registered web filters, in registration order. Changes to the list invalidate resolved filter chains.
+    """
+
+    def append(self, func):
+        super().append(func)
+        invalidate_filter_chains()
+
+    def extend(self, funcs):
+        super().extend(funcs)
+        invalidate_filter_chains()
+
+    def insert(self, index, func):
+        super().insert(index, func)
+        invalidate_filter_chains()
+
+    def remove(self, func):
+        super().remove(func)
+        invalidate_filter_chains()
+
+    def pop(self, index=-1):
+        func = super().pop(index)
+        invalidate_filter_chains()
+        return func
+
+    def clear(self):
+        super().clear()
+        invalidate_filter_chains()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        invalidate_filter_chains()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        invalidate_filter_chains()
+
+    def __iadd__(self, funcs):
+        result = super().__iadd__(funcs)
+        invalidate_filter_chains()
+        return result
+
+
+WEB_FILTERS = FilterList()
+
+
+def add_filter(
+        func, paths: list = None, pattern: str = None, priority: int = DEFAULT_PRIORITY, batch_safe: bool = False
+):
+    """
+    Register a web filter. A filter that is added again with another scope runs once, for endpoints in any of its
+    scopes (with the lowest priority of the scopes that apply).
+    :param func: Filter function, gets HttpSession, a status other than 200 stops the request
+    :param paths: Run only for endpoints under these path prefixes (e.g `admin` matches `admin/users/<id>`)
+    :param pattern: Run only for endpoints which path matches this regular expression (from path start)
+    :param priority: Filters with lower priority run first, same priority runs by registration order
+    :param batch_safe: Filter reads only request headers and query parameters, a global filter then runs once per
+        batch and not again for every batch item
+    :return:
+    """
+    if batch_safe:
+        _BATCH_SAFE.add(func)
+    elif func not in WEB_FILTERS:
+        _BATCH_SAFE.discard(func)
+    if isinstance(paths, str):
+        paths = [paths]
+    scope = _FilterScope(prefixes=paths, pattern=pattern, priority=priority)
+    if func in WEB_FILTERS:
+        # Filters that were appended to the list directly are global
+        _SCOPES[func] = _SCOPES.get(func, [_GLOBAL_SCOPE]) + [scope]
+        invalidate_filter_chains()
+    else:
+        _SCOPES[func] = [scope]
+        WEB_FILTERS.append(func)
+
+
+def replace_filters(funcs: list):
+    """
+    Replace registered web filters with global filters
+    :param funcs: Filter functions, in run order
+    """
+    for func in funcs:
+        _SCOPES.pop(func, None)
+        _BATCH_SAFE.discard(func)
+    WEB_FILTERS[:] = list(funcs)
+
+
+def endpoint_filter_entries(filters: list) -> list:
+    """
+    :param filters: Filter functions or tuples of filter function and priority
+    :return: List of tuples of filter function and priority
+    """
+    return [entry if isinstance(entry, tuple) else (entry, DEFAULT_PRIORITY) for entry in filters]
+
+
+def set_endpoint_filters(endpoint_path: str, filters: list):
+    """
+    Attach filters to a single endpoint, they run after route filters of the same priority
+    :param endpoint_path: Endpoint path as registered
+    :param filters: Filter functions or tuples of filter function and priority
+    """
+    _ENDPOINT_FILTERS[endpoint_path] = endpoint_filter_entries(filters=filters)
+    invalidate_filter_chains()
+
+
+def _build_chain(endpoint_path: str, batch_item: bool) -> tuple:
+    ranked = []
+    for index, func in enumerate(WEB_FILTERS):
+        scopes = _SCOPES.get(func) or [_GLOBAL_SCOPE]
+        if batch_item and func in _BATCH_SAFE and any(scope.is_global for scope in scopes):
+            continue
+        priorities = [scope.priority for scope in scopes if scope.applies(endpoint_path=endpoint_path)]
+        if priorities:
+            ranked.append((min(priorities), 0, index, func))
+    for index, (func, priority) in enumerate(_ENDPOINT_FILTERS.get(endpoint_path, [])):
+        ranked.append((priority, 1, index, func))
+    ranked.sort(key=lambda item: item[:3])
+    return tuple(func for _, _, _, func in ranked)
+
+
+def get_filter_chain(endpoint_path: str, batch_item: bool = False) -> tuple:
+    """
+    Filters that apply to an endpoint, in run order. Chain is resolved once and kept until filters change.
+    :param endpoint_path: Endpoint path as registered, None for requests that match no endpoint (global filters only)
+    :param batch_item: Skip global filters that are batch safe, they already ran for the batch
+    :return: Tuple of filter functions
+    """
+    key = (endpoint_path, batch_item)
+    chain = _CHAINS.get(key)
+    if chain is None:
+        version = _version
+        chain = _build_chain(endpoint_path=endpoint_path, batch_item=batch_item)
+        if version == _version:
+            _CHAINS[key] = chain
+    return chain
+
+
+def apply_filter_chain(chain: tuple, session):
+    """
+    Run web filters
+    :param chain: Filter functions
+    :param session: HTTP session
+    :return: Tuple of filter response and status when a filter stopped the request, otherwise None
+    """
+    for web_filter in chain:
+        resp = web_filter(session)
+        if isawaitable(resp):
+            from quickbe.aio import run_coroutine
+            resp = run_coroutine(resp)
+        if session.response_status != 200:
+            return resp, session.response_status
+    return None
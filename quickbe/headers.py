@@ -0,0 +1,19 @@
+def get_header(headers, name: str, default=None):
+    """
+    Case-insensitive header lookup, for Flask headers and plain dicts (e.g AWS Lambda events)
+    :param headers: Headers
+    :param name: Header name
+    :param default: Value to return when header is missing
+    :return: Header value
+    """
+    if not headers:
+        return default
+    value = headers.get(name)
+    if value is not None:
+        return value
+    if isinstance(headers, dict):
+        name = name.lower()
+        for key, value in headers.items():
+            if key.lower() == name:
+                return value
+    return default
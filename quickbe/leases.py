@@ -0,0 +1,131 @@
+import os
+import time
+import socket
+import hashlib
+import sqlite3
+
+LEASES_TABLE = 'quickbe_leases'
+
+
+def instance_id() -> str:
+    """
+    Lease owner identity of this process (host and pid, pid changes in forked workers)
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class LeaseBackend:
+    """
+    Named leases shared by service instances, so a scheduled run executes on one instance only.
+    Implement `acquire` and `release` for a shared store (e.g Redis or a database table).
+    """
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        """
+        Take a lease unless another owner holds it
+        :param name: Lease name (e.g job name)
+        :param ttl: Seconds the lease is held, it is not renewed
+        :return: True if lease was taken
+        """
+        raise NotImplementedError
+
+    def release(self, name: str):
+        """
+        Give up a lease held by this instance before it expires
+        :param name: Lease name
+        """
+        raise NotImplementedError
+
+
+class FileLeaseBackend(LeaseBackend):
+    """
+    Leases as files in a directory, for instances on one host or sharing a file system that supports `flock`
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: Leases directory, created if missing
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f'{hashlib.sha1(name.encode()).hexdigest()}.lease')
+
+    def _update(self, name: str, ttl: float = None) -> bool:
+        import fcntl
+        fd = os.open(self._path(name=name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            owner, _, expires_at = os.read(fd, 1024).decode().partition(' ')
+            now = time.time()
+            is_held = owner != '' and float(expires_at or 0) > now
+            if ttl is None:
+                # Release
+                if not is_held or owner != instance_id():
+                    return False
+                record = b''
+            else:
+                if is_held:
+                    return False
+                record = f'{instance_id()} {now + ttl}'.encode()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, record)
+            return True
+        finally:
+            os.close(fd)
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        return self._update(name=name, ttl=ttl)
+
+    def release(self, name: str):
+        self._update(name=name)
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """
+    Leases in a SQLite database table
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        """
+        :param path: Database file
+        :param timeout: Seconds to wait for a locked database
+        """
+        self.path = path
+        self.timeout = timeout
+        with self._connect() as connection:
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {LEASES_TABLE} '
+                f'(name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        # Connection per call, leases are taken once per scheduled run and it is safe across forks
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def acquire(self, name: str, ttl: float) -> bool:
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    f'INSERT INTO {LEASES_TABLE} (name, owner, expires_at) VALUES (?, ?, ?) '
+                    f'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                    f'WHERE {LEASES_TABLE}.expires_at <= ?',
+                    (name, instance_id(), now + ttl, now)
+                )
+                return cursor.rowcount == 1
+        finally:
+            connection.close()
+
+    def release(self, name: str):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    f'DELETE FROM {LEASES_TABLE} WHERE name = ? AND owner = ?', (name, instance_id())
+                )
+        finally:
+            connection.close()
@@ -0,0 +1,252 @@
+from bisect import bisect_left
+from time import perf_counter
+from threading import local, Lock, current_thread
+
+
+def _log_linear_bounds(lowest: float = 0.0001, powers: int = 20, sub_buckets: int = 4) -> list:
+    """
+    HDR style bucket bounds, each power of two is split into linear sub buckets
+    :param lowest: Lowest bound
+    :param powers: Number of powers of two to cover
+    :param sub_buckets: Sub buckets per power of two
+    :return: Sorted list of bounds
+    """
+    bounds = []
+    for power in range(powers):
+        base = lowest * 2 ** power
+        for sub_bucket in range(sub_buckets):
+            bounds.append(round(base * (1 + sub_bucket / sub_buckets), 9))
+    return bounds
+
+
+# 0.1 millisecond to ~100 seconds, relative error up to 25%
+LATENCY_BUCKETS_SECONDS = _log_linear_bounds()
+# 1 millisecond to ~37 hours, for scheduled jobs
+JOB_DURATION_BUCKETS_SECONDS = _log_linear_bounds(lowest=0.001, powers=27)
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+
+class Histogram:
+    """
+    Fixed buckets histogram. Not thread safe by itself, shards are updated by a single thread and merged on read.
+    """
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds: list = None):
+        self.bounds = LATENCY_BUCKETS_SECONDS if bounds is None else bounds
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> float:
+        """
+        Approximate percentile, upper bound of the bucket that contains it (largest value for values over all bounds)
+        :param percent: 0 - 100
+        :return: Value
+        """
+        if self.count == 0:
+            return 0
+        threshold = self.count * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold and count > 0:
+                if index < len(self.bounds):
+                    return self.bounds[index]
+                return self.max
+        return self.bounds[-1]
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_seconds': self.sum / self.count if self.count else 0,
+            'p50_seconds': self.percentile(50),
+            'p90_seconds': self.percentile(90),
+            'p99_seconds': self.percentile(99),
+        }
+
+
+class _EndpointShard:
+
+    __slots__ = ('latency', 'statuses', 'errors', 'in_flight')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self.errors = 0
+        self.in_flight = 0
+
+
+class _Measurement:
+
+    __slots__ = ('_shard', '_start', 'status')
+
+    def __init__(self, shard: _EndpointShard):
+        self._shard = shard
+        self.status = 200
+
+    def __enter__(self):
+        self._shard.in_flight += 1
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        shard = self._shard
+        shard.latency.record(perf_counter() - self._start)
+        shard.in_flight -= 1
+        status = 500 if exc_type is not None else self.status
+        shard.statuses[status] = shard.statuses.get(status, 0) + 1
+        if status >= 500:
+            shard.errors += 1
+        return False
+
+
+class EndpointsMetrics:
+    """
+    Per endpoint latency histogram, requests count by status, errors count and in-flight gauge.
+    Every thread updates its own shard, so recording a request does not take a lock. Shards are merged on read,
+    shards of threads that ended are merged into retired totals, so threads per request do not add up.
+    """
+
+    def __init__(self):
+        self._local = local()
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = Lock()
+
+    def _shard(self, endpoint: str) -> _EndpointShard:
+        try:
+            shards = self._local.shards
+        except AttributeError:
+            shards = self._local.shards = {}
+            with self._shards_lock:
+                self._retire_ended_threads()
+                self._shards.append((current_thread(), shards))
+        shard = shards.get(endpoint)
+        if shard is None:
+            shard = shards[endpoint] = _EndpointShard()
+        return shard
+
+    def _retire_ended_threads(self):
+        """
+        Merge shards of threads that ended into retired totals, call with shards lock held
+        """
+        alive = []
+        for thread, shards in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shards))
+            else:
+                _merge_shards(merged=self._retired, shards=shards)
+        self._shards = alive
+
+    def measure(self, endpoint: str) -> _Measurement:
+        """
+        Measure endpoint execution, use as context manager and set `status` before exit
+        :param endpoint: Endpoint path
+        :return: Measurement
+        """
+        return _Measurement(shard=self._shard(endpoint=endpoint))
+
+    def record(self, endpoint: str, status: int, seconds: float = 0):
+        shard = self._shard(endpoint=endpoint)
+        shard.latency.record(seconds)
+        shard.statuses[status] = shard.statuses.get(status, 0) + 1
+        if status >= 500:
+            shard.errors += 1
+
+    def _merged(self) -> dict:
+        merged = {}
+        with self._shards_lock:
+            self._retire_ended_threads()
+            _merge_shards(merged=merged, shards=self._retired)
+            shards_list = [shards for _, shards in self._shards]
+        for shards in shards_list:
+            _merge_shards(merged=merged, shards=shards)
+        return merged
+
+    def snapshot(self) -> dict:
+        result = {}
+        for endpoint, shard in sorted(self._merged().items()):
+            result[endpoint] = {
+                'requests': shard.latency.count,
+                'errors': shard.errors,
+                'in_flight': shard.in_flight,
+                'statuses': {str(status): count for status, count in sorted(shard.statuses.items())},
+                'latency': shard.latency.summary(),
+            }
+        return result
+
+    def prometheus(self) -> str:
+        """
+        Metrics in Prometheus text exposition format
+        :return: Text
+        """
+        merged = sorted(self._merged().items())
+        lines = [
+            '# HELP quickbe_endpoint_duration_seconds Endpoint execution time.',
+            '# TYPE quickbe_endpoint_duration_seconds histogram',
+        ]
+        for endpoint, shard in merged:
+            label = f'endpoint="{_escape_label(endpoint)}"'
+            cumulative = 0
+            histogram = shard.latency
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'quickbe_endpoint_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'quickbe_endpoint_duration_seconds_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'quickbe_endpoint_duration_seconds_sum{{{label}}} {histogram.sum}')
+            lines.append(f'quickbe_endpoint_duration_seconds_count{{{label}}} {histogram.count}')
+
+        lines.append('# HELP quickbe_endpoint_requests_total Endpoint requests by status code.')
+        lines.append('# TYPE quickbe_endpoint_requests_total counter')
+        for endpoint, shard in merged:
+            for status, count in sorted(shard.statuses.items()):
+                lines.append(
+                    f'quickbe_endpoint_requests_total{{endpoint="{_escape_label(endpoint)}",status="{status}"}} {count}'
+                )
+
+        lines.append('# HELP quickbe_endpoint_errors_total Endpoint requests that failed with server error.')
+        lines.append('# TYPE quickbe_endpoint_errors_total counter')
+        for endpoint, shard in merged:
+            lines.append(f'quickbe_endpoint_errors_total{{endpoint="{_escape_label(endpoint)}"}} {shard.errors}')
+
+        lines.append('# HELP quickbe_endpoint_in_flight Endpoint requests in progress.')
+        lines.append('# TYPE quickbe_endpoint_in_flight gauge')
+        for endpoint, shard in merged:
+            lines.append(f'quickbe_endpoint_in_flight{{endpoint="{_escape_label(endpoint)}"}} {shard.in_flight}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge_shards(merged: dict, shards: dict):
+    for endpoint, shard in list(shards.items()):
+        total = merged.get(endpoint)
+        if total is None:
+            total = merged[endpoint] = _EndpointShard()
+        total.latency.merge(shard.latency)
+        for status, count in list(shard.statuses.items()):
+            total.statuses[status] = total.statuses.get(status, 0) + count
+        total.errors += shard.errors
+        total.in_flight += shard.in_flight
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+ENDPOINTS_METRICS = EndpointsMetrics()
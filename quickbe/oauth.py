@@ -1,5 +1,15 @@
+import os
+import re
+import json
+import time
+import base64
 from os import getenv
-from google_auth_oauthlib.flow import Flow
+from quickbelog import Log
+from collections import OrderedDict
+from urllib.request import urlopen
+from threading import Lock, Thread, Event
+from quickbe.headers import get_header
+from quickbe.endpoints import HttpSession
 
 AUTHORIZATION_FLOW_SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile",
@@ -9,10 +19,32 @@ AUTHORIZATION_FLOW_SCOPES = [
 
 AUTHORIZATION_FLOW = None
 
+QUICKBE_OAUTH_CERTS_URL_KEY = 'QUICKBE_OAUTH_CERTS_URL'
+QUICKBE_OAUTH_AUDIENCE_KEY = 'QUICKBE_OAUTH_AUDIENCE'
+QUICKBE_OAUTH_TOKEN_CACHE_SIZE_KEY = 'QUICKBE_OAUTH_TOKEN_CACHE_SIZE'
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+AUTHORIZATION_HEADER = 'Authorization'
+WWW_AUTHENTICATE_HEADER = 'WWW-Authenticate'
+
+CERTS_URL = getenv(QUICKBE_OAUTH_CERTS_URL_KEY, GOOGLE_CERTS_URL)
+TOKEN_CACHE_SIZE = int(getenv(QUICKBE_OAUTH_TOKEN_CACHE_SIZE_KEY, 10000))
+# Keys are refreshed before max-age (Cache-Control of the keys response) ends, or every hour without it
+DEFAULT_KEYS_MAX_AGE = 3600
+KEYS_RETRY_SECONDS = 60
+# Unknown key id (key rotation) refreshes keys, at most once in this number of seconds
+UNKNOWN_KEY_REFRESH_SECONDS = 30
+CLOCK_SKEW_SECONDS = 10
+
+_MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
 
 def get_authorization_flow():
     global AUTHORIZATION_FLOW
     if AUTHORIZATION_FLOW is None:
+        from google_auth_oauthlib.flow import Flow
+
         authorization_flow_redirect_uri = getenv('AUTHORIZATION_FLOW_REDIRECT_URI')
         authorization_flow_project_id = getenv('AUTHORIZATION_FLOW_PROJECT_ID')
         authorization_flow_client_id = getenv('AUTHORIZATION_FLOW_CLIENT_ID')
@@ -48,3 +80,306 @@ def get_authorization_flow():
         )
 
     return AUTHORIZATION_FLOW
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class SigningKeys:
+    """
+    Signing keys of a token issuer (e.g Google certificates), fetched once per process and refreshed
+    in a background thread before they expire, so token verification does not wait for the network.
+    """
+
+    def __init__(self, url: str, timeout: float = 10):
+        """
+        :param url: Keys URL, JSON object of key id to PEM certificate, or JWKS (`{"keys": [...]}`). JWKS keys are
+            kept as JWK dicts, default token decode (google-auth) verifies PEM certificates only.
+        :param timeout: Seconds to wait for keys response
+        """
+        self.url = url
+        self.timeout = timeout
+        self.fetches = 0
+        self._keys = None
+        self._refresh_at = 0
+        self._last_fetch = 0
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            payload = json.loads(response.read())
+            cache_control = response.headers.get('Cache-Control', '')
+        match = _MAX_AGE_PATTERN.search(cache_control)
+        max_age = int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE
+        if isinstance(payload.get('keys'), list):
+            keys = {key.get('kid'): key for key in payload['keys']}
+        else:
+            keys = payload
+        self.fetches += 1
+        self._last_fetch = time.time()
+        self._keys = keys
+        self._refresh_at = self._last_fetch + max(1.0, max_age * 0.9)
+        Log.debug(f'Fetched {len(keys)} signing keys from {self.url}, refresh in {max_age * 0.9:.0f}s.')
+
+    def refresh(self):
+        """
+        Fetch keys now, old keys are kept if it fails
+        :return:
+        """
+        with self._lock:
+            try:
+                self._fetch()
+            except Exception:
+                Log.exception(f'Can not fetch signing keys from {self.url}')
+                self._refresh_at = time.time() + KEYS_RETRY_SECONDS
+                if self._keys is None:
+                    raise
+
+    def _refresh_loop(self, stop: Event):
+        while not stop.wait(timeout=max(0.1, self._refresh_at - time.time())):
+            try:
+                self.refresh()
+            except Exception:
+                pass
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop = Event()
+                self._thread = Thread(
+                    target=self._refresh_loop, args=(self._stop,), name='quickbe-oauth-keys', daemon=True
+                )
+                self._thread.start()
+
+    def get(self, key_id: str = None) -> dict:
+        """
+        Get keys, first call fetches them. A key id that is not known refreshes the keys (key rotation).
+        :param key_id: Key id (`kid` of token header)
+        :return: Dict of key id to key
+        """
+        if self._keys is None:
+            with self._lock:
+                if self._keys is None:
+                    self._fetch()
+        if self._thread is None:
+            self._start()
+        is_unknown = key_id is not None and key_id not in self._keys
+        if is_unknown and time.time() - self._last_fetch > UNKNOWN_KEY_REFRESH_SECONDS:
+            self.refresh()
+        return self._keys
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _reset_after_fork(self):
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+
+_signing_keys = {}
+_signing_keys_lock = Lock()
+
+
+def get_signing_keys(url: str = None) -> SigningKeys:
+    """
+    Process wide signing keys of an issuer
+    :param url: Keys URL, default is taken from QUICKBE_OAUTH_CERTS_URL (Google certificates)
+    :return: SigningKeys
+    """
+    url = url or CERTS_URL
+    keys = _signing_keys.get(url)
+    if keys is None:
+        with _signing_keys_lock:
+            keys = _signing_keys.setdefault(url, SigningKeys(url=url))
+    return keys
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), refresh threads start again on use
+    """
+    global _signing_keys_lock
+    _signing_keys_lock = Lock()
+    for keys in _signing_keys.values():
+        keys._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def google_auth_decode(token: str, certs: dict) -> dict:
+    """
+    Verify token signature with google-auth, keys must be PEM certificates (e.g Google `v1/certs`), tokens
+    signed by JWKS keys need a decode function that converts JWK dicts to keys
+    :param token: JWT
+    :param certs: Dict of key id to PEM certificate
+    :return: Token claims
+    """
+    if not all(isinstance(cert, str) for cert in certs.values()):
+        raise ValueError('Signing keys are not PEM certificates (e.g JWKS), pass a decode function that supports them.')
+    try:
+        from google.auth import jwt
+    except ImportError:
+        raise ImportError('google-auth is needed to verify tokens, install quickbe[oauth].')
+    return jwt.decode(token, certs=certs, verify=True)
+
+
+def _token_header(token: str) -> dict:
+    try:
+        segment = token.split('.')[0]
+        return json.loads(base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4)))
+    except Exception:
+        raise InvalidToken('Token is not a JWT.')
+
+
+class _VerifiedTokens:
+    """
+    Bounded cache of verified token claims, every entry expires with its token (`exp` claim)
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            claims, expires = entry
+            if expires <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def set(self, token: str, claims: dict, expires: float):
+        with self._lock:
+            self._entries[token] = claims, expires
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenVerifier:
+    """
+    Verify ID tokens (JWT) by cached issuer signing keys, verified tokens are cached until they expire
+    """
+
+    def __init__(
+            self, audience=None, issuers: list = None, certs_url: str = None, decode=None,
+            max_entries: int = None, clock_skew: float = CLOCK_SKEW_SECONDS
+    ):
+        """
+        :param audience: Client id or list of client ids, default is taken from QUICKBE_OAUTH_AUDIENCE
+            (or AUTHORIZATION_FLOW_CLIENT_ID). It is required, tokens issued to other clients are rejected.
+        :param issuers: Allowed `iss` claims, default is Google issuers
+        :param certs_url: Signing keys URL, default is taken from QUICKBE_OAUTH_CERTS_URL
+        :param decode: Function that gets token and keys, verifies signature and returns claims (default google-auth,
+            PEM certificates only)
+        :param max_entries: Maximum verified tokens to cache, default is taken from QUICKBE_OAUTH_TOKEN_CACHE_SIZE
+        :param clock_skew: Seconds of tolerance for `exp` claim
+        """
+        if audience is None:
+            audience = getenv(QUICKBE_OAUTH_AUDIENCE_KEY) or getenv('AUTHORIZATION_FLOW_CLIENT_ID')
+        if isinstance(audience, str):
+            audience = [audience]
+        audience = [aud for aud in audience or [] if aud]
+        if not audience:
+            # Any token that the issuer signed for any client would be accepted
+            raise ValueError(
+                f'Token audience is not set, pass audience or set {QUICKBE_OAUTH_AUDIENCE_KEY} environment variable.'
+            )
+        self.audience = audience
+        self.issuers = GOOGLE_ISSUERS if issuers is None else issuers
+        self.signing_keys = get_signing_keys(url=certs_url)
+        self._decode = decode or google_auth_decode
+        self.clock_skew = clock_skew
+        self._verified = _VerifiedTokens(max_entries=TOKEN_CACHE_SIZE if max_entries is None else max_entries)
+
+    def _check_claims(self, claims: dict) -> float:
+        """
+        :return: Token expiry time
+        """
+        try:
+            expires = float(claims['exp'])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken('Token has no expiry.')
+        if expires + self.clock_skew <= time.time():
+            raise InvalidToken('Token expired.')
+        audience = claims.get('aud')
+        audiences = audience if isinstance(audience, list) else [audience]
+        if not any(aud in self.audience for aud in audiences):
+            raise InvalidToken(f'Token audience {audience} is not allowed.')
+        if self.issuers and claims.get('iss') not in self.issuers:
+            raise InvalidToken(f'Token issuer {claims.get("iss")} is not allowed.')
+        return expires
+
+    def verify(self, token: str) -> dict:
+        """
+        Verify a token, tokens that were verified before are answered from cache
+        :param token: JWT
+        :return: Token claims
+        """
+        if not token:
+            raise InvalidToken('Token is missing.')
+        claims = self._verified.get(token)
+        if claims is not None:
+            return claims
+        header = _token_header(token=token)
+        keys = self.signing_keys.get(key_id=header.get('kid'))
+        try:
+            claims = self._decode(token, keys)
+        except ImportError:
+            raise
+        except Exception as e:
+            raise InvalidToken(f'Token signature is not valid, {e}')
+        expires = self._check_claims(claims=claims)
+        self._verified.set(token=token, claims=claims, expires=expires + self.clock_skew)
+        return claims
+
+    def web_filter(self, token_parameter: str = None):
+        """
+        Web filter that verifies `Authorization: Bearer` token and sets session user id (`sub` claim).
+        Requests without a valid token get status 401.
+        :param token_parameter: Also accept token from this request parameter
+        :return: Filter function
+        """
+        def oauth_filter(session: HttpSession):
+            token = None
+            authorization = get_header(session.request_headers, AUTHORIZATION_HEADER)
+            if authorization and authorization[:7].lower() == 'bearer ':
+                token = authorization[7:].strip()
+            elif token_parameter is not None:
+                token = session.get(token_parameter)
+            try:
+                claims = self.verify(token=token)
+            except InvalidToken as e:
+                session.set_status(401)
+                session.set_response_header(WWW_AUTHENTICATE_HEADER, 'Bearer')
+                return f'{e}'
+            session.set_user_id(claims.get('sub'))
+        return oauth_filter
+
+
+_token_verifier = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    """
+    Process wide token verifier, configured by environment variables
+    """
+    global _token_verifier
+    if _token_verifier is None:
+        _token_verifier = TokenVerifier()
+    return _token_verifier
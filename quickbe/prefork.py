@@ -0,0 +1,327 @@
+import os
+import time
+import random
+import signal
+import socket
+import ctypes
+from quickbelog import Log
+from threading import Thread, Lock, Event, BoundedSemaphore
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.sharedctypes import RawArray
+from werkzeug.serving import BaseWSGIServer
+
+QUICKBE_WEB_SERVER_WORKERS_KEY = 'QUICKBE_WEB_SERVER_WORKERS'
+QUICKBE_WEB_SERVER_THREADS_KEY = 'QUICKBE_WEB_SERVER_THREADS'
+QUICKBE_WEB_SERVER_MAX_REQUESTS_KEY = 'QUICKBE_WEB_SERVER_MAX_REQUESTS'
+QUICKBE_WEB_SERVER_MAX_RSS_MB_KEY = 'QUICKBE_WEB_SERVER_MAX_RSS_MB'
+QUICKBE_WEB_SERVER_GRACEFUL_TIMEOUT_KEY = 'QUICKBE_WEB_SERVER_GRACEFUL_TIMEOUT'
+
+LISTEN_BACKLOG = 2048
+WORKER_CHECK_INTERVAL_SECONDS = 1
+MASTER_CHECK_INTERVAL_SECONDS = 0.2
+# Spread recycling of workers that started together, up to 10% over max requests
+MAX_REQUESTS_JITTER = 0.1
+
+WORKER_BOOTING = 1
+WORKER_SERVING = 2
+WORKER_STOPPING = 3
+WORKER_STATUS_NAMES = {WORKER_BOOTING: 'booting', WORKER_SERVING: 'serving', WORKER_STOPPING: 'stopping'}
+
+
+class WorkerState(ctypes.Structure):
+    """
+    Worker state, in memory shared by master and workers
+    """
+    _fields_ = [
+        ('pid', ctypes.c_int),
+        ('status', ctypes.c_int),
+        ('generation', ctypes.c_int),
+        ('in_flight', ctypes.c_int),
+        ('requests', ctypes.c_longlong),
+        ('rss_bytes', ctypes.c_longlong),
+        ('started_at', ctypes.c_double),
+        ('heartbeat_at', ctypes.c_double),
+    ]
+
+
+# Set in master before workers are forked, so every worker sees all slots
+_workers_state = None
+_worker_slot = None
+
+
+def workers_status() -> list:
+    """
+    State of pre-fork server workers
+    :return: List of workers state, None when server does not run in pre-fork mode
+    """
+    if _workers_state is None:
+        return None
+    result = []
+    for slot, state in enumerate(_workers_state):
+        if state.pid == 0:
+            continue
+        result.append({
+            'slot': slot,
+            'pid': state.pid,
+            'status': WORKER_STATUS_NAMES.get(state.status, 'unknown'),
+            'generation': state.generation,
+            'requests': state.requests,
+            'in_flight': state.in_flight,
+            'memory_utilization': state.rss_bytes / 1024**2,
+            'uptime_seconds': time.time() - state.started_at,
+            'heartbeat_seconds_ago': time.time() - state.heartbeat_at,
+            'current': slot == _worker_slot,
+        })
+    return result
+
+
+class _PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server that handles requests on a fixed size thread pool. When all threads are busy it stops accepting,
+    so connections wait in the shared listening socket for another worker.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int, fd: int):
+        super().__init__(host=host, port=port, app=app, fd=fd)
+        # Socket is shared by workers, a worker that lost the accept race must not block on it
+        self.socket.setblocking(False)
+        self._slots = BoundedSemaphore(threads)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='quickbe-worker')
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Wait for requests in progress
+        :param timeout: Seconds to wait
+        :return: True if all requests are done
+        """
+        thread = Thread(target=self._pool.shutdown, kwargs={'wait': True}, daemon=True)
+        thread.start()
+        thread.join(timeout=timeout)
+        return not thread.is_alive()
+
+
+class PreforkServer:
+    """
+    Pre-fork WSGI server, master process forks workers that share the listening socket and handle requests
+    on a thread pool. Master replaces workers that exit, recycles all workers on SIGHUP and stops on SIGTERM
+    or SIGINT. Workers are recycled after max requests or when resident memory is over max RSS.
+    """
+
+    def __init__(
+            self, app, host: str = '0.0.0.0', port: int = 8888, workers: int = None, threads: int = None,
+            max_requests: int = None, max_rss_mb: float = None, graceful_timeout: float = None
+    ):
+        """
+        :param app: WSGI application
+        :param host: Host to listen on
+        :param port: Port to listen on
+        :param workers: Number of worker processes
+        :param threads: Threads per worker
+        :param max_requests: Recycle worker after this number of requests, 0 for no limit
+        :param max_rss_mb: Recycle worker when its resident memory (MB) is over this value, 0 for no limit
+        :param graceful_timeout: Seconds a stopping worker waits for requests in progress
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or int(os.getenv(QUICKBE_WEB_SERVER_WORKERS_KEY, os.cpu_count() or 1))
+        self.threads = threads or int(os.getenv(QUICKBE_WEB_SERVER_THREADS_KEY, 8))
+        self.max_requests = max_requests if max_requests is not None \
+            else int(os.getenv(QUICKBE_WEB_SERVER_MAX_REQUESTS_KEY, 0))
+        self.max_rss_mb = max_rss_mb if max_rss_mb is not None \
+            else float(os.getenv(QUICKBE_WEB_SERVER_MAX_RSS_MB_KEY, 0))
+        self.graceful_timeout = graceful_timeout if graceful_timeout is not None \
+            else float(os.getenv(QUICKBE_WEB_SERVER_GRACEFUL_TIMEOUT_KEY, 30))
+        self.socket = None
+        self.generation = 0
+        self._children = {}
+        self._reload = False
+        self._stop = False
+        self._state_lock = Lock()
+        self._max_requests_reached = Event()
+        self._worker_max_requests = 0
+
+    def _listen(self) -> socket.socket:
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # Lets a new master bind the port while the old one drains
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        sock.bind((self.host, self.port))
+        sock.listen(LISTEN_BACKLOG)
+        return sock
+
+    def run(self):
+        """
+        Run master process, returns when server is stopped
+        """
+        global _workers_state
+        if not hasattr(os, 'fork'):
+            raise NotImplementedError('Pre-fork server requires os.fork.')
+        self.socket = self._listen()
+        self.port = self.socket.getsockname()[1]
+        # Double slots, so new workers can start while old ones drain on reload
+        _workers_state = RawArray(WorkerState, self.workers * 2)
+
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        Log.info(
+            f'Pre-fork server listening on {self.host}:{self.port}, '
+            f'{self.workers} workers x {self.threads} threads (master pid {os.getpid()}).'
+        )
+        try:
+            while not self._stop:
+                self._reap_workers()
+                if self._reload:
+                    self._reload = False
+                    self.generation += 1
+                    Log.info(f'Reloading workers, generation {self.generation}.')
+                    self._spawn_workers()
+                    self._signal_workers(sig=signal.SIGTERM, older_than=self.generation)
+                self._spawn_workers()
+                time.sleep(MASTER_CHECK_INTERVAL_SECONDS)
+        finally:
+            self._shutdown()
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def _current_workers(self) -> int:
+        return len([slot for slot in self._children.values() if _workers_state[slot].generation == self.generation])
+
+    def _spawn_workers(self):
+        while self._current_workers() < self.workers:
+            free_slots = [slot for slot, state in enumerate(_workers_state) if state.pid == 0]
+            if not free_slots:
+                return
+            self._spawn_worker(slot=free_slots[0])
+
+    def _spawn_worker(self, slot: int):
+        state = _workers_state[slot]
+        ctypes.memset(ctypes.addressof(state), 0, ctypes.sizeof(WorkerState))
+        state.generation = self.generation
+        state.status = WORKER_BOOTING
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                exit_code = self._worker_main(slot=slot)
+            except BaseException:
+                Log.exception(f'Worker {os.getpid()} failed')
+            finally:
+                os._exit(exit_code)
+        state.pid = pid
+        self._children[pid] = slot
+        Log.debug(f'Worker {pid} started (slot {slot}, generation {self.generation}).')
+
+    def _reap_workers(self):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self._children.pop(pid, None)
+            if slot is not None:
+                _workers_state[slot].pid = 0
+                Log.debug(f'Worker {pid} exited with status {status}.')
+
+    def _signal_workers(self, sig, older_than: int = None):
+        for pid, slot in list(self._children.items()):
+            if older_than is None or _workers_state[slot].generation < older_than:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    pass
+
+    def _shutdown(self):
+        Log.info('Pre-fork server is stopping...')
+        self._signal_workers(sig=signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout + WORKER_CHECK_INTERVAL_SECONDS
+        while self._children and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(MASTER_CHECK_INTERVAL_SECONDS)
+        self._signal_workers(sig=signal.SIGKILL)
+        while self._children:
+            pid, _ = os.waitpid(-1, 0)
+            self._children.pop(pid, None)
+        self.socket.close()
+
+    def _count_request(self, environ, start_response):
+        state = _workers_state[_worker_slot]
+        with self._state_lock:
+            state.requests += 1
+            state.in_flight += 1
+            if 0 < self._worker_max_requests <= state.requests:
+                self._max_requests_reached.set()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            with self._state_lock:
+                state.in_flight -= 1
+
+    def _worker_main(self, slot: int) -> int:
+        global _worker_slot
+        _worker_slot = slot
+        self._children = {}
+        stop = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        if self.max_requests > 0:
+            self._worker_max_requests = \
+                self.max_requests + random.randint(0, int(self.max_requests * MAX_REQUESTS_JITTER))
+
+        from psutil import Process
+        process = Process(os.getpid())
+        state = _workers_state[slot]
+        state.pid = os.getpid()
+        state.started_at = state.heartbeat_at = time.time()
+
+        server = _PooledWSGIServer(
+            host=self.host, port=self.port, app=self._count_request, threads=self.threads, fd=self.socket.fileno()
+        )
+        Thread(target=server.serve_forever, name='quickbe-worker-accept', daemon=True).start()
+        state.status = WORKER_SERVING
+
+        while not stop:
+            state.heartbeat_at = time.time()
+            state.rss_bytes = process.memory_info().rss
+            if self._max_requests_reached.is_set():
+                Log.info(f'Worker {state.pid} handled {state.requests} requests, recycling.')
+                break
+            if 0 < self.max_rss_mb < state.rss_bytes / 1024**2:
+                Log.info(f'Worker {state.pid} uses {state.rss_bytes / 1024**2:.1f} MB, recycling.')
+                break
+            self._max_requests_reached.wait(timeout=WORKER_CHECK_INTERVAL_SECONDS)
+
+        state.status = WORKER_STOPPING
+        server.shutdown()
+        if not server.drain(timeout=self.graceful_timeout):
+            Log.warning(f'Worker {state.pid} stopped with requests in progress.')
+        return 0
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+COLLAPSED_FORMAT = 'collapsed'
+SPEEDSCOPE_FORMAT = 'speedscope'
+PROFILE_FORMATS = [COLLAPSED_FORMAT, SPEEDSCOPE_FORMAT]
+
+DEFAULT_PROFILE_SECONDS = 5
+MAX_PROFILE_SECONDS = 60
+DEFAULT_INTERVAL_SECONDS = 0.005
+MIN_INTERVAL_SECONDS = 0.001
+
+# Innermost frames of threads that wait for work (thread pools, accept loops), left out unless idle stacks are asked for
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socketserver.py', 'serve_forever'),
+}
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """
+    A profile is already being taken, one runs at a time
+    """
+    pass
+
+
+def _frame_name(code, names: dict) -> str:
+    name = names.get(code)
+    if name is None:
+        # Semicolon separates frames in collapsed stacks
+        name = names[code] = \
+            f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+    return name
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _clamp(value: float, lowest: float, highest: float) -> float:
+    # Explicit comparisons, NaN is not within bounds and gets the lowest
+    if lowest <= value <= highest:
+        return value
+    return highest if value > highest else lowest
+
+
+def sample_stacks(
+        seconds: float = DEFAULT_PROFILE_SECONDS, interval: float = DEFAULT_INTERVAL_SECONDS, idle: bool = False
+) -> (Counter, int):
+    """
+    Sample stacks of all threads of this process (but the sampling thread) every interval, for a number of seconds
+    :param seconds: Profile duration, up to MAX_PROFILE_SECONDS
+    :param interval: Seconds between samples
+    :param idle: Include threads that wait for work
+    :return: Tuple of counter of stacks (thread name first, innermost frame last) and number of samples
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy('Profiler is already running.')
+    try:
+        seconds = _clamp(seconds, lowest=0, highest=MAX_PROFILE_SECONDS)
+        interval = _clamp(interval, lowest=MIN_INTERVAL_SECONDS, highest=MAX_PROFILE_SECONDS)
+        own_ident = threading.get_ident()
+        names = {}
+        thread_names = {}
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        while True:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or (not idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(code=frame.f_code, names=names))
+                    frame = frame.f_back
+                thread_name = thread_names.get(ident)
+                if thread_name is None:
+                    thread_names.update({thread.ident: thread.name for thread in threading.enumerate()})
+                    thread_name = thread_names.get(ident, f'thread-{ident}')
+                stack.append(thread_name.replace(';', ':'))
+                stack.reverse()
+                stacks[tuple(stack)] += 1
+            samples += 1
+            if time.perf_counter() + interval > deadline:
+                break
+            time.sleep(interval)
+        return stacks, samples
+    finally:
+        _lock.release()
+
+
+def collapsed_stacks(stacks: Counter) -> str:
+    """
+    Stacks in collapsed format (`frame;frame;frame count` lines), input of flamegraph.pl, speedscope and others
+    """
+    return ''.join(f'{";".join(stack)} {count}\n' for stack, count in stacks.most_common())
+
+
+def speedscope_profile(stacks: Counter, interval: float, name: str = 'quickbe') -> dict:
+    """
+    Stacks as speedscope (https://www.speedscope.app) sampled profile, one profile per thread
+    :param stacks: Counter of stacks, thread name first
+    :param interval: Seconds between samples, weight of a sample
+    :param name: Profile name
+    :return: speedscope file format dict
+    """
+    frames = []
+    frame_index = {}
+    profiles = {}
+    for stack, count in stacks.most_common():
+        thread_name, frame_names = stack[0], stack[1:]
+        indexes = []
+        for frame_name in frame_names:
+            index = frame_index.get(frame_name)
+            if index is None:
+                index = frame_index[frame_name] = len(frames)
+                frames.append({'name': frame_name})
+            indexes.append(index)
+        profile = profiles.get(thread_name)
+        if profile is None:
+            profile = profiles[thread_name] = {
+                'type': 'sampled', 'name': thread_name, 'unit': 'seconds', 'startValue': 0, 'endValue': 0,
+                'samples': [], 'weights': [],
+            }
+        profile['samples'].append(indexes)
+        profile['weights'].append(count * interval)
+        profile['endValue'] += count * interval
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'quickbe',
+        'shared': {'frames': frames},
+        'profiles': list(profiles.values()),
+    }
@@ -0,0 +1,211 @@
+import re
+import uuid
+
+PATH_PARAMETER_PATTERN = re.compile(r'^<(?:(?P<converter>[a-zA-Z_][a-zA-Z0-9_]*):)?(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)>$')
+DEFAULT_CONVERTER = 'string'
+PATH_CONVERTER = 'path'
+
+
+def _string_converter(value: str) -> str:
+    if value == '':
+        raise ValueError('Empty path segment')
+    return value
+
+
+def _int_converter(value: str) -> int:
+    if not value.isdigit():
+        raise ValueError(f'{value} is not an integer')
+    return int(value)
+
+
+def _float_converter(value: str) -> float:
+    if value.lower() in ['nan', 'inf', '-inf', 'infinity', '-infinity']:
+        raise ValueError(f'{value} is not a number')
+    return float(value)
+
+
+def _uuid_converter(value: str) -> str:
+    return str(uuid.UUID(value))
+
+
+# Converter name -> (function, priority). Lower priority is tried first, so specific
+# converters win over the catch-all string converter when both match a segment.
+PATH_CONVERTERS = {
+    'int': (_int_converter, 10),
+    'float': (_float_converter, 20),
+    'uuid': (_uuid_converter, 30),
+    DEFAULT_CONVERTER: (_string_converter, 100),
+    PATH_CONVERTER: (_string_converter, 1000),
+}
+
+
+def register_converter(name: str, func, priority: int = 50):
+    """
+    Register a path parameter converter, e.g `<slug:name>`
+    :param name: Converter name to use in path definition
+    :param func: Function that gets the segment text and returns a value or raise ValueError if it does not match
+    :param priority: Lower priority converters are tried first
+    :return:
+    """
+    if name in PATH_CONVERTERS:
+        raise FileExistsError(f'Converter {name} already exists.')
+    PATH_CONVERTERS[name] = (func, priority)
+
+
+def split_path(path: str) -> list:
+    if path.startswith('/'):
+        path = path[1:]
+    return path.split('/')
+
+
+def is_static_path(path: str) -> bool:
+    return '<' not in path
+
+
+class Route:
+
+    __slots__ = ('path', 'value', 'param_names')
+
+    def __init__(self, path: str, value, param_names: list):
+        self.path = path
+        self.value = value
+        self.param_names = param_names
+
+    def __repr__(self):
+        return f'Route({self.path})'
+
+
+class _Node:
+
+    __slots__ = ('static', 'dynamic', 'route')
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = []
+        self.route = None
+
+    def dynamic_child(self, converter_name: str):
+        for name, _, child in self.dynamic:
+            if name == converter_name:
+                return child
+        func, priority = PATH_CONVERTERS[converter_name]
+        child = _Node()
+        self.dynamic.append((converter_name, func, child))
+        self.dynamic.sort(key=lambda item: PATH_CONVERTERS[item[0]][1])
+        return child
+
+
+class Router:
+    """
+    Radix tree router. Static paths are resolved with a single dictionary lookup, paths with parameters
+    (e.g `users/<int:user_id>/orders`) are resolved by walking the tree one segment at a time,
+    so lookup cost depends on path length and not on the number of registered routes.
+    """
+
+    def __init__(self):
+        self._static_routes = {}
+        self._root = _Node()
+
+    def add(self, path: str, value) -> Route:
+        """
+        Compile and register a path
+        :param path: Path definition, parameters are marked with `<name>` or `<converter:name>`
+        :param value: Value to return on match
+        :return: Route
+        """
+        if path.startswith('/'):
+            path = path[1:]
+
+        if is_static_path(path):
+            if path in self._static_routes:
+                raise FileExistsError(f'Endpoint {path} already exists.')
+            route = Route(path=path, value=value, param_names=[])
+            self._static_routes[path] = route
+            return route
+
+        node = self._root
+        param_names = []
+        segments = split_path(path)
+        for index, segment in enumerate(segments):
+            if is_static_path(segment):
+                node = node.static.setdefault(segment, _Node())
+                continue
+            match = PATH_PARAMETER_PATTERN.match(segment)
+            if match is None:
+                raise ValueError(f'Invalid path parameter {segment} in {path}.')
+            converter_name = match.group('converter') or DEFAULT_CONVERTER
+            if converter_name not in PATH_CONVERTERS:
+                raise ValueError(f'Unknown converter {converter_name} in {path}.')
+            if converter_name == PATH_CONVERTER and index != len(segments) - 1:
+                raise ValueError(f'Converter {PATH_CONVERTER} must be the last segment in {path}.')
+            name = match.group('name')
+            if name in param_names:
+                raise ValueError(f'Parameter {name} appears more than once in {path}.')
+            param_names.append(name)
+            node = node.dynamic_child(converter_name=converter_name)
+
+        if node.route is not None:
+            raise FileExistsError(f'Endpoint {path} conflicts with {node.route.path}.')
+        node.route = Route(path=path, value=value, param_names=param_names)
+        return node.route
+
+    def match(self, path: str) -> (Route, dict):
+        """
+        Find the route for a requested path
+        :param path: Requested path
+        :return: Tuple of route and path parameters, (None, None) if there is no match
+        """
+        if path.startswith('/'):
+            path = path[1:]
+
+        route = self._static_routes.get(path)
+        if route is not None:
+            return route, {}
+
+        values = []
+        route = self._match(node=self._root, segments=path.split('/'), index=0, values=values)
+        if route is None:
+            return None, None
+        return route, dict(zip(route.param_names, values))
+
+    def _match(self, node: _Node, segments: list, index: int, values: list):
+        if index == len(segments):
+            return node.route
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            route = self._match(node=child, segments=segments, index=index + 1, values=values)
+            if route is not None:
+                return route
+
+        for converter_name, converter, child in node.dynamic:
+            if converter_name == PATH_CONVERTER:
+                if child.route is not None and segment != '':
+                    values.append('/'.join(segments[index:]))
+                    return child.route
+                continue
+            try:
+                value = converter(segment)
+            except ValueError:
+                continue
+            values.append(value)
+            route = self._match(node=child, segments=segments, index=index + 1, values=values)
+            if route is not None:
+                return route
+            values.pop()
+        return None
+
+    def __contains__(self, path: str) -> bool:
+        return self.match(path=path)[0] is not None
+
+    def __len__(self) -> int:
+        return len(self._static_routes) + self._count(self._root)
+
+    def _count(self, node: _Node) -> int:
+        count = 0 if node.route is None else 1
+        for child in node.static.values():
+            count += self._count(child)
+        for _, _, child in node.dynamic:
+            count += self._count(child)
+        return count
@@ -0,0 +1,235 @@
+import os
+import time
+from threading import Lock, Timer
+from datetime import datetime
+from quickbelog import Log
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from quickbe.metrics import Histogram, JOB_DURATION_BUCKETS_SECONDS
+
+QUICKBE_SCHEDULER_THREADS_KEY = 'QUICKBE_SCHEDULER_THREADS'
+QUICKBE_SCHEDULER_PROCESSES_KEY = 'QUICKBE_SCHEDULER_PROCESSES'
+
+THREAD_EXECUTOR = 'thread'
+PROCESS_EXECUTOR = 'process'
+EXECUTORS = [THREAD_EXECUTOR, PROCESS_EXECUTOR]
+
+# Policy for a run that is due while the job is still running
+OVERLAP_SKIP = 'skip'
+OVERLAP_QUEUE = 'queue'
+OVERLAP_ALLOW = 'allow'
+OVERLAP_POLICIES = [OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_ALLOW]
+
+THREADS = int(os.getenv(QUICKBE_SCHEDULER_THREADS_KEY, 4))
+PROCESSES = int(os.getenv(QUICKBE_SCHEDULER_PROCESSES_KEY, os.cpu_count() or 1))
+
+SCHEDULED_JOBS = {}
+
+_lock = Lock()
+_executors = {}
+
+
+def get_executor(kind: str = THREAD_EXECUTOR):
+    """
+    Shared job executor, created on first use. Pool sizes are taken from QUICKBE_SCHEDULER_THREADS and
+    QUICKBE_SCHEDULER_PROCESSES environment variables.
+    :param kind: `thread` or `process`
+    :return: Executor
+    """
+    executor = _executors.get(kind)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                if kind == PROCESS_EXECUTOR:
+                    executor = ProcessPoolExecutor(max_workers=PROCESSES)
+                else:
+                    executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='quickbe-jobs')
+                _executors[kind] = executor
+    return executor
+
+
+def _reset_after_fork():
+    """
+    Threads are not copied to forked processes (e.g pre-fork server workers), start over in the child
+    """
+    global _lock, _executors
+    _lock = Lock()
+    _executors = {}
+    for job in SCHEDULED_JOBS.values():
+        job._lock = Lock()
+        job.running = 0
+        job.queued = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _timed_call(func, args: tuple, kwargs: dict) -> float:
+    """
+    Run a job and measure it where it runs (worker thread or process), queue wait is not included
+    :return: Run duration in seconds
+    """
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+class ScheduledJob:
+    """
+    Job function with execution policy. Calling it (e.g by `ScheduledJobs` thread) dispatches a run to
+    the executor and returns at once, so a slow job does not delay other jobs.
+    """
+
+    def __init__(
+            self, func, args: tuple = (), kwargs: dict = None, name: str = None, executor: str = THREAD_EXECUTOR,
+            overlap: str = OVERLAP_SKIP, timeout: float = None, max_concurrency: int = 1, max_queue: int = 10
+    ):
+        """
+        :param func: Job function, for process executor it must be picklable (module level function)
+        :param args: Job function arguments
+        :param kwargs: Job function keyword arguments
+        :param name: Job name, default is function name
+        :param executor: `thread` or `process` pool
+        :param overlap: Run that is due while the job is running: `skip` it, `queue` it to run when the current
+            run ends, or `allow` concurrent runs (up to max_concurrency, then skip)
+        :param timeout: Seconds a run may take, longer runs are reported as failures (they are not interrupted)
+        :param max_concurrency: Concurrent runs of this job, for `allow` overlap policy
+        :param max_queue: Runs that may wait, for `queue` overlap policy
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f'Executor must be one of {EXECUTORS}, got {executor}.')
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f'Overlap policy must be one of {OVERLAP_POLICIES}, got {overlap}.')
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.name = name or getattr(func, '__qualname__', str(func))
+        self.executor = executor
+        self.overlap = overlap
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency) if overlap == OVERLAP_ALLOW else 1
+        self.max_queue = max_queue
+        self.running = 0
+        self.queued = 0
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self.durations = Histogram(bounds=JOB_DURATION_BUCKETS_SECONDS)
+        self._lock = Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self.running >= self.max_concurrency:
+                if self.overlap == OVERLAP_QUEUE and self.queued < self.max_queue:
+                    self.queued += 1
+                else:
+                    self.skipped += 1
+                    Log.debug(f'Job {self.name} is running, run skipped.')
+                return
+            self.running += 1
+        self._submit()
+
+    def _submit(self):
+        try:
+            future = get_executor(kind=self.executor).submit(_timed_call, self.func, self.args, self.kwargs)
+        except Exception as e:
+            self._done(duration=None, error=e)
+            return
+        timer = None
+        if self.timeout is not None:
+            timer = Timer(self.timeout, self._check_timeout, args=(future,))
+            timer.daemon = True
+            timer.start()
+        future.add_done_callback(lambda done: self._on_done(future=done, timer=timer))
+
+    def _check_timeout(self, future):
+        if not future.done():
+            with self._lock:
+                self.timeouts += 1
+            Log.error(f'Job {self.name} is running longer than {self.timeout} seconds.')
+
+    def _on_done(self, future, timer):
+        if timer is not None:
+            timer.cancel()
+        try:
+            duration = future.result()
+            if self.timeout is not None and duration > self.timeout:
+                error = TimeoutError(f'Job took {duration:.3f} seconds, timeout is {self.timeout} seconds.')
+            else:
+                error = None
+        except BaseException as e:
+            duration, error = None, e
+        self._done(duration=duration, error=error)
+
+    def _done(self, duration: float, error: BaseException):
+        run_next = False
+        with self._lock:
+            self.runs += 1
+            if duration is not None:
+                self.durations.record(duration)
+            if error is None:
+                self.last_success = datetime.now()
+            else:
+                self.failures += 1
+                self.last_failure = datetime.now()
+                self.last_error = f'{error.__class__.__name__}: {error}'
+            if self.queued > 0:
+                self.queued -= 1
+                run_next = True
+            else:
+                self.running -= 1
+        if error is not None:
+            Log.error(f'Job {self.name} failed, {self.last_error}')
+        if run_next:
+            self._submit()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'executor': self.executor,
+                'overlap': self.overlap,
+                'running': self.running,
+                'queued': self.queued,
+                'runs': self.runs,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'skipped': self.skipped,
+                'last_success': None if self.last_success is None else f'{self.last_success}',
+                'last_failure': None if self.last_failure is None else f'{self.last_failure}',
+                'last_error': self.last_error,
+                'duration': self.durations.summary(),
+            }
+
+
+def schedule_job(scd_str: str, func, *args, run_everywhere: bool = False, **options) -> ScheduledJob:
+    """
+    Schedule a job that runs on an executor, with overlap policy, timeout and timing metrics
+    :param scd_str: Schedule definition, e.g `every 5 minutes` (see get_schedule_job)
+    :param func: Job function
+    :param args: Job function arguments
+    :param run_everywhere: Run on every instance even when ScheduledJobs has a lease backend (lease is named by
+        job name otherwise)
+    :param options: ScheduledJob options (name, executor, overlap, timeout, max_concurrency, max_queue, kwargs)
+    :return: ScheduledJob
+    """
+    from quickbe.utils import get_schedule_job, LEASE_TAG_PREFIX, RUN_EVERYWHERE_TAG
+    job = ScheduledJob(func, args=args, **options)
+    if job.name in SCHEDULED_JOBS:
+        raise FileExistsError(f'Job {job.name} already exists.')
+    tag = RUN_EVERYWHERE_TAG if run_everywhere else f'{LEASE_TAG_PREFIX}{job.name}'
+    get_schedule_job(scd_str=scd_str).tag(tag).do(job)
+    SCHEDULED_JOBS[job.name] = job
+    return job
+
+
+def jobs_status() -> dict:
+    """
+    Status of scheduled jobs, for server status endpoint
+    :return: Dict of job name to runs, failures, last success and failure and duration histogram summary
+    """
+    return {name: job.status() for name, job in SCHEDULED_JOBS.items()}
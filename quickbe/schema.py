@@ -0,0 +1,285 @@
+from threading import local
+from datetime import date, datetime
+from collections.abc import Mapping, Sequence, Container, Iterable, Sized
+
+DOCUMENTATION_RULES = {'doc', 'example', 'meta'}
+SUPPORTED_RULES = {
+    'type', 'required', 'default', 'nullable', 'empty', 'allowed', 'min', 'max',
+    'schema', 'allow_unknown', 'purge_unknown',
+} | DOCUMENTATION_RULES
+NESTED_RULES = {'schema', 'allow_unknown', 'purge_unknown'}
+BOOLEAN_RULES = {'required', 'nullable', 'empty'}
+
+# Type name -> (included types, excluded types), same definitions as Cerberus
+TYPES = {
+    'binary': ((bytes, bytearray), ()),
+    'boolean': ((bool,), ()),
+    'container': ((Container,), (str,)),
+    'date': ((date,), ()),
+    'datetime': ((datetime,), ()),
+    'dict': ((Mapping,), ()),
+    'float': ((float, int), ()),
+    'integer': ((int,), ()),
+    'list': ((Sequence,), (str,)),
+    'number': ((float, int), (bool,)),
+    'set': ((set,), ()),
+    'string': ((str,), ()),
+}
+
+# Error messages, same as Cerberus
+REQUIRED_FIELD = 'required field'
+UNKNOWN_FIELD = 'unknown field'
+NOT_NULLABLE = 'null value not allowed'
+EMPTY_NOT_ALLOWED = 'empty values not allowed'
+
+
+class SchemaNotCompilable(Exception):
+    pass
+
+
+def _type_checker(type_names):
+    if isinstance(type_names, str):
+        type_names = [type_names]
+    checks = []
+    for type_name in type_names:
+        if type_name not in TYPES:
+            raise SchemaNotCompilable(f'Type {type_name} is not supported.')
+        checks.append(TYPES[type_name])
+    if len(checks) == 1:
+        included, excluded = checks[0]
+        if excluded:
+            return lambda value: isinstance(value, included) and not isinstance(value, excluded)
+        return lambda value: isinstance(value, included)
+    return lambda value: any(
+        isinstance(value, types_included) and not isinstance(value, types_excluded)
+        for types_included, types_excluded in checks
+    )
+
+
+def _compile_field(rules: dict, allow_unknown, purge_unknown):
+    """
+    Compile rules of a single field
+    :return: Function that gets a value and returns tuple of (normalized value, errors list or None)
+    """
+    if not isinstance(rules, Mapping):
+        raise SchemaNotCompilable(f'Rules must be a dict, got {rules}.')
+    unsupported = set(rules) - SUPPORTED_RULES
+    if unsupported:
+        raise SchemaNotCompilable(f'Rules {unsupported} are not supported.')
+    for rule in BOOLEAN_RULES & set(rules):
+        if not isinstance(rules[rule], bool):
+            raise SchemaNotCompilable(f'Rule {rule} must be boolean.')
+    if 'allowed' in rules and (isinstance(rules['allowed'], str) or not isinstance(rules['allowed'], Iterable)):
+        raise SchemaNotCompilable('Rule allowed must be a list.')
+
+    type_name = rules.get('type')
+    nullable = rules.get('nullable', False)
+    is_type = None if type_name is None else _type_checker(type_name)
+    type_error = None if type_name is None else f'must be of {type_name} type'
+
+    has_empty = 'empty' in rules
+    empty_allowed = rules.get('empty', True)
+
+    allowed = None
+    if 'allowed' in rules:
+        allowed = tuple(rules['allowed'])
+    has_min, min_value = 'min' in rules, rules.get('min')
+    has_max, max_value = 'max' in rules, rules.get('max')
+
+    nested = None
+    if NESTED_RULES & set(rules):
+        if type_name != 'dict':
+            raise SchemaNotCompilable('Nested rules are supported for dict type only.')
+        nested = _compile_mapping(
+            schema=rules.get('schema', {}),
+            allow_unknown=rules.get('allow_unknown', allow_unknown),
+            purge_unknown=rules.get('purge_unknown', purge_unknown),
+            validate_unknown='schema' in rules
+        )
+
+    # Errors of a field are ordered by rule name (allowed/empty, max, min, schema), same as Cerberus
+    def check(value):
+        if value is None:
+            if nullable:
+                return value, None
+            return value, [NOT_NULLABLE]
+
+        if is_type is not None and not is_type(value):
+            return value, [type_error]
+
+        # Cerberus normalizes the whole document first, nested defaults and purging apply before empty and allowed
+        nested_errors = None
+        if nested is not None:
+            value, nested_errors = nested(value)
+
+        errors = None
+        check_allowed = allowed is not None
+        if has_empty and isinstance(value, Sized) and len(value) == 0:
+            check_allowed = False
+            if not empty_allowed:
+                errors = [EMPTY_NOT_ALLOWED]
+
+        if check_allowed:
+            if isinstance(value, Iterable) and not isinstance(value, str):
+                unallowed = tuple(item for item in value if item not in allowed)
+                if unallowed:
+                    errors = (errors or []) + [f'unallowed values {unallowed}']
+            elif value not in allowed:
+                errors = (errors or []) + [f'unallowed value {value}']
+
+        if has_max:
+            try:
+                if value > max_value:
+                    errors = (errors or []) + [f'max value is {max_value}']
+            except TypeError:
+                pass
+
+        if has_min:
+            try:
+                if value < min_value:
+                    errors = (errors or []) + [f'min value is {min_value}']
+            except TypeError:
+                pass
+
+        if nested_errors:
+            errors = (errors or []) + [nested_errors]
+
+        return value, errors
+
+    return check
+
+
+def _compile_mapping(schema: dict, allow_unknown, purge_unknown, validate_unknown: bool = True):
+    """
+    Compile a mapping schema into a single pass normalize and validate function
+    :return: Function that gets a mapping and returns tuple of (normalized mapping, errors dict or None)
+    """
+    if not isinstance(schema, Mapping):
+        raise SchemaNotCompilable(f'Schema must be a dict, got {schema}.')
+    if not isinstance(allow_unknown, bool) or not isinstance(purge_unknown, bool):
+        raise SchemaNotCompilable('Only boolean allow_unknown and purge_unknown are supported.')
+
+    fields = {}
+    defaults = []
+    required = []
+    for name, rules in schema.items():
+        fields[name] = _compile_field(rules=rules, allow_unknown=allow_unknown, purge_unknown=purge_unknown)
+        if 'default' in rules:
+            defaults.append((name, rules['default'], rules.get('nullable', False)))
+        if rules.get('required', False):
+            required.append(name)
+
+    purge = purge_unknown and not allow_unknown
+    report_unknown = validate_unknown and not allow_unknown
+
+    def normalize_and_validate(mapping):
+        result = mapping
+        copied = False
+        errors = None
+
+        if purge:
+            for name in mapping:
+                if name not in fields:
+                    result = {key: value for key, value in mapping.items() if key in fields}
+                    copied = True
+                    break
+
+        for name, default, nullable in defaults:
+            if name not in result or (result[name] is None and not nullable):
+                if not copied:
+                    result = dict(result)
+                    copied = True
+                result[name] = default
+
+        # Only values of existing keys are replaced, result can be iterated while it is updated
+        for name, value in result.items():
+            check = fields.get(name)
+            if check is None:
+                if report_unknown:
+                    if errors is None:
+                        errors = {}
+                    errors[name] = [UNKNOWN_FIELD]
+                continue
+            new_value, field_errors = check(value)
+            if new_value is not value:
+                if not copied:
+                    result = dict(result)
+                    copied = True
+                result[name] = new_value
+            if field_errors:
+                if errors is None:
+                    errors = {}
+                errors[name] = field_errors
+
+        for name in required:
+            if name not in result:
+                if errors is None:
+                    errors = {}
+                errors[name] = [REQUIRED_FIELD]
+
+        return result, errors
+
+    return normalize_and_validate
+
+
+class CompiledSchema:
+    """
+    Validation schema compiled once into a specialized function that normalizes and validates
+    a document in a single pass. Supports type, required, default, nullable, empty, allowed, min, max
+    and nested dict schema (with allow_unknown and purge_unknown). Schemas with other rules are
+    handled by Cerberus validators (fallback).
+    Compiled validation is stateless and Cerberus validators are kept per thread, so a CompiledSchema
+    can be used by concurrent requests.
+    """
+
+    def __init__(self, schema: dict, fallback_factory=None, allow_unknown: bool = True, purge_unknown: bool = True):
+        """
+        :param schema: Cerberus schema
+        :param fallback_factory: Function that creates a Cerberus validator, used when schema can not be compiled
+        :param allow_unknown: Allow fields that are not in schema
+        :param purge_unknown: Remove unknown fields (when they are not allowed)
+        """
+        self.schema = schema
+        self._fallback_factory = fallback_factory
+        self._fallback_validators = local()
+        try:
+            self._func = _compile_mapping(schema=schema, allow_unknown=allow_unknown, purge_unknown=purge_unknown)
+        except SchemaNotCompilable:
+            if fallback_factory is None:
+                raise
+            self._func = None
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._func is not None
+
+    def __call__(self, document: dict) -> (dict, dict):
+        """
+        Normalize and validate a document
+        :param document: Document to validate
+        :return: Tuple of normalized document and errors (None if the document is valid)
+        """
+        if self._func is not None and isinstance(document, Mapping):
+            return self._func(document)
+        return self._validate_with_fallback(document=document)
+
+    def _fallback_validator(self):
+        validator = getattr(self._fallback_validators, 'validator', None)
+        if validator is None:
+            validator = self._fallback_factory()
+            self._fallback_validators.validator = validator
+        return validator
+
+    def _validate_with_fallback(self, document: dict) -> (dict, dict):
+        validator = self._fallback_validator()
+        if not validator.validate(document):
+            return document, validator.errors
+        return validator.normalized(document), None
+
+
+def compile_schema(
+        schema: dict, fallback_factory=None, allow_unknown: bool = True, purge_unknown: bool = True
+) -> CompiledSchema:
+    return CompiledSchema(
+        schema=schema, fallback_factory=fallback_factory, allow_unknown=allow_unknown, purge_unknown=purge_unknown
+    )
@@ -0,0 +1,141 @@
+import json
+import base64
+import dataclasses
+from enum import Enum
+from uuid import UUID
+from decimal import Decimal
+from datetime import date, datetime, time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+TEXT_MIMETYPES = [JSON_MIMETYPE, 'application/xml', 'application/javascript', 'application/x-ndjson']
+
+SERIALIZERS = {}
+SERIALIZERS_ALIASES = {}
+
+
+def to_serializable(value):
+    """
+    Convert values that JSON (and MessagePack) do not support.
+    datetime, date and time to ISO format, Decimal and UUID to string, dataclass to dict, set to list,
+    Enum to its value and bytes to base64 string.
+    :param value: Value to convert
+    :return: Serializable value
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    raise TypeError(f'Object of type {value.__class__.__name__} is not serializable')
+
+
+def _dumps_stdlib(value) -> bytes:
+    return json.dumps(value, default=to_serializable, separators=(',', ':')).encode()
+
+
+def _dumps_orjson(value) -> bytes:
+    return orjson.dumps(value, default=to_serializable, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _dumps_msgpack(value) -> bytes:
+    return msgpack.packb(value, default=to_serializable, datetime=False)
+
+
+json_dumps = _dumps_stdlib if orjson is None else _dumps_orjson
+
+
+def register_serializer(mimetype: str, func, aliases: list = None):
+    """
+    Register response serializer
+    :param mimetype: Content type, as in `Accept` header
+    :param func: Function that gets a value and returns bytes
+    :param aliases: Other content types for the same serializer
+    :return:
+    """
+    SERIALIZERS[mimetype] = func
+    for alias in aliases or []:
+        SERIALIZERS_ALIASES[alias] = mimetype
+
+
+register_serializer(mimetype=JSON_MIMETYPE, func=json_dumps, aliases=['text/json'])
+if msgpack is not None:
+    register_serializer(mimetype=MSGPACK_MIMETYPE, func=_dumps_msgpack, aliases=['application/x-msgpack'])
+
+
+def _parse_accept(accept: str) -> list:
+    media_ranges = []
+    for index, item in enumerate(accept.split(',')):
+        parts = item.strip().split(';')
+        mimetype = parts[0].strip().lower()
+        if not mimetype:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        media_ranges.append((-quality, index, mimetype))
+    media_ranges.sort()
+    return [(mimetype, -quality) for quality, _, mimetype in media_ranges]
+
+
+def negotiate(accept: str = None) -> (str, object):
+    """
+    Choose serializer by `Accept` header, JSON is the default
+    :param accept: Accept header value
+    :return: Tuple of content type and serializer function
+    """
+    if accept:
+        for mimetype, quality in _parse_accept(accept=accept):
+            if quality <= 0:
+                continue
+            mimetype = SERIALIZERS_ALIASES.get(mimetype, mimetype)
+            if mimetype in SERIALIZERS:
+                return mimetype, SERIALIZERS[mimetype]
+            if mimetype in ['*/*', 'application/*']:
+                break
+    return JSON_MIMETYPE, SERIALIZERS[JSON_MIMETYPE]
+
+
+def is_structured(value) -> bool:
+    """
+    Check if a response body should be serialized (and not passed to the web framework as is)
+    """
+    return isinstance(value, (dict, list, tuple)) or (dataclasses.is_dataclass(value) and not isinstance(value, type))
+
+
+def is_text_content_type(content_type: str) -> bool:
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type.startswith('text/') or content_type in TEXT_MIMETYPES
+
+
+def serialize(value, accept: str = None) -> (bytes, str):
+    """
+    Serialize response body by `Accept` header
+    :param value: Response body
+    :param accept: Accept header value
+    :return: Tuple of serialized body and content type
+    """
+    mimetype, func = negotiate(accept=accept)
+    return func(value), mimetype
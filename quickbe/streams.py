@@ -0,0 +1,359 @@
+import io
+import os
+import re
+import csv
+import json
+import codecs
+from collections.abc import Iterator
+
+QUICKBE_STREAM_MAX_RECORD_SIZE_KEY = 'QUICKBE_STREAM_MAX_RECORD_SIZE'
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = int(os.getenv(QUICKBE_STREAM_MAX_RECORD_SIZE_KEY, 16 * 1024**2))
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+_STRUCTURE_CHARS = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'\\.|"', re.DOTALL)
+_SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+
+
+class InvalidRequestBody(ValueError):
+    """
+    Request body can not be parsed, endpoint responds with status 400
+    """
+    pass
+
+
+def as_stream(body):
+    """
+    Get a readable binary stream for a request body
+    :param body: bytes, str, file like object, list of records or None
+    :return: Stream
+    """
+    if body is None:
+        return io.BytesIO()
+    if isinstance(body, (list, tuple)):
+        return io.BytesIO(json.dumps(body).encode())
+    if isinstance(body, str):
+        return io.BytesIO(body.encode())
+    if isinstance(body, (bytes, bytearray)):
+        return io.BytesIO(body)
+    return body
+
+
+class _TextReader:
+    """
+    Reads a binary stream in chunks and decodes it incrementally, keeps only unconsumed text
+    """
+
+    def __init__(self, stream, chunk_size: int, max_record_size: int):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._max_record_size = max_record_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def read_more(self) -> bool:
+        """
+        Read next chunk into buffer
+        :return: False at end of stream
+        """
+        if self.eof:
+            return False
+        if self.position > 0:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        if len(self.buffer) > self._max_record_size:
+            raise InvalidRequestBody(f'Record is larger than {self._max_record_size} bytes.')
+        # A record that spans chunks is read in growing chunks, so it is copied a few times and not once per chunk
+        chunk = self._stream.read(max(self._chunk_size, min(len(self.buffer), self._max_record_size)))
+        try:
+            if not chunk:
+                self.eof = True
+                self.buffer += self._decoder.decode(b'', final=True)
+                return False
+            self.buffer += self._decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise InvalidRequestBody(f'Request body is not UTF-8 text, {e}.')
+        return True
+
+    def skip_whitespace(self) -> str:
+        """
+        :return: Next non whitespace character, without consuming it, or empty string at end of stream
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ''
+
+
+class _ValueScanner:
+    """
+    Finds where a JSON value ends while its text arrives in chunks, text that was scanned is not scanned again.
+    Offsets are relative to reader position, buffer is trimmed up to it when more text is read.
+    """
+
+    def __init__(self, first_char: str):
+        self.is_scalar = first_char not in '"[{'
+        self.in_string = first_char == '"'
+        self.depth = 0
+        self.scanned = 1 if self.in_string else 0
+
+    def end(self, reader: _TextReader) -> int:
+        """
+        :return: Buffer index the value ends at, -1 when more text is needed
+        """
+        buffer = reader.buffer
+        offset = reader.position + self.scanned
+        if self.is_scalar:
+            match = _SCALAR_END.search(buffer, offset)
+            if match is not None:
+                return match.start()
+        else:
+            while True:
+                match = (_STRING_END if self.in_string else _STRUCTURE_CHARS).search(buffer, offset)
+                if match is None:
+                    break
+                token = match.group()
+                offset = match.end()
+                if self.in_string:
+                    if token == '"':
+                        self.in_string = False
+                        if self.depth == 0:
+                            return offset
+                elif token == '"':
+                    self.in_string = True
+                elif token in '[{':
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if self.depth <= 0:
+                        return offset
+        if reader.eof:
+            return len(buffer)
+        # Escaped character of a backslash at buffer end is in next chunk
+        end = len(buffer) - 1 if self.in_string and offset < len(buffer) and buffer.endswith('\\') else len(buffer)
+        self.scanned = end - reader.position
+        return -1
+
+
+def _parse_ndjson(reader: _TextReader):
+    scanned = 0
+    while True:
+        end = reader.buffer.find('\n', reader.position + scanned)
+        if end < 0:
+            scanned = len(reader.buffer) - reader.position
+            if reader.read_more():
+                continue
+            end = len(reader.buffer)
+            if reader.position >= end:
+                return
+        scanned = 0
+        line = reader.buffer[reader.position:end]
+        reader.position = end + 1
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise InvalidRequestBody(f'Invalid NDJSON line, {e}.')
+
+
+def _parse_json_array(reader: _TextReader):
+    reader.position += 1
+    expect_value = True
+    first = True
+    while True:
+        char = reader.skip_whitespace()
+        if char == '':
+            raise InvalidRequestBody('JSON array is not closed.')
+        if char == ']' and (first or not expect_value):
+            reader.position += 1
+            if reader.skip_whitespace() != '':
+                raise InvalidRequestBody('Unexpected data after JSON array.')
+            return
+        if not expect_value:
+            if char != ',':
+                raise InvalidRequestBody(f'Expected `,` or `]` in JSON array, got `{char}`.')
+            reader.position += 1
+            expect_value = True
+            continue
+        # Value is decoded once all of it is in buffer, not again on every chunk
+        scanner = _ValueScanner(first_char=char)
+        while scanner.end(reader=reader) < 0:
+            reader.read_more()
+        try:
+            value, end = _decoder.raw_decode(reader.buffer, reader.position)
+        except ValueError as e:
+            raise InvalidRequestBody(f'Invalid JSON array item, {e}.')
+        reader.position = end
+        first = False
+        expect_value = False
+        yield value
+
+
+def iter_records(body, chunk_size: int = READ_CHUNK_SIZE, max_record_size: int = MAX_RECORD_SIZE):
+    """
+    Parse records from a request body incrementally, memory is bounded by the largest record.
+    Body that starts with `[` is parsed as a JSON array of records, otherwise as NDJSON (one JSON value per line).
+    :param body: Binary stream (e.g WSGI input), bytes or str
+    :param chunk_size: Bytes to read at a time
+    :param max_record_size: Maximum size of a single record
+    :return: Generator of records
+    """
+    reader = _TextReader(stream=as_stream(body), chunk_size=chunk_size, max_record_size=max_record_size)
+    first_char = reader.skip_whitespace()
+    if first_char == '[':
+        yield from _parse_json_array(reader)
+    elif first_char != '':
+        yield from _parse_ndjson(reader)
+
+
+QUICKBE_STREAM_CHUNK_SIZE_KEY = 'QUICKBE_STREAM_CHUNK_SIZE'
+
+# Streamed response items are grouped up to this size before they are sent, 0 sends every item as it comes
+STREAM_CHUNK_SIZE = int(os.getenv(QUICKBE_STREAM_CHUNK_SIZE_KEY, 8 * 1024))
+CSV_MIMETYPE = 'text/csv'
+OCTET_STREAM_MIMETYPE = 'application/octet-stream'
+
+
+class NdjsonEncoder:
+    """
+    Encode every item as a JSON line
+    """
+    mimetype = NDJSON_MIMETYPE
+
+    def __call__(self, item) -> bytes:
+        from quickbe.serializers import json_dumps
+        return json_dumps(item) + b'\n'
+
+
+class CsvEncoder:
+    """
+    Encode every item as a CSV row. Items are dicts (fieldnames are taken from the first one when not given)
+    or sequences of values.
+    """
+    mimetype = CSV_MIMETYPE
+
+    def __init__(self, fieldnames: list = None, header: bool = True, **csv_options):
+        """
+        :param fieldnames: Columns of dict rows
+        :param header: Write header row (when fieldnames are known)
+        :param csv_options: csv.writer dialect options
+        """
+        self.fieldnames = fieldnames
+        self.header = header
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, **csv_options)
+        self._started = False
+
+    def __call__(self, item) -> bytes:
+        if isinstance(item, dict):
+            if self.fieldnames is None:
+                self.fieldnames = list(item.keys())
+            row = [item.get(name) for name in self.fieldnames]
+        else:
+            row = item
+        if not self._started:
+            self._started = True
+            if self.header and self.fieldnames is not None:
+                self._writer.writerow(self.fieldnames)
+        self._writer.writerow(row)
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data.encode()
+
+
+ENCODERS = {
+    'ndjson': NdjsonEncoder,
+    'csv': CsvEncoder,
+}
+
+
+def is_streamable(value) -> bool:
+    """
+    Check if an endpoint response is an iterator (e.g generator) that should be streamed
+    """
+    return isinstance(value, Iterator) and not isinstance(value, (str, bytes, dict, list, tuple))
+
+
+class StreamingBody:
+    """
+    Endpoint response that is sent while it is produced, items are encoded and grouped into chunks
+    """
+
+    def __init__(self, iterable, mimetype: str = None, chunk_size: int = None, encoder=None):
+        """
+        :param iterable: Items to send, bytes or str unless encoder is given
+        :param mimetype: Content type, default is taken from encoder
+        :param chunk_size: Group items up to this number of bytes, 0 to send every item as it comes
+        :param encoder: Function that gets an item and returns bytes, or encoder name (`ndjson` or `csv`)
+        """
+        if isinstance(encoder, str):
+            if encoder not in ENCODERS:
+                raise ValueError(f'Encoder {encoder} is not supported, use one of {list(ENCODERS)}.')
+            encoder = ENCODERS[encoder]()
+        self.iterable = iterable
+        self.encoder = encoder
+        self.mimetype = mimetype or getattr(encoder, 'mimetype', None) or OCTET_STREAM_MIMETYPE
+        self.chunk_size = STREAM_CHUNK_SIZE if chunk_size is None else chunk_size
+
+    def _encode(self, item) -> bytes:
+        if self.encoder is not None:
+            return self.encoder(item)
+        if isinstance(item, str):
+            return item.encode()
+        if isinstance(item, (bytes, bytearray)):
+            return item
+        raise TypeError(f'Streamed item of type {item.__class__.__name__} needs an encoder (e.g ndjson).')
+
+    def chunks(self):
+        """
+        :return: Generator of encoded chunks
+        """
+        buffer = bytearray()
+        try:
+            for item in self.iterable:
+                data = self._encode(item)
+                if self.chunk_size <= 0:
+                    if data:
+                        yield bytes(data)
+                    continue
+                buffer += data
+                if len(buffer) >= self.chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+            if buffer:
+                yield bytes(buffer)
+        finally:
+            self.close()
+
+    def read(self, limit: int = None) -> bytes:
+        """
+        Read the whole body
+        :param limit: Maximum size in bytes
+        :return: Body
+        """
+        body = bytearray()
+        for chunk in self.chunks():
+            body += chunk
+            if limit is not None and len(body) > limit:
+                self.close()
+                raise ResponseTooLarge(f'Streamed response is larger than {limit} bytes.')
+        return bytes(body)
+
+    def close(self):
+        close = getattr(self.iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+class ResponseTooLarge(ValueError):
+    pass
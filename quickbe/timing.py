@@ -0,0 +1,95 @@
+import os
+from time import perf_counter
+from contextlib import nullcontext
+
+QUICKBE_SERVER_TIMING_KEY = 'QUICKBE_SERVER_TIMING'
+
+SERVER_TIMING_HEADER = 'Server-Timing'
+PARSE_PHASE = 'parse'
+FILTERS_PHASE = 'filters'
+VALIDATE_PHASE = 'validate'
+HANDLER_PHASE = 'handler'
+SERIALIZE_PHASE = 'serialize'
+TOTAL_PHASE = 'total'
+
+# Add Server-Timing header with request phases durations to endpoint responses
+SERVER_TIMING = os.getenv(QUICKBE_SERVER_TIMING_KEY, '').lower().strip() in ['1', 'true', 'y', 'yes', 'on']
+
+_NOT_TIMED = nullcontext()
+
+
+class _Phase:
+
+    __slots__ = ('_timing', '_name', '_start')
+
+    def __init__(self, timing, name: str):
+        self._timing = timing
+        self._name = name
+
+    def __enter__(self):
+        self._timing._stack.append(0.0)
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timing._done(name=self._name, duration=perf_counter() - self._start)
+        return False
+
+
+class ServerTiming:
+    """
+    Durations of request phases. A phase that runs inside another one (e.g body parsing on first access to session
+    data, during validation) is not counted in the outer phase.
+    """
+
+    __slots__ = ('_phases', '_stack', '_start')
+
+    def __init__(self):
+        self._phases = {}
+        self._stack = []
+        self._start = perf_counter()
+
+    def measure(self, name: str) -> _Phase:
+        """
+        Measure a phase, use as context manager. Durations of a phase that runs more than once are added up.
+        :param name: Phase name
+        """
+        return _Phase(timing=self, name=name)
+
+    def _done(self, name: str, duration: float):
+        nested = self._stack.pop()
+        self._phases[name] = self._phases.get(name, 0) + duration - nested
+        if self._stack:
+            self._stack[-1] += duration
+
+    @property
+    def phases(self) -> dict:
+        """
+        :return: Phase name to duration in seconds, in the order phases first ended
+        """
+        return dict(self._phases)
+
+    def header_value(self) -> str:
+        parts = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in self._phases.items()]
+        parts.append(f'{TOTAL_PHASE};dur={(perf_counter() - self._start) * 1000:.3f}')
+        return ', '.join(parts)
+
+    def add_header(self, response_headers: dict):
+        response_headers[SERVER_TIMING_HEADER] = self.header_value()
+
+
+def new_server_timing() -> ServerTiming:
+    """
+    :return: ServerTiming for a request, None when Server-Timing is off (QUICKBE_SERVER_TIMING)
+    """
+    return ServerTiming() if SERVER_TIMING else None
+
+
+def measure(timing: ServerTiming, name: str):
+    """
+    Measure a phase when request is timed
+    :param timing: ServerTiming or None
+    :param name: Phase name
+    :return: Context manager
+    """
+    return _NOT_TIMED if timing is None else timing.measure(name=name)
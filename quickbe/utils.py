@@ -1,7 +1,24 @@
+import os
+import heapq
 import random
 import string
+import itertools
 import schedule
-from threading import Thread, Event
+from quickbelog import Log
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+
+
+QUICKBE_SCHEDULER_JITTER_KEY = 'QUICKBE_SCHEDULER_JITTER'
+
+# Jobs with this tag run on every instance, even when runs are coordinated by a lease backend
+RUN_EVERYWHERE_TAG = 'everywhere'
+# Tag that names the lease of a job, e.g `lease:nightly-report`
+LEASE_TAG_PREFIX = 'lease:'
+# A lease is held for this part of the job period, so the next run can take it
+LEASE_PERIOD_RATIO = 0.9
+
+SCHEDULER_JITTER = float(os.getenv(QUICKBE_SCHEDULER_JITTER_KEY, 0))
 
 
 def generate_token(chars: str = None, length: int = 32) -> str:
@@ -10,20 +27,37 @@ def generate_token(chars: str = None, length: int = 32) -> str:
     return ''.join(random.choice(chars) for _ in range(length))
 
 
+def _parse_interval(token: str):
+    """
+    :return: Interval as int, or float for fractions (e.g `0.5`), None if token is not a number
+    """
+    if token.isdigit():
+        return int(token)
+    try:
+        interval = float(token)
+    except ValueError:
+        return None
+    return interval if interval > 0 else None
+
+
 def get_schedule_job(scd_str: str) -> schedule.Job:
     """
     Parse and return schedule job.
     Extra documentation: https://schedule.readthedocs.io/en/stable/examples.html
+    Sub-second intervals are supported, e.g `every 0.5 seconds` or `every 250 milliseconds`.
     :param scd_str:
     :return:
     """
     schedule_job = schedule
     tokens = scd_str.strip().lower().split(' ')
     if tokens[0] == 'every':
-        if tokens[1].isdigit():
-            units = tokens[1]
-            schedule_job = schedule_job.every(int(units))
+        interval = _parse_interval(tokens[1])
+        if interval is not None:
             unit_name = tokens[2]
+            if unit_name in ['milliseconds', 'ms']:
+                schedule_job = schedule_job.every(interval / 1000).seconds
+            else:
+                schedule_job = schedule_job.every(interval)
             if unit_name == 'seconds':
                 schedule_job = schedule_job.seconds
             elif unit_name == 'minutes':
@@ -53,17 +87,176 @@ def get_schedule_job(scd_str: str) -> schedule.Job:
     return schedule_job
 
 
+_wakeups_lock = Lock()
+_wakeups = set()
+
+
+def _jobs_changed():
+    """
+    Wake scheduler threads, a job was added or removed
+    """
+    with _wakeups_lock:
+        events = list(_wakeups)
+    for event in events:
+        event.set()
+
+
+class _JobList(list):
+    """
+    Jobs of schedule default scheduler. Changes to the list wake scheduler threads so they plan again.
+    """
+
+    def append(self, job):
+        super().append(job)
+        _jobs_changed()
+
+    def extend(self, jobs):
+        super().extend(jobs)
+        _jobs_changed()
+
+    def insert(self, index, job):
+        super().insert(index, job)
+        _jobs_changed()
+
+    def remove(self, job):
+        super().remove(job)
+        _jobs_changed()
+
+    def pop(self, index=-1):
+        job = super().pop(index)
+        _jobs_changed()
+        return job
+
+    def clear(self):
+        super().clear()
+        _jobs_changed()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        _jobs_changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        _jobs_changed()
+
+    def __iadd__(self, jobs):
+        result = super().__iadd__(jobs)
+        _jobs_changed()
+        return result
+
+
+# `schedule.jobs` is the same list as the default scheduler jobs, both are replaced to stay in sync
+if not isinstance(schedule.default_scheduler.jobs, _JobList):
+    schedule.default_scheduler.jobs = schedule.jobs = _JobList(schedule.default_scheduler.jobs)
+
+
+def lease_name(job: schedule.Job) -> str:
+    """
+    Lease name of a job, the same on all instances: `lease:<name>` tag, otherwise function name and arguments
+    """
+    for tag in job.tags:
+        if isinstance(tag, str) and tag.startswith(LEASE_TAG_PREFIX):
+            return tag[len(LEASE_TAG_PREFIX):]
+    func = getattr(job.job_func, 'func', job.job_func)
+    name = f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", func.__class__.__name__)}'
+    args = getattr(job.job_func, 'args', ())
+    return f'{name}{args}' if args else name
+
+
+def lease_ttl(job: schedule.Job) -> float:
+    return max(job.period.total_seconds() * LEASE_PERIOD_RATIO, 0.001)
+
+
 class ScheduledJobs(Thread):
+    """
+    Runs jobs of schedule default scheduler. Next run times are kept in a heap and the thread sleeps until the
+    earliest one, adding or cancelling a job wakes it at once.
+    With a lease backend every run executes on the instance that takes the job lease, the others skip it.
+    """
 
-    def __init__(self, wait_interval: int = 1):
+    def __init__(self, wait_interval: float = None, lease_backend=None, jitter: float = None):
+        """
+        :param wait_interval: Maximum seconds to sleep, None sleeps until next job is due
+        :param lease_backend: quickbe.leases.LeaseBackend shared by all instances, None runs jobs on every instance
+        :param jitter: Maximum random delay in seconds of jobs that run on every instance, so instances do not run
+            them at the same moment (default from QUICKBE_SCHEDULER_JITTER)
+        """
         self.stop_event = Event()
         self.wait_interval = wait_interval
+        self.lease_backend = lease_backend
+        self.jitter = SCHEDULER_JITTER if jitter is None else jitter
+        self._wakeup = Event()
+        self._sequence = itertools.count()
         super(ScheduledJobs, self).__init__()
 
+    def _runs_everywhere(self, job: schedule.Job) -> bool:
+        return self.lease_backend is None or RUN_EVERYWHERE_TAG in job.tags
+
+    def _entry(self, job: schedule.Job) -> tuple:
+        run_at = job.next_run
+        if self.jitter > 0 and self._runs_everywhere(job=job):
+            run_at += timedelta(seconds=random.uniform(0, self.jitter))
+        return run_at, next(self._sequence), job, job.next_run
+
+    def _plan(self) -> list:
+        heap = [self._entry(job=job) for job in schedule.default_scheduler.jobs]
+        heapq.heapify(heap)
+        return heap
+
+    def _sleep_time(self, heap: list):
+        timeout = self.wait_interval
+        if heap:
+            due_in = max((heap[0][0] - datetime.now()).total_seconds(), 0)
+            timeout = due_in if timeout is None else min(timeout, due_in)
+        return timeout
+
+    def _acquire(self, job: schedule.Job) -> bool:
+        if self._runs_everywhere(job=job):
+            return True
+        name = lease_name(job=job)
+        try:
+            return self.lease_backend.acquire(name=name, ttl=lease_ttl(job=job))
+        except Exception as e:
+            # Skipping is safer than running on every instance
+            Log.error(f'Can not take lease {name}, run skipped, {e.__class__.__name__}: {e}')
+            return False
+
+    def _run_job(self, job: schedule.Job):
+        if not self._acquire(job=job):
+            Log.debug(f'Lease of {job} is taken by another instance, run skipped.')
+            job._schedule_next_run()
+            return
+        result = job.run()
+        if isinstance(result, schedule.CancelJob) or result is schedule.CancelJob:
+            schedule.cancel_job(job)
+
     def run(self):
-        while not self.stop_event.is_set():
-            schedule.run_pending()
-            self.stop_event.wait(self.wait_interval)
+        with _wakeups_lock:
+            _wakeups.add(self._wakeup)
+        try:
+            heap = self._plan()
+            while not self.stop_event.is_set():
+                if self._wakeup.is_set():
+                    self._wakeup.clear()
+                    heap = self._plan()
+                # Jobs that are changed or cancelled while running are planned again before the next one runs
+                while heap and not self._wakeup.is_set() and not self.stop_event.is_set():
+                    run_at, _, job, next_run = heap[0]
+                    if job.next_run != next_run:
+                        heapq.heapreplace(heap, self._entry(job=job))
+                        continue
+                    if run_at > datetime.now():
+                        break
+                    heapq.heappop(heap)
+                    self._run_job(job=job)
+                    if job in schedule.default_scheduler.jobs:
+                        heapq.heappush(heap, self._entry(job=job))
+                if not self._wakeup.is_set() and not self.stop_event.is_set():
+                    self._wakeup.wait(self._sleep_time(heap=heap))
+        finally:
+            with _wakeups_lock:
+                _wakeups.discard(self._wakeup)
 
     def terminate(self):
         self.stop_event.set()
+        self._wakeup.set()
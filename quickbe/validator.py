@@ -0,0 +1,36 @@
+from cerberus import Validator
+
+
+class EndPointValidator(Validator):
+
+    @staticmethod
+    def for_endpoint(schema: dict):
+        """
+        Create validator for endpoint data, unknown fields are allowed (and purged from nested schemas
+        that do not allow them)
+        :param schema: Validation schema
+        :return: EndPointValidator
+        """
+        validator = EndPointValidator(schema, purge_unknown=True)
+        validator.allow_unknown = True
+        return validator
+
+    def _validate_doc(self, constraint, field, value):
+        """
+        For documentation text
+        :param constraint:
+        :param field:
+        :param value:
+        :return:
+        """
+        pass
+
+    def _validate_example(self, constraint, field, value):
+        """
+        For example value
+        :param constraint:
+        :param field:
+        :param value:
+        :return:
+        """
+        pass
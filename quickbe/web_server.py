@@ -0,0 +1,489 @@
+import os
+import math
+from quickbelog import Log
+from datetime import datetime
+from flask import Flask, Response, request, stream_with_context
+from collections import deque
+from quickbe.compression import compress_flask_response, ACCEPT_ENCODING_HEADER
+from quickbe.etag import apply_conditional, ETAG_HEADER
+from quickbe.metrics import ENDPOINTS_METRICS
+from quickbe.utils import generate_token
+from quickbe.headers import get_header
+from quickbe.serializers import serialize, is_structured, JSON_MIMETYPE
+from quickbe.batch import batch_response, BATCH_PATH
+from quickbe.streams import StreamingBody
+from quickbe.docs import ENDPOINT_DOC_PATH, is_documentation_mode, developer_name, schema_documentation, \
+    endpoint_doc_html, endpoints_index_html, openapi_document
+from quickbe.filters import WEB_FILTERS, DEFAULT_PRIORITY, add_filter, replace_filters, get_filter_chain, \
+    apply_filter_chain
+from quickbe.scheduler import jobs_status
+from quickbe.admission import admit, track, load_status
+from quickbe.timing import new_server_timing, measure, FILTERS_PHASE, SERIALIZE_PHASE
+from quickbe.profiler import sample_stacks, collapsed_stacks, speedscope_profile, ProfilerBusy, PROFILE_FORMATS, \
+    COLLAPSED_FORMAT, SPEEDSCOPE_FORMAT, DEFAULT_PROFILE_SECONDS, DEFAULT_INTERVAL_SECONDS, MIN_INTERVAL_SECONDS
+from quickbe.prefork import PreforkServer, workers_status, QUICKBE_WEB_SERVER_WORKERS_KEY
+from quickbe.endpoints import HttpSession, WEB_SERVER_ENDPOINTS, WEB_SERVER_ENDPOINTS_CACHES, is_valid_http_handler, \
+    WEB_SERVER_ENDPOINTS_BULKHEADS, is_endpoint_etag_on, is_endpoint_compression_on, is_stream_body_request, \
+    resolve_filter_chain, resolve_rate_limit, match_endpoint, execute_endpoint_with_session
+
+QUICKBE_WEB_SERVER_ACCESS_KEY = 'QUICKBE_WEB_SERVER_ACCESS_KEY'
+
+DEVKEY_PARAMETER = 'devkey'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def installed_packages() -> list:
+    """
+    Installed distributions, as `name==version` sorted list
+    """
+    try:
+        from importlib import metadata
+    except ImportError:  # Python 3.7
+        from pkg_resources import working_set
+        return sorted([f"{pkg.key}=={pkg.version}" for pkg in working_set])
+    return sorted({
+        f"{dist.metadata['Name'].lower()}=={dist.version}" for dist in metadata.distributions() if dist.metadata['Name']
+    })
+
+
+def _json_body_loader(flask_request):
+    """
+    Request JSON is parsed on first access to session data, web filters that reject a request do not pay for it
+    """
+    flask_request = flask_request._get_current_object()
+
+    def load():
+        try:
+            return flask_request.json
+        except Exception:
+            return {}
+    return load
+
+
+class WebServer:
+
+    ACCESS_KEY = os.getenv(QUICKBE_WEB_SERVER_ACCESS_KEY, generate_token())
+    STOPWATCH_ID = None
+    _requests_stack = deque(maxlen=100)
+    web_filters = WEB_FILTERS
+    app = Flask(__name__)
+    _process = None
+
+    @staticmethod
+    def _register_request():
+        WebServer._requests_stack.append(datetime.now().timestamp())
+
+    @staticmethod
+    def is_developer(http_parameters: dict, http_headers) -> bool:
+        dev_name = developer_name(key=http_parameters.get(DEVKEY_PARAMETER, ''))
+        if dev_name is not None:
+            Log.info(f'DEVELOPER ACCESS {dev_name} accessed path {http_headers.environ.get("REQUEST_URI")}')
+            return True
+        return False
+
+    @staticmethod
+    def is_documentation_on(http_parameters: dict, http_headers: dict) -> bool:
+        return is_documentation_mode() or WebServer.is_developer(
+            http_parameters=http_parameters, http_headers=http_headers
+        )
+
+    @staticmethod
+    def memory_utilization() -> float:
+        """
+        Resident memory of server process in MB
+        """
+        if WebServer._process is None:
+            from psutil import Process
+            WebServer._process = Process(os.getpid())
+        return WebServer._process.memory_info().rss/1024**2
+
+    @staticmethod
+    def requests_per_minute() -> float:
+        try:
+            delta = datetime.now().timestamp() - WebServer._requests_stack[0]
+            return len(WebServer._requests_stack) * 60 / delta
+        except (ZeroDivisionError, IndexError, ValueError):
+            return 0
+
+    @staticmethod
+    def _validate_access_key(func, access_key: str):
+        if access_key == WebServer.ACCESS_KEY:
+            return func()
+        else:
+            return 'Unauthorized', 401
+
+    @staticmethod
+    @app.route('/health', methods=['GET'])
+    def health():
+        """
+        Health check endpoint
+        :return:
+        Return 'OK' and time stamp to ensure that response is not cached by any proxy.
+        {"status":"OK","timestamp":"2021-10-24 15:06:37.746497"}
+
+        You may pass HTTP parameter `echo` and it will include it in the response.
+        {"echo":"Testing","status":"OK","timestamp":"2021-10-24 15:03:45.830066"}
+        """
+        data = {'status': 'OK', 'timestamp': f'{datetime.now()}'}
+        echo_text = request.args.get('echo')
+        if echo_text is not None:
+            data['echo'] = echo_text
+        return data
+
+    @staticmethod
+    @app.route(f'/<access_key>/quickbe-server-status', methods=['GET'])
+    def web_server_status(access_key):
+        def do():
+            return {
+                'status': 'OK',
+                'timestamp': f'{datetime.now()}',
+                'log_level': Log.get_log_level_name(),
+                'log_warning_count': Log.warning_count(),
+                'log_error_count': Log.error_count(),
+                'log_critical_count': Log.critical_count(),
+                'memory_utilization': WebServer.memory_utilization(),
+                'requests_per_minute': WebServer.requests_per_minute(),
+                'uptime_seconds': Log.stopwatch_seconds(stopwatch_id=WebServer.STOPWATCH_ID, print_it=False),
+                'pid': os.getpid(),
+                'workers': workers_status(),
+                'jobs': jobs_status(),
+                'admission': load_status(),
+                'endpoints': ENDPOINTS_METRICS.snapshot(),
+                'endpoints_cache': {path: cache.stats() for path, cache in WEB_SERVER_ENDPOINTS_CACHES.items()},
+                'endpoints_bulkhead': {
+                    path: bulkhead.status() for path, bulkhead in WEB_SERVER_ENDPOINTS_BULKHEADS.items()
+                },
+            }
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    @app.route(f'/<access_key>/quickbe-server-metrics', methods=['GET'])
+    def web_server_metrics(access_key):
+        def do():
+            return ENDPOINTS_METRICS.prometheus(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    @app.route(f'/<access_key>/quickbe-server-profile', methods=['GET'])
+    def web_server_profile(access_key):
+        """
+        Sample stacks of all threads of the worker that handles the request. Parameters: `seconds` (default 5,
+        up to 60), `interval_ms` (default 5), `format` (`collapsed` or `speedscope`) and `idle` (include threads that
+        wait for work).
+        """
+        def do():
+            try:
+                seconds = float(request.args.get('seconds', DEFAULT_PROFILE_SECONDS))
+                interval = float(request.args.get('interval_ms', DEFAULT_INTERVAL_SECONDS * 1000)) / 1000
+            except ValueError:
+                return 'Parameters seconds and interval_ms must be numbers.', 400
+            if not math.isfinite(seconds) or not math.isfinite(interval):
+                return 'Parameters seconds and interval_ms must be finite numbers.', 400
+            profile_format = request.args.get('format', COLLAPSED_FORMAT)
+            if profile_format not in PROFILE_FORMATS:
+                return f'Format must be one of {PROFILE_FORMATS}.', 400
+            idle = request.args.get('idle', '').lower() in ['1', 'true', 'y', 'yes', 'on']
+            try:
+                stacks, _ = sample_stacks(seconds=seconds, interval=interval, idle=idle)
+            except ProfilerBusy as e:
+                return f'{e}', 409
+            if profile_format == SPEEDSCOPE_FORMAT:
+                return speedscope_profile(stacks=stacks, interval=max(interval, MIN_INTERVAL_SECONDS))
+            return collapsed_stacks(stacks=stacks), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    @app.route(f'/<access_key>/quickbe-server-info', methods=['GET'])
+    def web_server_info(access_key):
+        def do():
+            return {
+                'endpoints': list(WEB_SERVER_ENDPOINTS.keys()),
+                'packages': installed_packages(),
+            }
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    @app.route(f'/<access_key>/quickbe-server-environ', methods=['GET'])
+    def web_server_get_environ(access_key):
+        def do():
+            return dict(os.environ)
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    @app.route(f'/<access_key>/set_log_level/<level>', methods=['GET'])
+    def web_server_set_log_level(access_key, level: int):
+        def do():
+            Log.set_log_level(level=int(level))
+            return f'Log level is now {Log.get_log_level_name()}', 200
+        return WebServer._validate_access_key(func=do, access_key=access_key)
+
+    @staticmethod
+    def _schema_documentation(schema: dict, prefix: str = '') -> str:
+        """
+        Generate documentation by schema
+        :param schema:
+        :param prefix:
+        :return: doc string
+        """
+        return schema_documentation(schema=schema, prefix=prefix)
+
+    ENDPOINT_DOC_PATH = ENDPOINT_DOC_PATH
+
+    @staticmethod
+    @app.route(f'/quickbe-endpoint-doc/<path:path>', methods=['GET'])
+    @app.route(f'{ENDPOINT_DOC_PATH}<path:path>', methods=['GET'])
+    def web_server_get_endpoint_doc(path: str):
+        if WebServer.is_documentation_on(http_parameters=request.args, http_headers=request.headers):
+            html = endpoint_doc_html(path=path)
+            if html is not None:
+                return html, 200
+        return 'File not found', 404
+
+    @staticmethod
+    @app.route(f'/endpoints-index', methods=['GET'])
+    @app.route(f'/quickbe-endpoints-index', methods=['GET'])
+    def web_server_get_endpoints_index():
+        if WebServer.is_documentation_on(http_parameters=request.args, http_headers=request.headers):
+            return endpoints_index_html(devkey=request.args.get(DEVKEY_PARAMETER)), 200
+        return 'File not found', 404
+
+    @staticmethod
+    @app.route('/quickbe-openapi.json', methods=['GET'])
+    def web_server_get_openapi():
+        """
+        OpenAPI 3 document of all endpoints (e.g for generating client SDKs), built once and served with ETag
+        """
+        if not WebServer.is_documentation_on(http_parameters=request.args, http_headers=request.headers):
+            return 'File not found', 404
+        document, etag = openapi_document()
+        response_headers = {'Content-Type': JSON_MIMETYPE, ETAG_HEADER: etag}
+        body, status_code = apply_conditional(
+            body=document, status=200, response_headers=response_headers, request_headers=request.headers,
+            request_method=request.method
+        )
+        response = WebServer.app.make_response((body, status_code, response_headers))
+        compress_flask_response(response=response, accept_encoding=request.headers.get(ACCEPT_ENCODING_HEADER))
+        return response
+
+    @staticmethod
+    def _adopt_web_filters():
+        """
+        A list that was assigned to WebServer.web_filters replaces the registered filters, they run for every endpoint
+        """
+        web_filters = WebServer.web_filters
+        if web_filters is not WEB_FILTERS:
+            Log.warning('WebServer.web_filters was replaced, use WebServer.add_filter to register web filters.')
+            replace_filters(funcs=web_filters)
+            WebServer.web_filters = WEB_FILTERS
+
+    @staticmethod
+    def _apply_filters(session: HttpSession, path: str = None, match: tuple = None):
+        """
+        Run web filters
+        :param session: HTTP session
+        :param path: Requested path, filters that are scoped to other endpoints are skipped. None runs global filters.
+        :param match: Result of match_endpoint for the path
+        :return: Tuple of filter response, status and headers when a filter stopped the request, otherwise None
+        """
+        WebServer._adopt_web_filters()
+        if path is None:
+            chain = get_filter_chain(endpoint_path=None)
+        else:
+            chain = resolve_filter_chain(path=path, match=match)
+        filter_response = apply_filter_chain(chain=chain, session=session)
+        if filter_response is not None:
+            return filter_response[0], filter_response[1], session.response_headers
+        return None
+
+    @staticmethod
+    def _admit(path: str = None, match: tuple = None):
+        """
+        Rate limits and load shedding, before request body is read
+        :param path: Requested path, None for requests that are not endpoint calls (client rate limit only)
+        :param match: Result of match_endpoint for the path
+        :return: Tuple of response, status (429 or 503) and headers when request is rejected, otherwise None
+        """
+        endpoint_path, rate_limit = (None, None) if path is None else resolve_rate_limit(path=path, match=match)
+        return admit(
+            remote_addr=request.remote_addr, headers=request.headers, parameters=request.args,
+            endpoint_path=endpoint_path, rate_limit=rate_limit
+        )
+
+    @staticmethod
+    @app.route(f'/{BATCH_PATH}', methods=['POST'])
+    def web_server_batch():
+        """
+        Execute many endpoints in one request. Body is a JSON list of `{path, body, parameters}` items,
+        response is an ordered list of `{body, headers, status}`.
+        Global web filters run once per batch, on request headers and query parameters, user id that filters set
+        is passed to all items. Every item runs the filters of its endpoint again, on item data, except global
+        filters that are batch safe.
+        """
+        WebServer._register_request()
+        rejection = WebServer._admit()
+        if rejection is not None:
+            return rejection
+        with track():
+            return WebServer._batch_response()
+
+    @staticmethod
+    def _batch_response():
+        try:
+            items = request.get_json(force=True)
+        except Exception:
+            return 'Batch must be a JSON list of items.', 400
+
+        session = HttpSession(parameters=request.args, headers=request.headers)
+        filter_response = WebServer._apply_filters(session=session)
+        if filter_response is not None:
+            return filter_response
+
+        response_body, response_headers, status_code = batch_response(
+            items=items, headers=request.headers, user_id=session.user_id, remote_addr=request.remote_addr,
+            rate_limited=True
+        )
+        if is_structured(response_body):
+            try:
+                response_body, response_headers['Content-Type'] = serialize(
+                    value=response_body, accept=request.headers.get('Accept')
+                )
+            except (TypeError, ValueError) as e:
+                Log.exception('Can not serialize batch response')
+                status_code = 500
+                response_body = f'{e}'
+        response = WebServer.app.make_response((response_body, status_code, response_headers))
+        compress_flask_response(response=response, accept_encoding=request.headers.get(ACCEPT_ENCODING_HEADER))
+        return response
+
+    @staticmethod
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+    @app.route('/<path:path>', methods=['GET', 'POST'])
+    def dynamic_get(path: str):
+        WebServer._register_request()
+        # Path is matched once, admission, filters and endpoint execution get the match
+        match = match_endpoint(path=path)
+        rejection = WebServer._admit(path=path, match=match)
+        if rejection is not None:
+            return rejection
+        with track():
+            return WebServer._endpoint_response(path=path, match=match)
+
+    @staticmethod
+    def _endpoint_response(path: str, match: tuple = None):
+        timing = new_server_timing()
+        if is_stream_body_request(path=path, match=match):
+            session = HttpSession(
+                parameters=request.args, headers=request.headers, body_stream=request.stream, timing=timing
+            )
+        else:
+            session = HttpSession(
+                parameters=request.args, headers=request.headers, body_loader=_json_body_loader(request),
+                timing=timing
+            )
+
+        with measure(timing=timing, name=FILTERS_PHASE):
+            filter_response = WebServer._apply_filters(session=session, path=path, match=match)
+        if filter_response is not None:
+            if timing is not None:
+                timing.add_header(response_headers=filter_response[2])
+            return filter_response
+        response_headers = {}
+        try:
+            response_body, response_headers, status_code = execute_endpoint_with_session(
+                path=path,
+                session=session,
+                match=match
+            )
+        except NotImplementedError:
+            status_code = 404
+            response_body = 'File not found'
+        except Exception as e:
+            Log.exception(f'Endpoint {path} raised an exception')
+            status_code = 500
+            response_body = f'{e}'
+
+        if is_structured(response_body):
+            try:
+                with measure(timing=timing, name=SERIALIZE_PHASE):
+                    response_body, content_type = serialize(value=response_body, accept=request.headers.get('Accept'))
+                if get_header(response_headers, 'Content-Type') is None:
+                    response_headers['Content-Type'] = content_type
+            except (TypeError, ValueError) as e:
+                Log.exception(f'Can not serialize endpoint {path} response')
+                status_code = 500
+                response_body = f'{e}'
+        if timing is not None:
+            # Streamed responses are produced after headers are sent, they are timed until the stream starts
+            timing.add_header(response_headers=response_headers)
+
+        stream = response_body
+        response_body, status_code = apply_conditional(
+            body=response_body,
+            status=status_code,
+            response_headers=response_headers,
+            request_headers=request.headers,
+            request_method=request.method,
+            auto=is_endpoint_etag_on(path=session.endpoint_path)
+        )
+        if isinstance(response_body, StreamingBody):
+            # No Content-Length, chunks are sent as they are produced (chunked transfer on HTTP/1.1)
+            response = Response(
+                stream_with_context(response_body.chunks()), status=status_code, headers=response_headers,
+                mimetype=None if get_header(response_headers, 'Content-Type') else response_body.mimetype
+            )
+        else:
+            if isinstance(stream, StreamingBody):
+                stream.close()
+            response = WebServer.app.make_response((response_body, status_code, response_headers))
+        if is_endpoint_compression_on(path=session.endpoint_path):
+            compress_flask_response(response=response, accept_encoding=request.headers.get(ACCEPT_ENCODING_HEADER))
+        return response
+
+    @staticmethod
+    def add_filter(
+            func, paths: list = None, pattern: str = None, priority: int = DEFAULT_PRIORITY, batch_safe: bool = False
+    ):
+        """
+        Add a function as a web filter. Function must receive request and return int as http status.
+        If returns 200 the request will be processed otherwise it will stop and return this status.
+        Filter chain of every endpoint is resolved once, requests run only the filters that apply.
+        :param func: Filter function
+        :param paths: Run only for endpoints under these path prefixes (e.g `admin` matches `admin/users/<id>`)
+        :param pattern: Run only for endpoints which path matches this regular expression (from path start)
+        :param priority: Filters with lower priority run first, same priority runs by registration order
+        :param batch_safe: Filter reads only request headers and query parameters, a global filter then runs once per
+            batch and not again for every batch item
+        :return:
+        """
+        if hasattr(func, '__call__') and is_valid_http_handler(func=func):
+            add_filter(func=func, paths=paths, pattern=pattern, priority=priority, batch_safe=batch_safe)
+            Log.info(f'Filter {func.__qualname__} added.')
+        else:
+            raise TypeError(f'Filter is not valid! Got this {type(func)}.')
+
+    @staticmethod
+    def start(
+            host: str = '0.0.0.0', port: int = 8888, workers: int = None, threads: int = None,
+            max_requests: int = None, max_rss_mb: float = None
+    ):
+        """
+        Start web server. With workers (or QUICKBE_WEB_SERVER_WORKERS) it runs as pre-fork server,
+        otherwise Flask development server is used.
+        :param host: Host to listen on
+        :param port: Port to listen on
+        :param workers: Number of worker processes
+        :param threads: Threads per worker (QUICKBE_WEB_SERVER_THREADS, default 8)
+        :param max_requests: Recycle worker after this number of requests (QUICKBE_WEB_SERVER_MAX_REQUESTS)
+        :param max_rss_mb: Recycle worker when its memory is over this value (QUICKBE_WEB_SERVER_MAX_RSS_MB)
+        :return:
+        """
+        WebServer.STOPWATCH_ID = Log.start_stopwatch('Quickbe web server is starting...', print_it=True)
+        Log.info(f'Server access key: {WebServer.ACCESS_KEY}')
+        workers = workers or int(os.getenv(QUICKBE_WEB_SERVER_WORKERS_KEY, 0))
+        if workers > 0:
+            PreforkServer(
+                app=WebServer.app, host=host, port=port, workers=workers, threads=threads,
+                max_requests=max_requests, max_rss_mb=max_rss_mb
+            ).run()
+        else:
+            WebServer.app.run(host=host, port=port)
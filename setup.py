@@ -19,7 +19,13 @@ setuptools.setup(
         'cerberus==1.3.4',
         'schedule==1.1.0',
         'psutil==5.9.4',
+        'cachetools==4.2.4',
     ],
+    extras_require={
+        'fast': ['orjson'],
+        'msgpack': ['msgpack'],
+        'oauth': ['google-auth', 'google-auth-oauthlib'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
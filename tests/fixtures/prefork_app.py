@@ -0,0 +1,15 @@
+"""
+Pre-fork server for tests: python prefork_app.py <port> <max requests>
+"""
+import os
+import sys
+from quickbe import WebServer, endpoint, HttpSession
+
+
+@endpoint(path='prefork-test/pid')
+def pid(session: HttpSession):
+    return {'pid': os.getpid()}
+
+
+if __name__ == '__main__':
+    WebServer.start(host='127.0.0.1', port=int(sys.argv[1]), workers=2, threads=2, max_requests=int(sys.argv[2]))
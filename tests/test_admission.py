@@ -0,0 +1,170 @@
+import time
+import unittest
+import multiprocessing
+from threading import Thread
+from quickbe import endpoint, HttpSession, WebServer
+from quickbe import admission
+from quickbe.admission import TokenBuckets, RateLimit
+
+body_reads = []
+
+
+@endpoint(path='admission-test/limited', rate_limit={'rate': 1, 'burst': 2})
+def limited(session: HttpSession):
+    body_reads.append(session.get('name'))
+    return 'OK'
+
+
+@endpoint(path='admission-test/batch-limited', rate_limit={'rate': 0.01, 'burst': 2})
+def batch_limited(session: HttpSession):
+    return 'OK'
+
+
+@endpoint(path='admission-test/per-client/<int:item_id>', rate_limit={'rate': 1, 'burst': 1, 'per_client': True})
+def per_client(session: HttpSession):
+    return 'OK'
+
+
+@endpoint(path='admission-test/slow')
+def slow(session: HttpSession):
+    time.sleep(0.3)
+    return 'OK'
+
+
+@endpoint(path='admission-test/open')
+def open_endpoint(session: HttpSession):
+    return 'OK'
+
+
+def take_tokens(buckets: TokenBuckets, count: int):
+    for _ in range(count):
+        buckets.take(key='shared', rate=0.001, burst=5)
+
+
+class TokenBucketsTestCase(unittest.TestCase):
+
+    def test_take_and_refill(self):
+        buckets = TokenBuckets(slots=16)
+        self.assertEqual(0, buckets.take(key='a', rate=2, burst=2, now=100))
+        self.assertEqual(0, buckets.take(key='a', rate=2, burst=2, now=100))
+        self.assertAlmostEqual(0.5, buckets.take(key='a', rate=2, burst=2, now=100))
+        self.assertEqual(0, buckets.take(key='b', rate=2, burst=2, now=100))
+        self.assertEqual(0, buckets.take(key='a', rate=2, burst=2, now=100.5))
+        self.assertGreater(buckets.take(key='a', rate=2, burst=2, now=100.5), 0)
+
+    def test_full_table_drops_idlest_bucket(self):
+        buckets = TokenBuckets(slots=2)
+        buckets.take(key='a', rate=1, burst=1, now=100)
+        buckets.take(key='b', rate=1, burst=1, now=101)
+        self.assertEqual(0, buckets.take(key='c', rate=1, burst=1, now=101))
+        self.assertGreater(buckets.take(key='b', rate=1, burst=1, now=101), 0)
+
+    def test_shared_by_forked_processes(self):
+        buckets = TokenBuckets(slots=16)
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=take_tokens, args=(buckets, 2)) for _ in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=10)
+        self.assertEqual(0, buckets.take(key='shared', rate=0.001, burst=5))
+        self.assertGreater(buckets.take(key='shared', rate=0.001, burst=5), 0)
+
+    def test_rate_limit_definition(self):
+        self.assertEqual(5, RateLimit.from_definition(definition=5).burst)
+        self.assertTrue(RateLimit.from_definition(definition={'rate': 2, 'per_client': True}).per_client)
+        with self.assertRaises(ValueError):
+            RateLimit(rate=0)
+        with self.assertRaises(TypeError):
+            RateLimit.from_definition(definition='fast')
+
+
+class AdmissionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WebServer.app.test_client()
+
+    def test_endpoint_rate_limit(self):
+        statuses = [self.client.post('/admission-test/limited', json={'name': 'x'}) for _ in range(3)]
+        self.assertEqual([200, 200, 429], [response.status_code for response in statuses])
+        self.assertEqual('Too many requests', statuses[2].get_data(as_text=True))
+        self.assertEqual('1', statuses[2].headers['Retry-After'])
+        # Rejected request body is not read
+        self.assertEqual(['x', 'x'], body_reads)
+
+    def test_batch_items_are_rate_limited(self):
+        items = [{'path': 'admission-test/batch-limited'}] * 4 + [{'path': 'admission-test/open'}]
+        response = self.client.post('/quickbe-batch', json=items)
+        self.assertEqual(200, response.status_code)
+        statuses = [item['status'] for item in response.json]
+        # Items run concurrently, any two of them take the burst
+        self.assertEqual([200, 200, 429, 429], sorted(statuses[:4]))
+        self.assertEqual(200, statuses[4])
+        rejected = next(item for item in response.json if item['status'] == 429)
+        self.assertEqual('Too many requests', rejected['body'])
+        self.assertIn('Retry-After', rejected['headers'])
+        self.assertEqual(429, self.client.get('/admission-test/batch-limited').status_code)
+
+    def test_per_client_rate_limit(self):
+        path = '/admission-test/per-client/1'
+        self.assertEqual(200, self.client.get(path, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code)
+        self.assertEqual(429, self.client.get(path, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code)
+        # Bucket is per endpoint, not per path
+        self.assertEqual(
+            429, self.client.get('/admission-test/per-client/2', environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code
+        )
+        self.assertEqual(200, self.client.get(path, environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code)
+
+    def test_client_rate_limit_by_header(self):
+        admission.CLIENT_RATE_LIMIT, admission.CLIENT_RATE_LIMIT_BURST = 1, 1
+        admission.CLIENT_RATE_LIMIT_BY = 'header:X-Api-Key'
+        try:
+            headers = {'X-Api-Key': 'admission-test-key'}
+            self.assertEqual(200, self.client.get('/admission-test/open', headers=headers).status_code)
+            self.assertEqual(429, self.client.get('/admission-test/open', headers=headers).status_code)
+            self.assertEqual(429, self.client.post('/batch', json=[], headers=headers).status_code)
+            other_headers = {'X-Api-Key': 'admission-test-other-key'}
+            self.assertEqual(200, self.client.get('/admission-test/open', headers=other_headers).status_code)
+        finally:
+            admission.CLIENT_RATE_LIMIT, admission.CLIENT_RATE_LIMIT_BURST = 0, 1
+            admission.CLIENT_RATE_LIMIT_BY = 'ip'
+
+    def test_shed_by_in_flight(self):
+        admission.SHED_MAX_IN_FLIGHT = 1
+        try:
+            slow_response = []
+            thread = Thread(target=lambda: slow_response.append(self.client.get('/admission-test/slow')))
+            thread.start()
+            time.sleep(0.1)
+            response = self.client.get('/admission-test/open')
+            thread.join()
+            self.assertEqual(503, response.status_code)
+            self.assertEqual('Server is busy', response.get_data(as_text=True))
+            self.assertEqual(200, slow_response[0].status_code)
+            self.assertEqual(200, self.client.get('/admission-test/open').status_code)
+            status = self.client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-status').json['admission']
+            self.assertGreaterEqual(status['shed'], 1)
+        finally:
+            admission.SHED_MAX_IN_FLIGHT = 0
+
+    def test_shed_by_latency(self):
+        admission.SHED_MAX_LATENCY_SECONDS = 0.1
+        load = admission.LOAD
+        latency = load.latency
+        try:
+            load.started()
+            load.finished(seconds=0)
+            load.latency = 0.2
+            results = [load.is_overloaded() for _ in range(200)]
+            # Half of requests still run, to measure latency
+            self.assertGreater(results.count(True), 50)
+            self.assertGreater(results.count(False), 50)
+            load.measured_at = time.monotonic() - admission.LATENCY_MAX_AGE_SECONDS - 1
+            self.assertFalse(load.is_overloaded())
+        finally:
+            admission.SHED_MAX_LATENCY_SECONDS = 0
+            load.latency = latency
+
+
+if __name__ == '__main__':
+    unittest.main()
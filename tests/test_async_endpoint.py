@@ -0,0 +1,83 @@
+import time
+import json
+import asyncio
+import unittest
+from quickbe import endpoint, HttpSession, execute_endpoint, execute_endpoint_async, aws_lambda_handler, WebServer
+
+DELAY_SECONDS = 0.3
+
+
+@endpoint(path='async-test/greet', validation={'name': {'type': 'string', 'required': True}})
+async def async_greet(session: HttpSession):
+    await asyncio.sleep(DELAY_SECONDS)
+    session.set_response_header('x-async', 'yes')
+    return f"Hello {session.get('name')}"
+
+
+@endpoint(path='async-test/sync-greet')
+def sync_greet(session: HttpSession):
+    time.sleep(DELAY_SECONDS)
+    return f"Hi {session.get('name')}"
+
+
+@endpoint(path='async-test/fail')
+async def async_fail(session: HttpSession):
+    await asyncio.sleep(0)
+    raise ValueError('Async failure')
+
+
+class AsyncEndpointTestCase(unittest.TestCase):
+
+    def test_sync_execution_of_coroutine_endpoint(self):
+        body, headers, status = execute_endpoint(
+            path='async-test/greet', headers={}, body={'name': 'Suzi'}, parameters={}
+        )
+        self.assertEqual(200, status)
+        self.assertEqual('Hello Suzi', body)
+        self.assertEqual({'x-async': 'yes'}, headers)
+
+    def test_validation_before_coroutine(self):
+        body, headers, status = execute_endpoint(path='async-test/greet', headers={}, body={}, parameters={})
+        self.assertEqual(400, status)
+        self.assertIn('name', body)
+
+    def test_async_execution_side_by_side(self):
+        async def run_all():
+            calls = []
+            for i in range(5):
+                calls.append(execute_endpoint_async(
+                    path='async-test/greet', headers={}, body={'name': f'a{i}'}, parameters={}
+                ))
+                calls.append(execute_endpoint_async(
+                    path='async-test/sync-greet', headers={}, body={'name': f's{i}'}, parameters={}
+                ))
+            return await asyncio.gather(*calls)
+
+        start = time.time()
+        results = asyncio.run(run_all())
+        self.assertLess(time.time() - start, DELAY_SECONDS * 5)
+        self.assertEqual('Hello a0', results[0][0])
+        self.assertEqual('Hi s4', results[9][0])
+        self.assertTrue(all(status == 200 for _, _, status in results))
+
+    def test_async_exception(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(execute_endpoint_async(path='async-test/fail', headers={}, body={}, parameters={}))
+        with self.assertRaises(ValueError):
+            execute_endpoint(path='async-test/fail', headers={}, body={}, parameters={})
+
+    def test_lambda_event(self):
+        for _ in range(2):
+            result = aws_lambda_handler(event={'path': 'async-test/greet', 'body': json.dumps({'name': 'Bob'})})
+            self.assertEqual(200, result.get('statusCode'))
+            self.assertEqual('"Hello Bob"', result.get('body'))
+
+    def test_web_server(self):
+        client = WebServer.app.test_client()
+        response = client.get('/async-test/greet?name=Dan')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Hello Dan', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
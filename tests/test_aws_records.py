@@ -0,0 +1,129 @@
+import os
+import copy
+import json
+import time
+import unittest
+from threading import Lock
+from quickbe import aws_records
+from quickbe import endpoint, HttpSession, aws_lambda_handler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+processed = []
+processed_lock = Lock()
+
+
+def load_event(name: str) -> dict:
+    with open(os.path.join(FIXTURES_DIR, f'{name}.json')) as f:
+        return json.load(f)
+
+
+@endpoint(path='records-test/orders', validation={
+    'order_id': {'type': 'integer', 'required': True},
+    'amount': {'type': 'number', 'required': True},
+})
+def orders(session: HttpSession):
+    with processed_lock:
+        processed.append(session.get('order_id'))
+    return 'OK'
+
+
+@endpoint(path='records-test/events')
+def events(session: HttpSession):
+    with processed_lock:
+        processed.append(session.get('name', session.get(aws_records.RECORD_BODY_KEY)))
+    return 'OK'
+
+
+@endpoint(path='records-test/slow')
+def slow(session: HttpSession):
+    time.sleep(0.2)
+    return 'OK'
+
+
+@endpoint(path='records-test/error')
+def error(session: HttpSession):
+    raise ValueError('Can not process record')
+
+
+def failures(response: dict) -> list:
+    return [item['itemIdentifier'] for item in response['batchItemFailures']]
+
+
+class AwsRecordsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        processed.clear()
+
+    def test_sqs(self):
+        event = load_event('sqs_event')
+        self.assertEqual('aws:sqs', aws_records.event_source(event=event))
+        response = aws_lambda_handler(event=event)
+        self.assertEqual(
+            ['2e1424d4-f796-459a-8184-9c92662be6da', '6a7b8c9d-0e1f-4a2b-8c3d-4e5f6a7b8c9d'], failures(response)
+        )
+        self.assertEqual(sorted([1, 'signup', 'plain text message'], key=str), sorted(processed, key=str))
+
+    def test_kinesis_keeps_partition_order(self):
+        response = aws_lambda_handler(event=load_event('kinesis_event'))
+        self.assertEqual(
+            [
+                '49590338271490256608559692540925702759324208523137515618',
+                '49590338271490256608559692541114838484616413283003170914',
+            ],
+            failures(response)
+        )
+        self.assertEqual([10, 11], processed)
+
+    def test_sns(self):
+        event = load_event('sns_event')
+        self.assertEqual({'batchItemFailures': []}, aws_lambda_handler(event=event))
+        self.assertEqual(['welcome'], processed)
+
+        event['Records'][0]['Sns']['MessageAttributes']['path']['Value'] = 'records-test/error'
+        with self.assertRaises(aws_records.RecordsProcessingError):
+            aws_lambda_handler(event=event)
+
+    def test_unsupported_event_source(self):
+        event = {'Records': [{'eventSource': 'aws:s3', 's3': {'object': {'key': 'upload.csv'}}}]}
+        response = aws_lambda_handler(event=event)
+        self.assertEqual(400, response['statusCode'])
+        self.assertIn('aws:s3', json.loads(response['body']))
+        self.assertEqual([], processed)
+
+    def test_path_attribute_and_default_path(self):
+        event = load_event('sqs_event')
+        record = event['Records'][3]
+        event['Records'] = [record]
+        try:
+            aws_records.configure(default_path='records-test/events')
+            self.assertEqual([], failures(aws_lambda_handler(event=copy.deepcopy(event))))
+            self.assertEqual(['no route'], processed)
+
+            aws_records.configure(path_attribute='route')
+            record['messageAttributes']['route'] = {'stringValue': 'records-test/error', 'dataType': 'String'}
+            self.assertEqual([record['messageId']], failures(aws_lambda_handler(event=event)))
+        finally:
+            aws_records.PATH_ATTRIBUTE = 'path'
+            aws_records.DEFAULT_PATH = None
+
+    def test_concurrent_processing(self):
+        event = load_event('sqs_event')
+        template = event['Records'][0]
+        event['Records'] = []
+        for i in range(6):
+            record = copy.deepcopy(template)
+            record['messageId'] = f'slow-{i}'
+            record['messageAttributes']['path']['stringValue'] = 'records-test/slow'
+            event['Records'].append(record)
+        aws_records.configure(workers=6)
+        try:
+            start = time.perf_counter()
+            self.assertEqual([], failures(aws_lambda_handler(event=event)))
+            self.assertLess(time.perf_counter() - start, 0.8)
+        finally:
+            aws_records.configure(workers=8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import json
+import time
+import unittest
+from flask import request
+from threading import Lock
+from quickbe import batch
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler
+
+state = {'running': 0, 'max_running': 0, 'filter_calls': 0}
+state_lock = Lock()
+
+
+@endpoint(path='batch-test/echo', validation={'name': {'type': 'string', 'required': True}})
+def echo(session: HttpSession):
+    session.set_response_header('X-Echo', session.get('name'))
+    return {'name': session.get('name'), 'user_id': session.user_id}
+
+
+@endpoint(path='batch-test/items/<int:item_id>')
+def item(session: HttpSession):
+    return {'item_id': session.get('item_id')}
+
+
+@endpoint(path='batch-test/slow')
+def slow(session: HttpSession):
+    with state_lock:
+        state['running'] += 1
+        state['max_running'] = max(state['max_running'], state['running'])
+    time.sleep(float(session.get('seconds', 0.1)))
+    with state_lock:
+        state['running'] -= 1
+    return 'done'
+
+
+@endpoint(path='batch-test/error')
+def error(session: HttpSession):
+    raise ValueError('Something went wrong')
+
+
+def user_filter(session: HttpSession):
+    state['filter_calls'] += 1
+    if session.request_headers.get('X-Deny') is not None:
+        session.set_status(401)
+        return 'Unauthorized'
+    session.set_user_id(session.request_headers.get('X-User'))
+
+
+def name_filter(session: HttpSession):
+    if session.get('name') == 'sauron':
+        session.set_status(401)
+        return 'You are not welcome here!'
+
+
+@endpoint(path='batch-test/request-context')
+def request_context(session: HttpSession):
+    return request.args.get('source')
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WebServer.app.test_client()
+
+    def tearDown(self):
+        batch.configure(max_items=50, timeout=30)
+
+    def test_batch_items_in_order(self):
+        items = [
+            {'path': 'batch-test/echo', 'body': {'name': 'a'}},
+            {'path': '/batch-test/items/7'},
+            {'path': 'batch-test/echo', 'parameters': {'name': 'b'}},
+            {'path': 'batch-test/echo'},
+            {'path': 'batch-test/missing'},
+            {'path': 'batch-test/error'},
+            {'body': {}},
+        ]
+        response = self.client.post('/quickbe-batch', json=items)
+        self.assertEqual(200, response.status_code)
+        responses = response.json
+        self.assertEqual([200, 200, 200, 400, 404, 500, 400], [item['status'] for item in responses])
+        self.assertEqual({'name': 'a', 'user_id': None}, responses[0]['body'])
+        self.assertEqual('a', responses[0]['headers']['X-Echo'])
+        self.assertEqual({'item_id': 7}, responses[1]['body'])
+        self.assertEqual('b', responses[2]['body']['name'])
+        self.assertEqual({'name': ['required field']}, responses[3]['body'])
+        self.assertEqual('Something went wrong', responses[5]['body'])
+
+    def test_filters_run_once(self):
+        WebServer.add_filter(user_filter, batch_safe=True)
+        try:
+            state['filter_calls'] = 0
+            items = [{'path': 'batch-test/echo', 'body': {'name': str(i)}} for i in range(5)]
+            response = self.client.post('/quickbe-batch', json=items, headers={'X-User': 'u1'})
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(1, state['filter_calls'])
+            self.assertEqual(['u1'] * 5, [item['body']['user_id'] for item in response.json])
+
+            response = self.client.post('/quickbe-batch', json=items, headers={'X-Deny': '1'})
+            self.assertEqual(401, response.status_code)
+        finally:
+            WebServer.web_filters.remove(user_filter)
+
+    def test_global_filters_run_on_item_data(self):
+        WebServer.add_filter(name_filter)
+        try:
+            items = [
+                {'path': 'batch-test/echo', 'body': {'name': 'frodo'}},
+                {'path': 'batch-test/echo', 'body': {'name': 'sauron'}},
+                {'path': 'batch-test/echo', 'parameters': {'name': 'sauron'}},
+            ]
+            response = self.client.post('/quickbe-batch', json=items)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual([200, 401, 401], [item['status'] for item in response.json])
+            self.assertEqual('You are not welcome here!', response.json[1]['body'])
+        finally:
+            WebServer.web_filters.remove(name_filter)
+
+    def test_items_see_request_context(self):
+        items = [{'path': 'batch-test/request-context'} for _ in range(3)]
+        response = self.client.post('/quickbe-batch?source=batch', json=items)
+        self.assertEqual(['batch'] * 3, [item['body'] for item in response.json])
+
+    def test_concurrent_execution(self):
+        state['max_running'] = 0
+        items = [{'path': 'batch-test/slow', 'parameters': {'seconds': 0.2}} for _ in range(4)]
+        start = time.perf_counter()
+        responses = batch.execute_batch(items=items)
+        self.assertLess(time.perf_counter() - start, 0.7)
+        self.assertEqual(['done'] * 4, [item['body'] for item in responses])
+        self.assertGreater(state['max_running'], 1)
+
+    def test_limits(self):
+        batch.configure(max_items=2)
+        items = [{'path': 'batch-test/items/1'}] * 3
+        self.assertEqual(413, self.client.post('/quickbe-batch', json=items).status_code)
+        self.assertEqual(400, self.client.post('/quickbe-batch', json={'path': 'batch-test/items/1'}).status_code)
+        self.assertEqual(400, self.client.post('/quickbe-batch', data='not json').status_code)
+
+        batch.configure(max_items=50, timeout=0.1)
+        items = [{'path': 'batch-test/items/1'}, {'path': 'batch-test/slow', 'parameters': {'seconds': 0.5}}]
+        responses = batch.execute_batch(items=items)
+        self.assertEqual([200, 504], [item['status'] for item in responses])
+
+    def test_aws_lambda(self):
+        items = [{'path': 'batch-test/items/3'}, {'path': 'batch-test/echo', 'body': {'name': 'l'}}]
+        response = aws_lambda_handler(event={'path': '/quickbe-batch', 'body': json.dumps(items)})
+        self.assertEqual(200, response['statusCode'])
+        body = json.loads(response['body'])
+        self.assertEqual([{'item_id': 3}, 'l'], [body[0]['body'], body[1]['body']['name']])
+
+        response = aws_lambda_handler(event={'path': '/quickbe-batch', 'body': '{}'})
+        self.assertEqual(400, response['statusCode'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import unittest
+from flask import request
+from threading import Thread, Event, Lock
+from quickbe import endpoint, HttpSession, WebServer, execute_endpoint, execute_endpoint_async
+from quickbe.aio import run_coroutine
+from quickbe.bulkhead import Bulkhead
+from quickbe.endpoints import get_endpoint_bulkhead
+
+release = Event()
+abandoned = Event()
+cancelled = Event()
+sync_runs = {'active': 0, 'peak': 0}
+sync_runs_lock = Lock()
+sync_runs_done = Event()
+
+
+@endpoint(path='bulkhead-test/export', max_concurrency=1, max_queue=1)
+def export(session: HttpSession):
+    release.wait(5)
+    return 'exported'
+
+
+@endpoint(path='bulkhead-test/cheap')
+def cheap(session: HttpSession):
+    return 'cheap'
+
+
+@endpoint(path='bulkhead-test/slow', timeout=0.1)
+def slow(session: HttpSession):
+    time.sleep(0.3)
+    abandoned.set()
+    return 'late'
+
+
+@endpoint(path='bulkhead-test/slow-async', max_concurrency=1, timeout=0.1)
+async def slow_async(session: HttpSession):
+    await asyncio.sleep(1)
+    return 'late'
+
+
+@endpoint(path='bulkhead-test/slow-cancelled', timeout=0.1)
+async def slow_cancelled(session: HttpSession):
+    try:
+        await asyncio.sleep(1)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+    return 'late'
+
+
+@endpoint(path='bulkhead-test/request-context', timeout=1)
+def request_context(session: HttpSession):
+    return request.args['name']
+
+
+@endpoint(path='bulkhead-test/sync-on-async-path', max_concurrency=1, max_queue=5, timeout=0.2)
+def sync_on_async_path(session: HttpSession):
+    with sync_runs_lock:
+        sync_runs['active'] += 1
+        sync_runs['peak'] = max(sync_runs['peak'], sync_runs['active'])
+    time.sleep(0.5)
+    session.set_status(201)
+    session.set_response_header('X-Late', 'yes')
+    with sync_runs_lock:
+        sync_runs['active'] -= 1
+    sync_runs_done.set()
+    return 'late'
+
+
+class BulkheadTestCase(unittest.TestCase):
+
+    def test_queue_and_reject(self):
+        client = WebServer.app.test_client()
+        responses = []
+        threads = [
+            Thread(target=lambda: responses.append(client.get('/bulkhead-test/export'))) for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        # One runs and one waits, next one is rejected at once
+        start = time.perf_counter()
+        rejected = client.get('/bulkhead-test/export')
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(503, rejected.status_code)
+        self.assertEqual('Endpoint is busy', rejected.get_data(as_text=True))
+        # Other endpoints are not affected
+        self.assertEqual(200, client.get('/bulkhead-test/cheap').status_code)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([200, 200], [response.status_code for response in responses])
+
+        status = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-status').json
+        self.assertEqual(1, status['endpoints_bulkhead']['bulkhead-test/export']['rejected'])
+        self.assertEqual(0, status['endpoints_bulkhead']['bulkhead-test/export']['active'])
+        self.assertEqual(1, status['endpoints']['bulkhead-test/export']['statuses']['503'])
+
+    def test_timeout_abandons_run(self):
+        start = time.perf_counter()
+        body, _, status = execute_endpoint(path='bulkhead-test/slow', headers={}, body={}, parameters={})
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual(504, status)
+        self.assertEqual('Endpoint timed out', body)
+        self.assertTrue(abandoned.wait(2))
+
+    def test_timeout_cancels_coroutine(self):
+        start = time.perf_counter()
+        body, _, status = run_coroutine(
+            execute_endpoint_async(path='bulkhead-test/slow-async', headers={}, body={}, parameters={})
+        )
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(504, status)
+        # Slot is free again
+        _, _, status = execute_endpoint(path='bulkhead-test/slow-async', headers={}, body={}, parameters={})
+        self.assertEqual(504, status)
+
+    def test_timeout_cancels_coroutine_of_sync_caller(self):
+        start = time.perf_counter()
+        body, _, status = execute_endpoint(path='bulkhead-test/slow-cancelled', headers={}, body={}, parameters={})
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(504, status)
+        self.assertEqual('Endpoint timed out', body)
+        self.assertTrue(cancelled.wait(1))
+
+    def test_abandoned_sync_run_keeps_slot_on_async_path(self):
+        async def call_all():
+            return await asyncio.gather(*[
+                execute_endpoint_async(path='bulkhead-test/sync-on-async-path', headers={}, body={}, parameters={})
+                for _ in range(4)
+            ])
+
+        results = run_coroutine(call_all())
+        self.assertEqual([504] * 4, [status for _, _, status in results])
+        bulkhead = get_endpoint_bulkhead(path='bulkhead-test/sync-on-async-path')
+        self.assertEqual(1, bulkhead.status()['active'])
+        self.assertTrue(sync_runs_done.wait(2))
+        time.sleep(0.05)
+        self.assertEqual(1, sync_runs['peak'])
+        self.assertEqual(0, bulkhead.status()['active'])
+        # Abandoned run does not change the response that was already built
+        self.assertEqual([{}] * 4, [headers for _, headers, _ in results])
+        self.assertEqual([504] * 4, [status for _, _, status in results])
+
+    def test_timed_runs_are_bounded(self):
+        bulkhead = Bulkhead(timeout=0.2)
+        lock = Lock()
+        runs = []
+
+        def work():
+            with lock:
+                runs.append(1)
+            time.sleep(0.4)
+
+        statuses = []
+        threads = [
+            Thread(target=lambda: statuses.append(bulkhead.run(work)[1])) for _ in range(bulkhead.max_threads + 5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Requests over the pool size are rejected, they do not run after their 504
+        self.assertEqual(5, statuses.count(503))
+        self.assertEqual(bulkhead.max_threads, statuses.count(504))
+        time.sleep(0.5)
+        self.assertEqual(bulkhead.max_threads, len(runs))
+        self.assertEqual(0, bulkhead.status()['threads'])
+        self.assertEqual(0, bulkhead.status()['active'])
+
+    def test_request_context_of_timed_run(self):
+        client = WebServer.app.test_client()
+        response = client.get('/bulkhead-test/request-context?name=quickbe')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('quickbe', response.get_data(as_text=True))
+
+    def test_wait_for_slot_until_deadline(self):
+        bulkhead = Bulkhead(max_concurrency=1, max_queue=5, timeout=0.1)
+        self.assertIsNone(bulkhead.enter())
+        start = time.perf_counter()
+        self.assertEqual((None, 504), bulkhead.run(lambda: 'never'))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.09)
+        bulkhead.leave()
+        self.assertEqual(('done', None), bulkhead.run(lambda: 'done'))
+        self.assertEqual(1, bulkhead.status()['timeouts'])
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            Bulkhead(max_concurrency=0)
+        with self.assertRaises(ValueError):
+            Bulkhead(timeout=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
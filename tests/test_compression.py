@@ -0,0 +1,109 @@
+import gzip
+import json
+import zlib
+import base64
+import unittest
+from flask import Response
+from quickbe import compression as cmp
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler
+
+ROWS = [{'id': i, 'name': f'Row number {i}', 'status': 'active'} for i in range(200)]
+
+
+@endpoint(path='compression-test/rows', etag=True)
+def rows(session: HttpSession):
+    return ROWS
+
+
+@endpoint(path='compression-test/small')
+def small(session: HttpSession):
+    return {'ok': True}
+
+
+@endpoint(path='compression-test/raw', compress=False)
+def raw(session: HttpSession):
+    return ROWS
+
+
+@endpoint(path='compression-test/stream')
+def stream(session: HttpSession):
+    def lines():
+        for i in range(1000):
+            yield f'{i},line number {i}\n'
+    return Response(lines(), mimetype='text/csv')
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def test_negotiate_encoding(self):
+        self.assertEqual('gzip', cmp.negotiate_encoding('gzip, deflate, br'))
+        self.assertEqual('deflate', cmp.negotiate_encoding('deflate'))
+        self.assertEqual('deflate', cmp.negotiate_encoding('gzip;q=0.5, deflate'))
+        self.assertEqual('gzip', cmp.negotiate_encoding('*'))
+        self.assertIsNone(cmp.negotiate_encoding('gzip;q=0, br'))
+        self.assertIsNone(cmp.negotiate_encoding('identity'))
+        self.assertIsNone(cmp.negotiate_encoding(None))
+
+    def test_compress(self):
+        payload = b'abc' * 1000
+        self.assertEqual(payload, gzip.decompress(cmp.compress(payload, encoding='gzip')))
+        self.assertEqual(payload, zlib.decompress(cmp.compress(payload, encoding='deflate', level=1)))
+
+    def test_compress_stream_is_incremental(self):
+        produced = []
+
+        def chunks():
+            for i in range(5):
+                produced.append(i)
+                yield f'chunk {i}\n'
+
+        stream = cmp.compress_stream(chunks(), encoding='gzip')
+        first = next(stream)
+        self.assertEqual([0], produced)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(b'chunk 0\n', decompressor.decompress(first))
+        rest = b''.join(stream)
+        self.assertEqual(b''.join(f'chunk {i}\n'.encode() for i in range(1, 5)), decompressor.decompress(rest))
+
+    def test_web_server_gzip(self):
+        client = WebServer.app.test_client()
+        response = client.get('/compression-test/rows', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', response.headers.get('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response.headers.get('Vary'))
+        self.assertTrue(response.headers.get('ETag').startswith('W/'))
+        self.assertEqual(ROWS, json.loads(gzip.decompress(response.data)))
+
+        etag = response.headers.get('ETag')
+        response = client.get('/compression-test/rows', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+    def test_web_server_no_compression(self):
+        client = WebServer.app.test_client()
+        self.assertIsNone(client.get('/compression-test/rows').headers.get('Content-Encoding'))
+        response = client.get('/compression-test/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        self.assertEqual({'ok': True}, response.json)
+        response = client.get('/compression-test/raw', headers={'Accept-Encoding': 'gzip'})
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+    def test_web_server_stream(self):
+        client = WebServer.app.test_client()
+        response = client.get('/compression-test/stream', headers={'Accept-Encoding': 'deflate'})
+        self.assertEqual('deflate', response.headers.get('Content-Encoding'))
+        self.assertIsNone(response.headers.get('Content-Length'))
+        text = zlib.decompress(response.data).decode()
+        self.assertEqual(1000, len(text.splitlines()))
+
+    def test_lambda(self):
+        result = aws_lambda_handler(event={'path': 'compression-test/rows', 'headers': {'accept-encoding': 'gzip'}})
+        self.assertTrue(result.get('isBase64Encoded'))
+        self.assertEqual('gzip', result.get('headers').get('Content-Encoding'))
+        body = gzip.decompress(base64.b64decode(result.get('body')))
+        self.assertEqual(ROWS, json.loads(body))
+
+        result = aws_lambda_handler(event={'path': 'compression-test/small', 'headers': {'accept-encoding': 'gzip'}})
+        self.assertFalse(result.get('isBase64Encoded'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import unittest
+from quickbe import endpoint, HttpSession, WebServer
+from quickbe import docs
+
+os.environ['QUICKBE_DEVELOPERS_KEYS'] = 'docs-test-key:Dev Eloper'
+
+
+@endpoint(path='docs-test/users/<int:user_id>', doc='Update a user', example={'ok': True}, validation={
+    'user_id': {'type': 'integer'},
+    'name': {'type': 'string', 'required': True, 'doc': 'User name', 'example': 'John'},
+    'role': {'type': 'string', 'allowed': ['admin', 'user'], 'default': 'user'},
+    'age': {'type': 'integer', 'min': 0, 'max': 150},
+    'address': {'type': 'dict', 'allow_unknown': False, 'schema': {
+        'city': {'type': 'string', 'required': True},
+        'zip_code': {'type': 'integer', 'default': -1},
+    }},
+    'tags': {'type': 'list', 'schema': {'type': 'string'}},
+})
+def update_user(session: HttpSession):
+    return {'ok': True}
+
+
+@endpoint(path='docs-test/ping', doc='Ping')
+def ping(session: HttpSession):
+    return 'pong'
+
+
+class DocsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WebServer.app.test_client()
+
+    def test_documentation_requires_developer(self):
+        self.assertEqual(404, self.client.get('/endpoint-doc/docs-test/ping').status_code)
+        self.assertEqual(404, self.client.get('/endpoints-index').status_code)
+        self.assertEqual(404, self.client.get('/quickbe-openapi.json').status_code)
+        self.assertEqual(404, self.client.get('/quickbe-openapi.json?devkey=wrong').status_code)
+
+    def test_endpoint_doc(self):
+        response = self.client.get('/endpoint-doc/docs-test/users/<int:user_id>?devkey=docs-test-key')
+        self.assertEqual(200, response.status_code)
+        html = response.get_data(as_text=True)
+        self.assertIn('<b>name</b> *required', html)
+        self.assertIn('<b>address.city</b>', html)
+        self.assertIn('Allowed: <b>admin, user</b>', html)
+        self.assertIn('"ok": true', html)
+        self.assertEqual(404, self.client.get('/endpoint-doc/docs-test/missing?devkey=docs-test-key').status_code)
+
+    def test_pages_are_rendered_once(self):
+        first = docs.endpoint_doc_html(path='docs-test/ping')
+        self.assertIs(first, docs.endpoint_doc_html(path='docs-test/ping'))
+
+        @endpoint(path='docs-test/late', doc='Added later')
+        def late(session: HttpSession):
+            return 'late'
+        self.assertIn('Added later', docs.endpoint_doc_html(path='docs-test/late'))
+
+    def test_schema_documentation_prefix(self):
+        html = WebServer._schema_documentation(schema={'city': {'type': 'string'}}, prefix='address.')
+        self.assertIn('<b>address.city</b>', html)
+        self.assertIn('<b>city</b>', WebServer._schema_documentation(schema={'city': {'type': 'string'}}))
+
+    def test_index(self):
+        response = self.client.get('/endpoints-index?devkey=docs-test-key')
+        html = response.get_data(as_text=True)
+        self.assertIn('<a href="/endpoint-doc/docs-test/ping?devkey=docs-test-key"><h3>docs-test/ping</h3></a>', html)
+
+    def test_developer_keys(self):
+        self.assertEqual('Dev Eloper', docs.developer_name(key='docs-test-key'))
+        self.assertIsNone(docs.developer_name(key=''))
+        self.assertIsNone(docs.developer_name(key='other'))
+
+    def test_openapi(self):
+        response = self.client.get('/quickbe-openapi.json?devkey=docs-test-key')
+        self.assertEqual(200, response.status_code)
+        document = response.json
+        self.assertEqual('3.0.3', document['openapi'])
+        operations = document['paths']['/docs-test/users/{user_id}']
+        post = operations['post']
+        self.assertEqual('Update a user', post['summary'])
+        self.assertEqual(
+            {'name': 'user_id', 'in': 'path', 'required': True, 'schema': {'type': 'integer'}}, post['parameters'][0]
+        )
+        body = post['requestBody']['content']['application/json']['schema']
+        self.assertEqual(['name'], body['required'])
+        self.assertEqual({'type': 'string', 'enum': ['admin', 'user'], 'default': 'user'}, body['properties']['role'])
+        self.assertEqual({'type': 'integer', 'minimum': 0, 'maximum': 150}, body['properties']['age'])
+        address = body['properties']['address']
+        self.assertEqual('object', address['type'])
+        self.assertFalse(address['additionalProperties'])
+        self.assertEqual(['city'], address['required'])
+        self.assertEqual({'type': 'array', 'items': {'type': 'string'}}, body['properties']['tags'])
+        self.assertEqual({'ok': True}, post['responses']['200']['content']['application/json']['example'])
+        query_names = [parameter['name'] for parameter in operations['get']['parameters']]
+        self.assertEqual(['user_id', 'name', 'role', 'age'], query_names)
+
+    def test_openapi_etag(self):
+        response = self.client.get('/quickbe-openapi.json?devkey=docs-test-key')
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+        response = self.client.get('/quickbe-openapi.json?devkey=docs-test-key', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import time
+import asyncio
+import unittest
+from threading import Thread
+from quickbe.cache import EndpointCache
+from quickbe import endpoint, HttpSession, execute_endpoint, execute_endpoint_async, execute_endpoint_with_session, \
+    get_endpoint_cache, WebServer
+
+calls = {}
+
+
+def count_call(name: str):
+    calls[name] = calls.get(name, 0) + 1
+
+
+@endpoint(path='cache-test/square', validation={'n': {'type': 'integer', 'default': 2}}, cache=60)
+def square(session: HttpSession):
+    count_call('square')
+    session.set_response_header('x-computed', 'yes')
+    return {'result': session.get('n') ** 2}
+
+
+@endpoint(path='cache-test/keys', cache={'ttl': 60, 'keys': ['a'], 'headers': ['X-Tenant']})
+def by_keys(session: HttpSession):
+    count_call('keys')
+    return {'a': session.get('a'), 'b': session.get('b')}
+
+
+@endpoint(path='cache-test/user', cache={'ttl': 60, 'per_user': True})
+def by_user(session: HttpSession):
+    count_call('user')
+    return session.user_id
+
+
+@endpoint(path='cache-test/slow', cache=EndpointCache(ttl=60))
+def slow(session: HttpSession):
+    count_call('slow')
+    time.sleep(0.3)
+    return 'done'
+
+
+@endpoint(path='cache-test/errors', cache=60)
+def errors(session: HttpSession):
+    count_call('errors')
+    session.set_status(503)
+    return 'try later'
+
+
+@endpoint(path='cache-test/slow-busy', cache=60)
+def slow_busy(session: HttpSession):
+    count_call('slow-busy')
+    if calls.get('slow-busy') == 1:
+        time.sleep(0.3)
+        session.set_status(503)
+        return 'busy'
+    return 'done'
+
+
+@endpoint(path='cache-test/async', cache=60)
+async def async_cached(session: HttpSession):
+    count_call('async')
+    await asyncio.sleep(0.2)
+    return 'async done'
+
+
+@endpoint(path='cache-test/expire', cache={'ttl': 0.2, 'max_entries': 2})
+def expire(session: HttpSession):
+    count_call('expire')
+    return session.get('n')
+
+
+def call(path: str, body: dict = None, headers: dict = None):
+    return execute_endpoint(path=path, headers=headers or {}, body=body or {}, parameters={})
+
+
+class EndpointCacheTestCase(unittest.TestCase):
+
+    def test_cache_hit_by_normalized_data(self):
+        first = call('cache-test/square', {'n': 3})
+        second = call('cache-test/square', {'n': 3})
+        self.assertEqual(first, second)
+        self.assertEqual(({'result': 9}, {'x-computed': 'yes'}, 200), second)
+        call('cache-test/square')
+        call('cache-test/square', {'n': 2})
+        self.assertEqual(2, calls.get('square'))
+
+    def test_cache_keys_and_headers(self):
+        call('cache-test/keys', {'a': 1, 'b': 1})
+        body, _, _ = call('cache-test/keys', {'a': 1, 'b': 2})
+        self.assertEqual({'a': 1, 'b': 1}, body)
+        call('cache-test/keys', {'a': 1, 'b': 2}, headers={'x-tenant': 't1'})
+        call('cache-test/keys', {'a': [1, {'x': 1}]})
+        call('cache-test/keys', {'a': [1, {'x': 1}]})
+        self.assertEqual(3, calls.get('keys'))
+
+    def test_cache_per_user(self):
+        for user_id in ['u1', 'u2', 'u1']:
+            session = HttpSession(body={})
+            session.set_user_id(user_id)
+            body, _, _ = execute_endpoint_with_session(path='cache-test/user', session=session)
+            self.assertEqual(user_id, body)
+        self.assertEqual(2, calls.get('user'))
+
+    def test_single_flight(self):
+        results = []
+        threads = [Thread(target=lambda: results.append(call('cache-test/slow'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, calls.get('slow'))
+        self.assertEqual(8, len(results))
+        self.assertTrue(all(result[0] == 'done' for result in results))
+        stats = get_endpoint_cache('cache-test/slow').stats()
+        self.assertEqual(7, stats.get('coalesced') + stats.get('hits'))
+
+    def test_single_flight_does_not_share_errors(self):
+        results = []
+        threads = [Thread(target=lambda: results.append(call('cache-test/slow-busy')))]
+        threads[0].start()
+        time.sleep(0.1)
+        threads += [Thread(target=lambda: results.append(call('cache-test/slow-busy'))) for _ in range(3)]
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        statuses = sorted(result[2] for result in results)
+        self.assertEqual([200, 200, 200, 503], statuses)
+        self.assertGreaterEqual(calls.get('slow-busy'), 2)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(503, call('cache-test/errors')[2])
+        self.assertEqual(503, call('cache-test/errors')[2])
+        self.assertEqual(2, calls.get('errors'))
+
+    def test_async_single_flight(self):
+        async def run_all():
+            return await asyncio.gather(*[
+                execute_endpoint_async(path='cache-test/async', headers={}, body={}, parameters={}) for _ in range(5)
+            ])
+        results = asyncio.run(run_all())
+        self.assertTrue(all(result[0] == 'async done' for result in results))
+        self.assertEqual(1, calls.get('async'))
+
+    def test_expiration_and_eviction(self):
+        for n in [1, 2, 3]:
+            call('cache-test/expire', {'n': n})
+        stats = get_endpoint_cache('cache-test/expire').stats()
+        self.assertEqual(1, stats.get('evictions'))
+        time.sleep(0.3)
+        call('cache-test/expire', {'n': 3})
+        self.assertEqual(4, calls.get('expire'))
+        self.assertGreaterEqual(get_endpoint_cache('cache-test/expire').stats().get('expirations'), 1)
+
+    def test_invalid_definition(self):
+        with self.assertRaises(TypeError):
+            EndpointCache.from_definition('1 minute')
+
+    def test_server_status(self):
+        call('cache-test/square', {'n': 5})
+        client = WebServer.app.test_client()
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-status')
+        stats = response.json.get('endpoints_cache').get('cache-test/square')
+        self.assertGreaterEqual(stats.get('misses'), 1)
+        self.assertIn('hits', stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from quickbe.etag import compute_etag, etag_matches, quote_etag
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler
+
+DOCUMENT_VERSION = 7
+calls = {'versioned': 0}
+
+
+@endpoint(path='etag-test/report', etag=True)
+def report(session: HttpSession):
+    return {'rows': [1, 2, 3], 'name': session.get('name')}
+
+
+@endpoint(path='etag-test/versioned')
+def versioned(session: HttpSession):
+    if session.is_not_modified(version=DOCUMENT_VERSION):
+        return None
+    calls['versioned'] += 1
+    return 'Expensive content'
+
+
+@endpoint(path='etag-test/plain')
+def plain(session: HttpSession):
+    return 'No ETag here'
+
+
+class EtagTestCase(unittest.TestCase):
+
+    def test_etag_functions(self):
+        self.assertEqual(compute_etag(b'abc'), compute_etag('abc'))
+        self.assertNotEqual(compute_etag(b'abc'), compute_etag(b'abd'))
+        self.assertTrue(compute_etag(b'abc').startswith('"'))
+        self.assertEqual('"7"', quote_etag(7))
+        self.assertEqual('W/"v1"', quote_etag('v1', weak=True))
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+    def test_auto_etag_web_server(self):
+        client = WebServer.app.test_client()
+        response = client.get('/etag-test/report?name=x')
+        self.assertEqual(200, response.status_code)
+        etag = response.headers.get('ETag')
+        self.assertIsNotNone(etag)
+
+        response = client.get('/etag-test/report?name=x', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+        self.assertEqual(etag, response.headers.get('ETag'))
+
+        response = client.get('/etag-test/report?name=y', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers.get('ETag'))
+
+        response = client.post('/etag-test/report?name=x', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+    def test_handler_short_circuit(self):
+        client = WebServer.app.test_client()
+        response = client.get('/etag-test/versioned')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"7"', response.headers.get('ETag'))
+        self.assertEqual(1, calls['versioned'])
+
+        response = client.get('/etag-test/versioned', headers={'If-None-Match': '"7"'})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, calls['versioned'])
+
+    def test_not_modified_keeps_vary(self):
+        client = WebServer.app.test_client()
+        headers = {'Accept-Encoding': 'gzip'}
+        response = client.get('/etag-test/report?name=v', headers=headers)
+        self.assertEqual('Accept-Encoding', response.headers.get('Vary'))
+        headers['If-None-Match'] = response.headers.get('ETag')
+        response = client.get('/etag-test/report?name=v', headers=headers)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('Accept-Encoding', response.headers.get('Vary'))
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+
+        event = {'path': 'etag-test/report', 'queryStringParameters': {'name': 'v'}, 'headers': headers}
+        result = aws_lambda_handler(event=event)
+        self.assertEqual(304, result.get('statusCode'))
+        self.assertEqual('Accept-Encoding', result.get('headers').get('Vary'))
+
+    def test_no_etag_by_default(self):
+        client = WebServer.app.test_client()
+        response = client.get('/etag-test/plain')
+        self.assertIsNone(response.headers.get('ETag'))
+
+    def test_lambda(self):
+        event = {'path': 'etag-test/report', 'httpMethod': 'GET', 'queryStringParameters': {'name': 'x'}}
+        result = aws_lambda_handler(event=event)
+        etag = result.get('headers').get('ETag')
+        self.assertIsNotNone(etag)
+
+        event['headers'] = {'if-none-match': etag}
+        result = aws_lambda_handler(event=event)
+        self.assertEqual(304, result.get('statusCode'))
+        self.assertEqual('', result.get('body'))
+
+        result = aws_lambda_handler(event={'path': 'etag-test/versioned', 'headers': {'If-None-Match': '"7"'}})
+        self.assertEqual(304, result.get('statusCode'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+from quickbe import endpoint, HttpSession, WebServer
+from quickbe.filters import get_filter_chain, WEB_FILTERS
+
+calls = []
+
+
+def global_filter(session: HttpSession):
+    calls.append('global')
+
+
+def first_filter(session: HttpSession):
+    calls.append('first')
+
+
+def admin_filter(session: HttpSession):
+    calls.append('admin')
+    if session.request_headers.get('X-Admin') != '1':
+        session.set_status(401)
+        return 'Admins only'
+
+
+def pattern_filter(session: HttpSession):
+    calls.append('pattern')
+
+
+def endpoint_filter(session: HttpSession):
+    calls.append('endpoint')
+    if session.get('deny'):
+        session.set_status(403)
+        return 'Denied'
+
+
+@endpoint(path='filters-test/public')
+def public(session: HttpSession):
+    return 'public'
+
+
+@endpoint(path='filters-test/admin/users/<int:user_id>')
+def admin_user(session: HttpSession):
+    return {'user_id': session.get('user_id')}
+
+
+@endpoint(path='filters-test/v2/orders')
+def orders(session: HttpSession):
+    return 'orders'
+
+
+def audit_filter(session: HttpSession):
+    calls.append('audit')
+
+
+@endpoint(path='filters-test/audited', filters=[(audit_filter, -2)])
+def audited(session: HttpSession):
+    return 'audited'
+
+
+@endpoint(path='filters-test/own', filters=[endpoint_filter])
+def own(session: HttpSession):
+    return 'own'
+
+
+class FiltersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WebServer.app.test_client()
+        self.filters = list(WebServer.web_filters)
+        WebServer.add_filter(global_filter)
+        WebServer.add_filter(admin_filter, paths=['filters-test/admin'])
+        WebServer.add_filter(pattern_filter, pattern=r'filters-test/v[0-9]+/')
+        WebServer.add_filter(first_filter, priority=-1)
+        calls.clear()
+
+    def tearDown(self):
+        WebServer.web_filters.clear()
+        WebServer.web_filters.extend(self.filters)
+
+    def test_public_runs_global_filters(self):
+        self.assertEqual('public', self.client.get('/filters-test/public').get_data(as_text=True))
+        self.assertEqual(['first', 'global'], calls)
+
+    def test_prefix_scope(self):
+        response = self.client.get('/filters-test/admin/users/3')
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(['first', 'global', 'admin'], calls)
+        response = self.client.get('/filters-test/admin/users/3', headers={'X-Admin': '1'})
+        self.assertEqual({'user_id': 3}, response.json)
+
+    def test_pattern_scope(self):
+        self.client.get('/filters-test/v2/orders')
+        self.assertEqual(['first', 'global', 'pattern'], calls)
+
+    def test_endpoint_filters(self):
+        self.assertEqual('own', self.client.get('/filters-test/own').get_data(as_text=True))
+        self.assertEqual(['first', 'global', 'endpoint'], calls)
+        self.assertEqual(403, self.client.get('/filters-test/own?deny=1').status_code)
+
+    def test_unmatched_path_runs_global_filters(self):
+        self.assertEqual(404, self.client.get('/filters-test/missing').status_code)
+        self.assertEqual(['first', 'global'], calls)
+
+    def test_chain_is_resolved_once(self):
+        chain = get_filter_chain(endpoint_path='filters-test/admin/users/<int:user_id>')
+        self.assertIs(chain, get_filter_chain(endpoint_path='filters-test/admin/users/<int:user_id>'))
+        self.assertEqual((first_filter, global_filter, admin_filter), chain)
+        WebServer.web_filters.remove(global_filter)
+        self.assertEqual(
+            (first_filter, admin_filter), get_filter_chain(endpoint_path='filters-test/admin/users/<int:user_id>')
+        )
+
+    def test_batch_items_run_scoped_filters(self):
+        items = [{'path': 'filters-test/public'}, {'path': 'filters-test/admin/users/1'}]
+        response = self.client.post('/quickbe-batch', json=items)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([200, 401], [item['status'] for item in response.json])
+        # Once for the batch and once per item, on item data
+        self.assertEqual(3, calls.count('global'))
+
+        calls.clear()
+        WebServer.add_filter(global_filter, batch_safe=True)
+        response = self.client.post('/quickbe-batch', json=items)
+        self.assertEqual([200, 401], [item['status'] for item in response.json])
+        self.assertEqual(1, calls.count('global'))
+
+    def test_endpoint_filter_priority(self):
+        self.assertEqual('audited', self.client.get('/filters-test/audited').get_data(as_text=True))
+        self.assertEqual(['audit', 'first', 'global'], calls)
+
+    def test_filter_with_many_scopes(self):
+        WebServer.add_filter(pattern_filter, paths=['filters-test/admin'], priority=-5)
+        self.client.get('/filters-test/v2/orders')
+        self.assertEqual(['first', 'global', 'pattern'], calls)
+        calls.clear()
+        self.client.get('/filters-test/admin/users/3')
+        self.assertEqual(['pattern', 'first', 'global', 'admin'], calls)
+
+    def test_replaced_web_filters_list(self):
+        WebServer.web_filters = [admin_filter]
+        try:
+            self.assertEqual(401, self.client.get('/filters-test/public').status_code)
+            self.assertEqual(['admin'], calls)
+        finally:
+            WebServer.web_filters = WEB_FILTERS
+
+    def test_invalid_endpoint_filter(self):
+        with self.assertRaises(TypeError):
+            @endpoint(path='filters-test/invalid', filters=[lambda: None])
+            def invalid(session: HttpSession):
+                return 'invalid'
+
+
+if __name__ == '__main__':
+    unittest.main()
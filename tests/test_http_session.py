@@ -0,0 +1,90 @@
+import unittest
+from quickbe import endpoint, HttpSession, WebServer, execute_endpoint_with_session
+
+loads = []
+
+
+@endpoint(path='http-session-test/items/<item_id>', validation={
+    'item_id': {'type': 'integer', 'coerce': int},
+    'name': {'type': 'string', 'default': 'none'},
+})
+def item(session: HttpSession):
+    return {'item_id': session.get('item_id'), 'name': session.get('name'), 'page': session.get('page')}
+
+
+@endpoint(path='http-session-test/plain')
+def plain(session: HttpSession):
+    return {'q': session.get('q')}
+
+
+def deny_filter(session: HttpSession):
+    name = session.get('name')
+    loads.append(session._data is None)
+    if name == 'sauron':
+        session.set_status(401)
+        return 'You are not welcome here!'
+
+
+def _loader(body):
+    def load():
+        loads.append(body)
+        return body
+    return load
+
+
+class HttpSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        loads.clear()
+
+    def test_slots(self):
+        session = HttpSession()
+        with self.assertRaises(AttributeError):
+            session.something = 1
+        self.assertFalse(hasattr(session, '__dict__'))
+
+    def test_parameters_override_body(self):
+        session = HttpSession(body={'a': 1, 'b': 2}, parameters={'b': 3})
+        self.assertEqual({'a': 1, 'b': 3}, session.data)
+
+    def test_body_is_loaded_on_first_access(self):
+        session = HttpSession(parameters={'q': 'x'}, body_loader=_loader({'name': 'a'}))
+        self.assertEqual('x', session.get('q'))
+        self.assertEqual([], loads)
+        self.assertEqual('a', session.get('name'))
+        self.assertEqual({'name': 'a', 'q': 'x'}, session.data)
+        self.assertEqual(1, len(loads))
+
+    def test_loader_returns_none(self):
+        session = HttpSession(body_loader=lambda: None)
+        self.assertEqual({}, session.data)
+        self.assertEqual('d', session.get('x', 'd'))
+
+    def test_path_parameters(self):
+        session = HttpSession(parameters={'page': '2'}, body_loader=_loader({'name': 'b', 'item_id': 'body'}))
+        body, _, status = execute_endpoint_with_session(path='http-session-test/items/12', session=session)
+        self.assertEqual(200, status)
+        self.assertEqual({'item_id': 12, 'name': 'b', 'page': '2'}, body)
+
+    def test_unchanged_data_is_not_copied(self):
+        session = HttpSession(body={'q': 'x'})
+        data = session.data
+        execute_endpoint_with_session(path='http-session-test/plain', session=session)
+        self.assertIs(data, session.data)
+
+    def test_web_filter_reject_does_not_parse_body(self):
+        client = WebServer.app.test_client()
+        WebServer.web_filters.append(deny_filter)
+        try:
+            response = client.post('/http-session-test/plain?name=sauron', json={'q': 'x'})
+            self.assertEqual(401, response.status_code)
+            # Filter read a query parameter, body was not parsed
+            self.assertEqual([True], loads)
+            response = client.post('/http-session-test/plain?name=frodo', json={'q': 'x'})
+            self.assertEqual({'q': 'x'}, response.json)
+        finally:
+            WebServer.web_filters.remove(deny_filter)
+
+
+if __name__ == '__main__':
+    unittest.main()
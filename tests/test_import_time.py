@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import unittest
+import statistics
+import subprocess
+
+# Modules that AWS Lambda handlers should not pay for on cold start
+HEAVY_MODULES = ['flask', 'werkzeug', 'cerberus', 'pkg_resources', 'psutil', 'schedule', 'asyncio', 'cachetools']
+IMPORT_BUDGET_MS = float(os.getenv('QUICKBE_IMPORT_BUDGET_MS', 200))
+
+
+def run_python(code: str) -> str:
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+
+def loaded_heavy_modules(code: str) -> list:
+    output = run_python(
+        f'{code}\nimport sys, json\nprint(json.dumps([m for m in {HEAVY_MODULES} if m in sys.modules]))'
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_import_skips_heavy_modules(self):
+        self.assertEqual([], loaded_heavy_modules('import quickbe'))
+
+    def test_lambda_request_skips_heavy_modules(self):
+        code = '\n'.join([
+            'from quickbe import endpoint, HttpSession, aws_lambda_handler',
+            '@endpoint(path="import-test", validation={"name": {"type": "string", "required": True}})',
+            'def import_test(session: HttpSession):',
+            '    return {"hello": session.get("name")}',
+            'response = aws_lambda_handler(event={"path": "import-test", "body": "{\\"name\\": \\"lambda\\"}"})',
+            'assert response["statusCode"] == 200, response',
+        ])
+        self.assertEqual([], loaded_heavy_modules(code))
+
+    def test_lazy_attributes(self):
+        self.assertIn('flask', loaded_heavy_modules('from quickbe import WebServer'))
+        self.assertIn('cerberus', loaded_heavy_modules('from quickbe import EndPointValidator'))
+        import quickbe
+        with self.assertRaises(AttributeError):
+            getattr(quickbe, 'no_such_attribute')
+
+    def test_import_time_budget(self):
+        code = 'import time\nstart = time.perf_counter()\nimport quickbe\nprint(time.perf_counter() - start)'
+        samples = [float(run_python(code).strip().splitlines()[-1]) * 1000 for _ in range(5)]
+        self.assertLess(statistics.median(samples), IMPORT_BUDGET_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import time
+import schedule
+import tempfile
+import unittest
+import multiprocessing
+from datetime import timedelta
+from quickbe.leases import FileLeaseBackend, SqliteLeaseBackend
+from quickbe.utils import get_schedule_job, ScheduledJobs, lease_name, RUN_EVERYWHERE_TAG
+
+
+def do_nothing(arg: str = None):
+    pass
+
+
+def record_run(path: str):
+    with open(path, 'a') as f:
+        f.write(f'{os.getpid()}\n')
+
+
+def run_instance(lease_backend, runs_path: str, seconds: float):
+    # Forked instance, jobs of other tests are not part of it
+    schedule.clear()
+    get_schedule_job(scd_str='every 300 milliseconds').do(record_run, runs_path)
+    t = ScheduledJobs(lease_backend=lease_backend)
+    t.start()
+    time.sleep(seconds)
+    t.terminate()
+    t.join()
+
+
+def acquire_once(lease_backend, results):
+    results.put(lease_backend.acquire(name='one-winner', ttl=60))
+
+
+class LeaseBackendsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backends = [
+            FileLeaseBackend(directory=os.path.join(self.directory.name, 'leases')),
+            SqliteLeaseBackend(path=os.path.join(self.directory.name, 'leases.db')),
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_acquire_and_expire(self):
+        for backend in self.backends:
+            self.assertTrue(backend.acquire(name='job-a', ttl=0.2))
+            self.assertFalse(backend.acquire(name='job-a', ttl=0.2))
+            self.assertTrue(backend.acquire(name='job-b', ttl=0.2))
+            time.sleep(0.25)
+            self.assertTrue(backend.acquire(name='job-a', ttl=0.2))
+
+    def test_release(self):
+        for backend in self.backends:
+            self.assertTrue(backend.acquire(name='job-c', ttl=60))
+            backend.release(name='job-c')
+            self.assertTrue(backend.acquire(name='job-c', ttl=60))
+
+    def test_one_winner_across_processes(self):
+        context = multiprocessing.get_context('fork')
+        for backend in self.backends:
+            results = context.Queue()
+            processes = [context.Process(target=acquire_once, args=(backend, results)) for _ in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(timeout=10)
+            self.assertEqual([False, False, False, True], sorted(results.get(timeout=5) for _ in processes))
+
+    def test_runs_once_across_instances(self):
+        context = multiprocessing.get_context('fork')
+        for backend in self.backends:
+            runs_path = os.path.join(self.directory.name, f'{backend.__class__.__name__}.runs')
+            processes = [
+                context.Process(target=run_instance, args=(backend, runs_path, 1.3)) for _ in range(3)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(timeout=10)
+            with open(runs_path) as f:
+                runs = f.read().split()
+            # Every instance alone would run 4 times
+            self.assertGreaterEqual(len(runs), 3)
+            self.assertLessEqual(len(runs), 5)
+
+
+class ScheduledJobsLeaseTestCase(unittest.TestCase):
+
+    def test_lease_name(self):
+        scd_job = get_schedule_job(scd_str='every 10 minutes').do(do_nothing, 'a')
+        named_job = get_schedule_job(scd_str='every 10 minutes').tag('lease:nightly').do(do_nothing)
+        try:
+            self.assertEqual(f"{__name__}.do_nothing('a',)", lease_name(job=scd_job))
+            self.assertEqual('nightly', lease_name(job=named_job))
+        finally:
+            schedule.cancel_job(scd_job)
+            schedule.cancel_job(named_job)
+
+    def test_jitter_for_jobs_that_run_everywhere(self):
+        leased_job = get_schedule_job(scd_str='every 10 minutes').do(do_nothing)
+        everywhere_job = get_schedule_job(scd_str='every 10 minutes').tag(RUN_EVERYWHERE_TAG).do(do_nothing)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                t = ScheduledJobs(lease_backend=FileLeaseBackend(directory=directory), jitter=0.5)
+                run_at, _, _, next_run = t._entry(job=leased_job)
+                self.assertEqual(run_at, next_run)
+                delays = {t._entry(job=everywhere_job)[0] - everywhere_job.next_run for _ in range(20)}
+                self.assertGreater(len(delays), 1)
+                for delay in delays:
+                    self.assertTrue(timedelta(0) <= delay <= timedelta(seconds=0.5))
+        finally:
+            schedule.cancel_job(leased_job)
+            schedule.cancel_job(everywhere_job)
+
+    def test_skipped_run_is_rescheduled(self):
+        runs = []
+        scd_job = get_schedule_job(scd_str='every 10 minutes').do(runs.append, 1)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                backend = FileLeaseBackend(directory=directory)
+                self.assertTrue(backend.acquire(name=lease_name(job=scd_job), ttl=60))
+                t = ScheduledJobs(lease_backend=backend)
+                next_run = scd_job.next_run
+                t._run_job(job=scd_job)
+                self.assertEqual([], runs)
+                self.assertGreater(scd_job.next_run, next_run)
+        finally:
+            schedule.cancel_job(scd_job)
+
+
+if __name__ == '__main__':
+    unittest.main()
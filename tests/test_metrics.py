@@ -0,0 +1,104 @@
+import unittest
+from threading import Thread
+from quickbe import endpoint, HttpSession, execute_endpoint, WebServer
+from quickbe.metrics import Histogram, EndpointsMetrics, ENDPOINTS_METRICS, UNMATCHED_ENDPOINT
+
+
+@endpoint(path='metrics-test/echo', validation={'status': {'type': 'integer', 'default': 200}})
+def metrics_echo(session: HttpSession):
+    session.set_status(session.get('status'))
+    return 'OK'
+
+
+@endpoint(path='metrics-test/fail')
+def metrics_fail(session: HttpSession):
+    raise ValueError('Just for testing')
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.record(0.001)
+        for _ in range(10):
+            histogram.record(0.5)
+        self.assertEqual(100, histogram.count)
+        self.assertAlmostEqual(0.001, histogram.percentile(50), delta=0.00025)
+        self.assertAlmostEqual(0.001, histogram.percentile(90), delta=0.00025)
+        self.assertAlmostEqual(0.5, histogram.percentile(99), delta=0.125)
+        self.assertEqual(0, Histogram().percentile(50))
+        histogram.record(1000)
+        # Values over all bounds report the largest value, not infinity
+        self.assertEqual(1000, histogram.percentile(100))
+
+    def test_threads_do_not_lose_counts(self):
+        metrics = EndpointsMetrics()
+
+        def worker():
+            for _ in range(1000):
+                with metrics.measure(endpoint='e') as measurement:
+                    measurement.status = 201
+
+        threads = [Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = metrics.snapshot().get('e')
+        self.assertEqual(8000, snapshot.get('requests'))
+        self.assertEqual({'201': 8000}, snapshot.get('statuses'))
+        self.assertEqual(0, snapshot.get('in_flight'))
+
+    def test_ended_threads_shards_are_merged(self):
+        metrics = EndpointsMetrics()
+
+        def worker():
+            metrics.record(endpoint='e', status=200, seconds=0.01)
+
+        for _ in range(200):
+            thread = Thread(target=worker)
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(metrics._shards), 1)
+        self.assertEqual(200, metrics.snapshot().get('e').get('requests'))
+        self.assertEqual(0, len(metrics._shards))
+
+    def test_endpoint_metrics(self):
+        before = ENDPOINTS_METRICS.snapshot().get('metrics-test/echo', {}).get('statuses', {})
+        execute_endpoint(path='metrics-test/echo', headers={}, body={}, parameters={})
+        execute_endpoint(path='metrics-test/echo', headers={}, body={'status': 503}, parameters={})
+        execute_endpoint(path='metrics-test/echo', headers={}, body={'status': 'x'}, parameters={})
+        with self.assertRaises(ValueError):
+            execute_endpoint(path='metrics-test/fail', headers={}, body={}, parameters={})
+        with self.assertRaises(NotImplementedError):
+            execute_endpoint(path='metrics-test/nothing-here', headers={}, body={}, parameters={})
+
+        snapshot = ENDPOINTS_METRICS.snapshot()
+        statuses = snapshot.get('metrics-test/echo').get('statuses')
+        for status in ['200', '400', '503']:
+            self.assertEqual(before.get(status, 0) + 1, statuses.get(status))
+        self.assertGreaterEqual(snapshot.get('metrics-test/fail').get('errors'), 1)
+        self.assertGreaterEqual(snapshot.get(UNMATCHED_ENDPOINT).get('statuses').get('404'), 1)
+
+    def test_status_and_prometheus_endpoints(self):
+        client = WebServer.app.test_client()
+        client.get('/metrics-test/echo')
+
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-status')
+        self.assertEqual(200, response.status_code)
+        self.assertIn('metrics-test/echo', response.json.get('endpoints'))
+
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE quickbe_endpoint_duration_seconds histogram', text)
+        self.assertIn('quickbe_endpoint_duration_seconds_bucket{endpoint="metrics-test/echo",le="+Inf"}', text)
+        self.assertIn('quickbe_endpoint_requests_total{endpoint="metrics-test/echo",status="200"}', text)
+
+        self.assertEqual(401, client.get('/wrong-key/quickbe-server-metrics').status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+import unittest
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from quickbe import endpoint, HttpSession, WebServer
+from quickbe import oauth
+from quickbe.oauth import TokenVerifier, SigningKeys, InvalidToken
+
+AUDIENCE = 'test-client-id'
+ISSUER = 'https://accounts.google.com'
+
+
+class KeysHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the issuer keys endpoint, serves HMAC secrets by key id
+    """
+    keys = {'k1': 'secret-1'}
+    max_age = 3600
+    requests = 0
+
+    def do_GET(self):
+        KeysHandler.requests += 1
+        body = json.dumps(KeysHandler.keys).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', f'public, max-age={KeysHandler.max_age}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def make_token(kid: str = 'k1', secret: str = 'secret-1', **claims) -> str:
+    payload = {'iss': ISSUER, 'aud': AUDIENCE, 'sub': 'user-1', 'exp': time.time() + 600}
+    payload.update(claims)
+    signing_input = f'{_b64(json.dumps({"alg": "HS256", "kid": kid}).encode())}.{_b64(json.dumps(payload).encode())}'
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f'{signing_input}.{_b64(signature)}'
+
+
+decodes = []
+
+
+def hmac_decode(token: str, keys: dict) -> dict:
+    decodes.append(token)
+    header, payload, signature = token.split('.')
+    kid = json.loads(base64.urlsafe_b64decode(header + '=' * (-len(header) % 4)))['kid']
+    expected = hmac.new(keys[kid].encode(), f'{header}.{payload}'.encode(), hashlib.sha256).digest()
+    if _b64(expected) != signature:
+        raise ValueError('Bad signature')
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+
+@endpoint(path='oauth-test/me')
+def me(session: HttpSession):
+    return {'user_id': session.user_id}
+
+
+class OAuthTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), KeysHandler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/certs'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        KeysHandler.keys = {'k1': 'secret-1'}
+        KeysHandler.max_age = 3600
+        KeysHandler.requests = 0
+        decodes.clear()
+        # Fresh process wide keys for every test
+        oauth._signing_keys.pop(self.url, None)
+        self.verifier = TokenVerifier(audience=AUDIENCE, certs_url=self.url, decode=hmac_decode)
+
+    def tearDown(self):
+        self.verifier.signing_keys.stop()
+
+    def test_verify_and_cache(self):
+        token = make_token()
+        self.assertEqual('user-1', self.verifier.verify(token)['sub'])
+        self.assertEqual('user-1', self.verifier.verify(token)['sub'])
+        self.assertEqual(1, len(decodes))
+        self.assertEqual(1, KeysHandler.requests)
+
+    def test_keys_are_shared(self):
+        other = TokenVerifier(audience=AUDIENCE, certs_url=self.url, decode=hmac_decode)
+        self.assertIs(self.verifier.signing_keys, other.signing_keys)
+        self.verifier.verify(make_token())
+        other.verify(make_token(sub='user-2'))
+        self.assertEqual(1, KeysHandler.requests)
+
+    def test_invalid_tokens(self):
+        invalid_tokens = [
+            None,
+            'not-a-jwt',
+            make_token(secret='wrong'),
+            make_token(exp=time.time() - 60),
+            make_token(aud='other-client'),
+            make_token(iss='https://evil.example.com'),
+        ]
+        for token in invalid_tokens:
+            with self.assertRaises(InvalidToken):
+                self.verifier.verify(token)
+
+    def test_audience_is_required(self):
+        for audience in [None, '', []]:
+            with self.assertRaises(ValueError):
+                TokenVerifier(audience=audience, certs_url=self.url, decode=hmac_decode)
+        verifier = TokenVerifier(audience=['client-a', AUDIENCE], certs_url=self.url, decode=hmac_decode)
+        self.assertEqual('user-1', verifier.verify(make_token())['sub'])
+        with self.assertRaises(InvalidToken):
+            verifier.verify(make_token(aud='foreign-client'))
+        with self.assertRaises(InvalidToken):
+            verifier.verify(make_token(aud=None))
+
+    def test_default_decode_needs_pem_certificates(self):
+        jwk = {'kty': 'RSA', 'kid': 'k1', 'n': 'AQAB', 'e': 'AQAB'}
+        with self.assertRaises(ValueError):
+            oauth.google_auth_decode(token='a.b.c', certs={'k1': jwk})
+
+    def test_cache_expires_with_token(self):
+        token = make_token(exp=time.time() - self.verifier.clock_skew + 0.3)
+        self.verifier.verify(token)
+        self.verifier.verify(token)
+        self.assertEqual(1, len(decodes))
+        time.sleep(0.4)
+        with self.assertRaises(InvalidToken):
+            self.verifier.verify(token)
+
+    def test_cache_is_bounded(self):
+        verifier = TokenVerifier(audience=AUDIENCE, certs_url=self.url, decode=hmac_decode, max_entries=3)
+        for i in range(10):
+            verifier.verify(make_token(sub=f'user-{i}'))
+        self.assertEqual(3, len(verifier._verified))
+
+    def test_unknown_key_refreshes_keys(self):
+        self.verifier.verify(make_token())
+        KeysHandler.keys = {'k1': 'secret-1', 'k2': 'secret-2'}
+        self.verifier.signing_keys._last_fetch = 0
+        self.assertEqual('user-1', self.verifier.verify(make_token(kid='k2', secret='secret-2'))['sub'])
+        self.assertEqual(2, KeysHandler.requests)
+
+    def test_background_refresh(self):
+        KeysHandler.max_age = 1
+        keys = SigningKeys(url=self.url)
+        try:
+            keys.get()
+            time.sleep(1.5)
+            self.assertGreaterEqual(KeysHandler.requests, 2)
+        finally:
+            keys.stop()
+
+    def test_web_filter(self):
+        client = WebServer.app.test_client()
+        web_filter = self.verifier.web_filter(token_parameter='token')
+        WebServer.add_filter(web_filter, paths=['oauth-test'])
+        try:
+            response = client.get('/oauth-test/me')
+            self.assertEqual(401, response.status_code)
+            self.assertEqual('Bearer', response.headers.get('WWW-Authenticate'))
+            response = client.get('/oauth-test/me', headers={'Authorization': f'Bearer {make_token()}'})
+            self.assertEqual({'user_id': 'user-1'}, response.json)
+            response = client.get(f'/oauth-test/me?token={make_token(sub="user-3")}')
+            self.assertEqual({'user_id': 'user-3'}, response.json)
+        finally:
+            WebServer.web_filters.remove(web_filter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import unittest
+import subprocess
+import urllib.request
+
+ACCESS_KEY = 'prefork-test-key'
+APP_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'prefork_app.py')
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            result = condition()
+            if result:
+                return result
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError('Condition was not met in time.')
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'Pre-fork server requires os.fork')
+class PreforkTestCase(unittest.TestCase):
+
+    def start_server(self, max_requests: int = 0):
+        self.port = free_port()
+        env = dict(os.environ, QUICKBE_WEB_SERVER_ACCESS_KEY=ACCESS_KEY, PYTHONPATH=ROOT_DIR)
+        self.process = subprocess.Popen(
+            [sys.executable, APP_PATH, str(self.port), str(max_requests)], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.addCleanup(self.stop_server)
+        wait_for(lambda: len(self.serving_workers()) == 2)
+
+    def stop_server(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def get(self, path: str) -> dict:
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/{path}', timeout=5) as response:
+            return json.loads(response.read())
+
+    def serving_workers(self) -> list:
+        status = self.get(f'{ACCESS_KEY}/quickbe-server-status')
+        return [worker for worker in status['workers'] if worker['status'] == 'serving']
+
+    def test_workers_reload_and_stop(self):
+        self.start_server()
+        workers = self.serving_workers()
+        worker_pids = {worker['pid'] for worker in workers}
+        self.assertEqual([0, 0], [worker['generation'] for worker in workers])
+        self.assertNotIn(self.process.pid, worker_pids)
+
+        pids = {self.get('prefork-test/pid')['pid'] for _ in range(10)}
+        self.assertTrue(pids.issubset(worker_pids))
+
+        self.process.send_signal(signal.SIGHUP)
+        new_workers = wait_for(
+            lambda: [w for w in self.serving_workers() if w['generation'] == 1] if all(
+                w['generation'] == 1 for w in self.serving_workers()
+            ) else None
+        )
+        self.assertEqual(2, len(new_workers))
+        self.assertFalse(worker_pids & {worker['pid'] for worker in new_workers})
+
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(0, self.process.wait(timeout=10))
+
+    def test_recycle_after_max_requests(self):
+        self.start_server(max_requests=5)
+        pids = set()
+        for _ in range(40):
+            pids.add(wait_for(lambda: self.get('prefork-test/pid'))['pid'])
+        self.assertGreater(len(pids), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import time
+import unittest
+from threading import Thread, Event
+from quickbe import WebServer
+from quickbe.profiler import sample_stacks, collapsed_stacks, speedscope_profile
+
+stop = Event()
+
+
+def busy_loop():
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.thread = Thread(target=busy_loop, name='profiler-test-busy', daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        stop.set()
+        cls.thread.join()
+
+    def test_sample_stacks(self):
+        stacks, samples = sample_stacks(seconds=0.2, interval=0.01)
+        self.assertGreaterEqual(samples, 10)
+        busy = [stack for stack in stacks if stack[0] == 'profiler-test-busy']
+        self.assertTrue(busy)
+        self.assertTrue(any('busy_loop (test_profiler.py:10)' in stack for stack in busy))
+        lines = collapsed_stacks(stacks=stacks).splitlines()
+        self.assertTrue(any(line.startswith('profiler-test-busy;') for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    def test_speedscope(self):
+        stacks, _ = sample_stacks(seconds=0.1, interval=0.01)
+        profile = speedscope_profile(stacks=stacks, interval=0.01)
+        frames = profile['shared']['frames']
+        thread_profile = next(item for item in profile['profiles'] if item['name'] == 'profiler-test-busy')
+        self.assertEqual(len(thread_profile['samples']), len(thread_profile['weights']))
+        self.assertAlmostEqual(sum(thread_profile['weights']), thread_profile['endValue'])
+        self.assertTrue(all(0 <= index < len(frames) for sample in thread_profile['samples'] for index in sample))
+
+    def test_endpoint(self):
+        client = WebServer.app.test_client()
+        self.assertEqual(401, client.get('/wrong-key/quickbe-server-profile').status_code)
+        start = time.perf_counter()
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?seconds=0.2&interval_ms=10')
+        self.assertGreaterEqual(time.perf_counter() - start, 0.15)
+        self.assertEqual(200, response.status_code)
+        self.assertIn('profiler-test-busy;', response.get_data(as_text=True))
+
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?seconds=0.1&format=speedscope')
+        self.assertEqual('quickbe', response.json['exporter'])
+        self.assertEqual(
+            400, client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?format=pprof').status_code
+        )
+
+    def test_values_that_are_not_finite(self):
+        client = WebServer.app.test_client()
+        for query in ['seconds=nan', 'seconds=inf', 'interval_ms=nan', 'interval_ms=-inf']:
+            response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?{query}')
+            self.assertEqual(400, response.status_code, query)
+        start = time.perf_counter()
+        _, samples = sample_stacks(seconds=float('nan'), interval=float('nan'))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(1, samples)
+        # Profiler is free again
+        self.assertEqual(200, client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?seconds=0.05').status_code)
+
+    def test_one_profile_at_a_time(self):
+        client = WebServer.app.test_client()
+        thread = Thread(target=sample_stacks, kwargs={'seconds': 0.3})
+        thread.start()
+        time.sleep(0.05)
+        response = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-profile?seconds=0.1')
+        thread.join()
+        self.assertEqual(409, response.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+from unittest import mock
+from quickbe.router import Router
+from quickbe.endpoints import WEB_SERVER_ROUTER
+from quickbe import endpoint, execute_endpoint, HttpSession, aws_lambda_handler, WebServer
+
+
+@endpoint(path='router-test/users/<int:user_id>/orders', validation={
+    'user_id': {'type': 'integer', 'required': True, 'min': 1},
+    'status': {'type': 'string', 'default': 'open'}
+})
+def user_orders(session: HttpSession):
+    return {'user_id': session.get('user_id'), 'status': session.get('status')}
+
+
+@endpoint(path='router-test/files/<path:file_path>')
+def get_file(session: HttpSession):
+    return session.get('file_path')
+
+
+@endpoint(path='router-test/limited/<int:item_id>', rate_limit=1000)
+def limited_item(session: HttpSession):
+    return {'item_id': session.get('item_id')}
+
+
+@endpoint(path='router-test/upload', stream_body=True)
+def upload(session: HttpSession):
+    return {'count': len(list(session.records()))}
+
+
+class RouterTestCase(unittest.TestCase):
+
+    def test_static_and_dynamic(self):
+        router = Router()
+        router.add('users', 'list')
+        router.add('users/<user_id>', 'get')
+        router.add('users/<int:user_id>/orders', 'orders')
+        router.add('users/me', 'me')
+
+        self.assertEqual(('list', {}), (router.match('users')[0].value, router.match('users')[1]))
+        route, params = router.match('/users/abc')
+        self.assertEqual('get', route.value)
+        self.assertEqual({'user_id': 'abc'}, params)
+
+        route, params = router.match('users/me')
+        self.assertEqual('me', route.value)
+
+        route, params = router.match('users/42/orders')
+        self.assertEqual('orders', route.value)
+        self.assertEqual({'user_id': 42}, params)
+
+        self.assertEqual((None, None), router.match('users/abc/orders'))
+        self.assertEqual((None, None), router.match('users/42/orders/1'))
+        self.assertEqual(4, len(router))
+
+    def test_converter_priority(self):
+        router = Router()
+        router.add('items/<name>', 'by-name')
+        router.add('items/<int:item_id>', 'by-id')
+        router.add('items/<uuid:item_uuid>', 'by-uuid')
+        self.assertEqual('by-id', router.match('items/7')[0].value)
+        self.assertEqual('by-name', router.match('items/seven')[0].value)
+        route, params = router.match('items/9B4FDC4B-7B0B-4C3A-9A39-5A2E6F2E0C51')
+        self.assertEqual('by-uuid', route.value)
+        self.assertEqual('9b4fdc4b-7b0b-4c3a-9a39-5a2e6f2e0c51', params.get('item_uuid'))
+
+    def test_backtracking(self):
+        router = Router()
+        router.add('a/b/c', 'static')
+        router.add('a/<x>/d', 'dynamic')
+        route, params = router.match('a/b/d')
+        self.assertEqual('dynamic', route.value)
+        self.assertEqual({'x': 'b'}, params)
+
+    def test_path_converter(self):
+        router = Router()
+        router.add('static/<path:file_path>', 'files')
+        route, params = router.match('static/css/site/main.css')
+        self.assertEqual('files', route.value)
+        self.assertEqual({'file_path': 'css/site/main.css'}, params)
+        self.assertEqual((None, None), router.match('static/'))
+        with self.assertRaises(ValueError):
+            router.add('<path:p>/tail', 'bad')
+
+    def test_invalid_definitions(self):
+        router = Router()
+        router.add('users/<user_id>', 'get')
+        with self.assertRaises(FileExistsError):
+            router.add('users/<name>', 'get-by-name')
+        with self.assertRaises(ValueError):
+            router.add('users/<nope:user_id>/x', 'bad')
+        with self.assertRaises(ValueError):
+            router.add('x/<a>/<a>', 'bad')
+        with self.assertRaises(ValueError):
+            router.add('x/<a b>', 'bad')
+
+    def test_endpoint_with_path_parameters(self):
+        body, headers, status = execute_endpoint(
+            path='router-test/users/17/orders', headers={}, body={}, parameters={}
+        )
+        self.assertEqual(200, status)
+        self.assertEqual({'user_id': 17, 'status': 'open'}, body)
+
+    def test_path_parameters_are_validated(self):
+        body, headers, status = execute_endpoint(
+            path='router-test/users/0/orders', headers={}, body={}, parameters={}
+        )
+        self.assertEqual(400, status)
+        self.assertIn('user_id', body)
+
+    def test_path_parameters_override_body(self):
+        body, headers, status = execute_endpoint(
+            path='/router-test/users/5/orders', headers={}, body={'user_id': 6}, parameters={}
+        )
+        self.assertEqual(5, body.get('user_id'))
+
+    def test_not_found(self):
+        with self.assertRaises(NotImplementedError):
+            execute_endpoint(path='router-test/users/x/orders', headers={}, body={}, parameters={})
+
+    def test_lambda_event(self):
+        result = aws_lambda_handler(event={'path': '/router-test/files/a/b.txt', 'body': None})
+        self.assertEqual(200, result.get('statusCode'))
+        self.assertEqual('"a/b.txt"', result.get('body'))
+
+    def test_path_is_matched_once_per_request(self):
+        client = WebServer.app.test_client()
+        with mock.patch.object(WEB_SERVER_ROUTER, 'match', wraps=WEB_SERVER_ROUTER.match) as match:
+            self.assertEqual({'item_id': 7}, client.get('/router-test/limited/7').json)
+            self.assertEqual(1, match.call_count)
+            match.reset_mock()
+            self.assertEqual({'count': 2}, client.post('/router-test/upload', data='{"a": 1}\n{"a": 2}').json)
+            self.assertEqual(1, match.call_count)
+            match.reset_mock()
+            client.post('/quickbe-batch', json=[{'path': 'router-test/limited/1'}, {'path': 'router-test/limited/2'}])
+            self.assertEqual(2, match.call_count)
+            match.reset_mock()
+            aws_lambda_handler(event={'path': '/router-test/limited/3', 'body': None})
+            self.assertEqual(1, match.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
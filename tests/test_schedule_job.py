@@ -1,6 +1,7 @@
 import time
 import schedule
 import unittest
+from datetime import timedelta
 from quickbelog import Log
 from quickbe.utils import get_schedule_job, ScheduledJobs
 
@@ -47,6 +48,47 @@ class ScheduleJobTestCase(unittest.TestCase):
         Log.debug(f'Jobs: {schedule.jobs}')
         self.assertEqual(True, True)
 
+    def test_sub_second_definitions(self):
+        for scd_str, period in [
+            ('every 0.5 seconds', timedelta(milliseconds=500)),
+            ('every 250 milliseconds', timedelta(milliseconds=250)),
+            ('every 3 seconds', timedelta(seconds=3)),
+        ]:
+            scd_job = get_schedule_job(scd_str=scd_str).do(do_something, scd_str)
+            try:
+                self.assertEqual(period, scd_job.period)
+            finally:
+                schedule.cancel_job(scd_job)
+
+    def test_wakes_on_register_and_cancel(self):
+        runs = []
+        t = ScheduledJobs()
+        t.start()
+        try:
+            time.sleep(0.1)
+            registered = time.perf_counter()
+            scd_job = get_schedule_job(scd_str='every 100 milliseconds').do(lambda: runs.append(time.perf_counter()))
+            time.sleep(0.55)
+            schedule.cancel_job(scd_job)
+            count = len(runs)
+            time.sleep(0.3)
+        finally:
+            t.terminate()
+            t.join(timeout=2)
+        self.assertGreaterEqual(count, 4)
+        self.assertLess(runs[0] - registered, 0.2)
+        self.assertEqual(count, len(runs))
+        self.assertFalse(t.is_alive())
+
+    def test_sleeps_until_next_job(self):
+        t = ScheduledJobs()
+        scd_job = get_schedule_job(scd_str='every 10 minutes').do(do_something, 'later')
+        try:
+            self.assertGreater(t._sleep_time(heap=[(scd_job.next_run, 0, scd_job)]), 590)
+            self.assertIsNone(t._sleep_time(heap=[]))
+        finally:
+            schedule.cancel_job(scd_job)
+
 
 if __name__ == '__main__':
     unittest.main()
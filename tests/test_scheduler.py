@@ -0,0 +1,132 @@
+import json
+import time
+import unittest
+from threading import Event
+from quickbe import WebServer
+from quickbe.scheduler import ScheduledJob, schedule_job, SCHEDULED_JOBS
+
+
+def slow_job(seconds: float, calls: list):
+    calls.append(time.perf_counter())
+    time.sleep(seconds)
+
+
+def failing_job():
+    raise RuntimeError('Something went wrong')
+
+
+def add_numbers(a: int, b: int) -> int:
+    return a + b
+
+
+def wait_for(predicate, timeout: float = 5):
+    deadline = time.perf_counter() + timeout
+    while not predicate() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class ScheduledJobTestCase(unittest.TestCase):
+
+    def test_dispatch_does_not_block(self):
+        calls = []
+        job = ScheduledJob(slow_job, args=(0.3, calls), overlap='allow', max_concurrency=2)
+        start = time.perf_counter()
+        job()
+        job()
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertTrue(wait_for(lambda: job.runs == 2))
+        self.assertEqual(2, len(calls))
+        self.assertEqual(2, job.status()['duration']['count'])
+        self.assertGreaterEqual(job.status()['duration']['mean_seconds'], 0.29)
+
+    def test_overlap_skip(self):
+        calls = []
+        job = ScheduledJob(slow_job, args=(0.2, calls))
+        for _ in range(3):
+            job()
+        self.assertTrue(wait_for(lambda: job.runs == 1 and job.running == 0))
+        self.assertEqual(1, len(calls))
+        self.assertEqual(2, job.skipped)
+
+    def test_overlap_queue(self):
+        calls = []
+        job = ScheduledJob(slow_job, args=(0.1, calls), overlap='queue', max_queue=1)
+        for _ in range(3):
+            job()
+        self.assertTrue(wait_for(lambda: job.runs == 2 and job.running == 0))
+        self.assertEqual(1, job.skipped)
+        # Queued run starts after the first one ends
+        self.assertGreaterEqual(calls[1] - calls[0], 0.1)
+
+    def test_overlap_allow_max_concurrency(self):
+        calls = []
+        job = ScheduledJob(slow_job, args=(0.2, calls), overlap='allow', max_concurrency=2)
+        for _ in range(3):
+            job()
+        self.assertTrue(wait_for(lambda: job.runs == 2 and job.running == 0))
+        self.assertEqual(1, job.skipped)
+
+    def test_failure(self):
+        job = ScheduledJob(failing_job)
+        job()
+        self.assertTrue(wait_for(lambda: job.runs == 1))
+        status = job.status()
+        self.assertEqual(1, status['failures'])
+        self.assertIsNone(status['last_success'])
+        self.assertIsNotNone(status['last_failure'])
+        self.assertEqual('RuntimeError: Something went wrong', status['last_error'])
+
+    def test_timeout(self):
+        job = ScheduledJob(slow_job, args=(0.3, []), timeout=0.1)
+        job()
+        self.assertTrue(wait_for(lambda: job.timeouts == 1))
+        self.assertEqual(0, job.runs)
+        self.assertTrue(wait_for(lambda: job.runs == 1))
+        self.assertEqual(1, job.failures)
+        self.assertIn('TimeoutError', job.status()['last_error'])
+
+    def test_process_executor(self):
+        job = ScheduledJob(add_numbers, args=(1, 2), executor='process')
+        job()
+        self.assertTrue(wait_for(lambda: job.runs == 1, timeout=20))
+        self.assertEqual(0, job.failures)
+        self.assertIsNotNone(job.last_success)
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            ScheduledJob(add_numbers, executor='fiber')
+        with self.assertRaises(ValueError):
+            ScheduledJob(add_numbers, overlap='maybe')
+
+    def test_long_job_durations(self):
+        job = ScheduledJob(add_numbers)
+        for seconds in [120] * 5 + [3600] * 4 + [10 ** 6]:
+            job.durations.record(seconds)
+        summary = job.durations.summary()
+        self.assertAlmostEqual(120, summary['p50_seconds'], delta=30)
+        self.assertAlmostEqual(3600, summary['p90_seconds'], delta=900)
+        self.assertEqual(10 ** 6, summary['p99_seconds'])
+        json.dumps(summary, allow_nan=False)
+
+    def test_schedule_and_status(self):
+        import schedule
+        done = Event()
+        job = schedule_job('every 1 seconds', done.set, name='scheduler-test-job')
+        try:
+            self.assertIs(job, SCHEDULED_JOBS['scheduler-test-job'])
+            with self.assertRaises(FileExistsError):
+                schedule_job('every 1 seconds', done.set, name='scheduler-test-job')
+            schedule.run_all()
+            self.assertTrue(done.wait(5))
+            self.assertTrue(wait_for(lambda: job.runs == 1))
+            client = WebServer.app.test_client()
+            status = client.get(f'/{WebServer.ACCESS_KEY}/quickbe-server-status').json
+            self.assertEqual(1, status['jobs']['scheduler-test-job']['runs'])
+        finally:
+            schedule.cancel_job(next(item for item in schedule.jobs if item.job_func.func is job))
+            SCHEDULED_JOBS.pop('scheduler-test-job', None)
+
+
+if __name__ == '__main__':
+    unittest.main()
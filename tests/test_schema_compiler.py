@@ -0,0 +1,227 @@
+import copy
+import random
+import unittest
+import warnings
+from datetime import date, datetime
+from quickbe import EndPointValidator, endpoint, execute_endpoint, HttpSession
+from cerberus import SchemaError
+from quickbe.schema import compile_schema, SchemaNotCompilable
+
+ECHO_SCHEMA = {
+    'text': {'required': True, 'type': 'string', 'doc': 'Some text to echo', 'example': 'Hello world'},
+    'name': {'required': False, 'type': 'string', 'doc': 'Name, just for testing', 'example': 'John Doe'},
+    'age': {'required': False, 'type': 'integer', 'doc': 'Persons age', 'example': 42},
+    'other_info': {
+        'doc': 'Other info for this person',
+        'type': 'dict',
+        'allow_unknown': False,
+        'required': True,
+        'schema': {
+            'address': {'type': 'string', 'required': True},
+            'description': {'type': 'string', 'required': True},
+            'zip_code': {'type': 'integer', 'default': -1, 'example': 1234567},
+        }
+    }
+}
+
+SCHEMAS = [
+    ECHO_SCHEMA,
+    {
+        'a': {'type': 'integer', 'min': 1, 'max': 5, 'allowed': [1, 2, 9]},
+        's': {'type': 'string', 'default': 'x', 'empty': False},
+        'n': {'type': 'number', 'nullable': True, 'default': 3},
+        'f': {'type': 'float', 'max': 10.5},
+        'b': {'type': 'boolean', 'default': False},
+        'l': {'type': 'list', 'allowed': ['a', 'b', 1]},
+        'm': {'type': ['string', 'integer'], 'min': 0},
+        'free': {},
+    },
+    {
+        'outer': {
+            'type': 'dict',
+            'default': {},
+            'schema': {
+                'inner': {
+                    'type': 'dict',
+                    'purge_unknown': False,
+                    'allow_unknown': False,
+                    'schema': {'x': {'type': 'integer', 'required': True, 'default': 0}, 'y': {'allowed': ['a', 'b']}}
+                },
+                'keep': {'type': 'dict', 'allow_unknown': True},
+                'purge': {'type': 'dict', 'allow_unknown': False},
+                'e': {'type': 'string', 'empty': True, 'allowed': ['a']},
+            }
+        },
+        'dates': {'type': ['date', 'datetime'], 'nullable': False},
+        'req': {'required': True, 'nullable': True},
+    },
+    {
+        # Nested defaults and purging apply before empty and allowed, as in Cerberus
+        'filled': {'type': 'dict', 'empty': False, 'schema': {'x': {'default': 0}}},
+        'purged': {'type': 'dict', 'empty': False, 'purge_unknown': True, 'schema': {'x': {'type': 'integer'}}},
+        'keys': {'type': 'dict', 'allowed': ['x', 'y'], 'schema': {'y': {'default': 1}, 'x': {'type': 'integer'}}},
+    },
+]
+
+RANDOM_VALUES = [
+    None, True, False, 0, 1, 2, 5, 9, -3, 1.5, 11.0, '', 'a', 'b', 'x', 'text', [], ['a'], ['a', 'c'], [1, 'b'],
+    {}, {'x': 1}, {'x': 'a', 'y': 'a'}, {'x': 3, 'z': 1}, {'address': 'a', 'description': 'd'},
+    {'address': 'a', 'description': 'd', 'zip_code': 'no', 'extra': 1},
+    {'inner': {'x': 1, 'q': 2}, 'keep': {'any': 1}, 'purge': {'gone': 1}, 'e': ''},
+    {'inner': None, 'e': 'b'}, date(2022, 1, 1), datetime(2022, 1, 1, 12), b'bytes',
+]
+
+
+def cerberus_result(schema: dict, document: dict):
+    validator = EndPointValidator.for_endpoint(schema=schema)
+    if not validator.validate(copy.deepcopy(document)):
+        return None, validator.errors
+    return validator.normalized(copy.deepcopy(document)), None
+
+
+PLAUSIBLE_VALUES = {
+    'string': ['a', 'b', '', 'text'],
+    'integer': [0, 1, 2, 5, 9],
+    'float': [1.5, 2, 11.0],
+    'number': [1, 2.5, 10],
+    'boolean': [True, False],
+    'list': [[], ['a'], ['b', 1]],
+}
+
+
+def random_value(rnd: random.Random, rules: dict):
+    type_name = rules.get('type')
+    if rnd.random() < 0.6:
+        if type_name == 'dict':
+            return random_document(rnd=rnd, schema=rules.get('schema', {}))
+        if isinstance(type_name, str) and type_name in PLAUSIBLE_VALUES:
+            return rnd.choice(PLAUSIBLE_VALUES[type_name])
+    return rnd.choice(RANDOM_VALUES)
+
+
+def random_document(rnd: random.Random, schema: dict) -> dict:
+    names = list(schema.keys()) + ['unknown_field']
+    document = {}
+    for name in names:
+        if rnd.random() < 0.8:
+            document[name] = random_value(rnd=rnd, rules=schema.get(name, {}))
+    return document
+
+
+def sort_errors(errors):
+    if isinstance(errors, dict):
+        return {key: sort_errors(value) for key, value in errors.items()}
+    if isinstance(errors, list):
+        return sorted([sort_errors(item) for item in errors], key=str)
+    return errors
+
+
+@endpoint(path='schema-compiler/echo', validation=ECHO_SCHEMA)
+def echo(session: HttpSession):
+    return session.data
+
+
+@endpoint(path='schema-compiler/fallback', validation={
+    'code': {'type': 'string', 'regex': '^[A-Z]{3}$', 'required': True},
+    'count': {'type': 'integer', 'coerce': int, 'default': 1}
+})
+def fallback(session: HttpSession):
+    return session.data
+
+
+class SchemaCompilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        warnings.simplefilter('ignore', UserWarning)
+
+    def assert_same_as_cerberus(self, schema: dict, document: dict):
+        expected_document, expected_errors = cerberus_result(schema=schema, document=document)
+        original = copy.deepcopy(document)
+        compiled = compile_schema(schema=schema)
+        self.assertTrue(compiled.is_compiled)
+        result_document, result_errors = compiled(document)
+        self.assertEqual(original, document, 'Compiled validation must not change the input document')
+        msg = f'Document: {document}'
+        if expected_errors is None:
+            self.assertIsNone(result_errors, msg)
+            self.assertEqual(expected_document, result_document, msg)
+        else:
+            self.assertEqual(sort_errors(expected_errors), sort_errors(result_errors), msg)
+            self.assertEqual(expected_errors, result_errors, msg)
+
+    def test_differential_random_documents(self):
+        rnd = random.Random(1221)
+        for schema in SCHEMAS:
+            for _ in range(600):
+                self.assert_same_as_cerberus(schema=schema, document=random_document(rnd=rnd, schema=schema))
+
+    def test_differential_echo_documents(self):
+        documents = [
+            {},
+            {'text': 'hi', 'other_info': {'address': 'a', 'description': 'b'}},
+            {'text': 'hi', 'age': 4, 'other_info': {'address': 'a', 'description': 'b', 'more': 1}, 'x': 1},
+            {'text': 5, 'age': '4', 'other_info': {'address': None}},
+            {'text': 'hi', 'other_info': 'not a dict'},
+            {'text': None, 'name': None, 'other_info': {'address': 'a', 'description': 'b', 'zip_code': None}},
+        ]
+        for document in documents:
+            self.assert_same_as_cerberus(schema=ECHO_SCHEMA, document=document)
+
+    def test_differential_nested_defaults_before_empty(self):
+        schema = {'info': {'type': 'dict', 'empty': False, 'schema': {'x': {'default': 0}}}}
+        for document in [{'info': {}}, {'info': {'x': 1}}, {'info': {'other': 1}}]:
+            self.assert_same_as_cerberus(schema=schema, document=document)
+
+    def test_unchanged_document_is_not_copied(self):
+        compiled = compile_schema(schema={'name': {'type': 'string'}})
+        document = {'name': 'a', 'other': 1}
+        result, errors = compiled(document)
+        self.assertIsNone(errors)
+        self.assertIs(document, result)
+
+    def test_not_compilable(self):
+        with self.assertRaises(SchemaNotCompilable):
+            compile_schema(schema={'a': {'type': 'string', 'regex': '.*'}})
+        with self.assertRaises(SchemaNotCompilable):
+            compile_schema(schema={'a': {'type': 'list', 'schema': {'type': 'integer'}}})
+        with self.assertRaises(SchemaNotCompilable):
+            compile_schema(schema={'a': {'type': 'decimal'}})
+        with self.assertRaises(SchemaNotCompilable):
+            compile_schema(schema={'a': {'type': 'string', 'required': 'yes'}})
+
+    def test_invalid_schema_fails_on_registration(self):
+        with self.assertRaises(SchemaError):
+            @endpoint(path='schema-compiler/invalid', validation={'a': {'type': 'string', 'required': 'yes'}})
+            def invalid(session: HttpSession):
+                return 'OK'
+
+    def test_endpoint(self):
+        body, _, status = execute_endpoint(
+            path='schema-compiler/echo', headers={}, body={'text': 't'}, parameters={}
+        )
+        self.assertEqual(400, status)
+        self.assertEqual({'other_info': ['required field']}, body)
+
+        body, _, status = execute_endpoint(
+            path='schema-compiler/echo', headers={},
+            body={'text': 't', 'other_info': {'address': 'a', 'description': 'd', 'x': 1}}, parameters={}
+        )
+        self.assertEqual(200, status)
+        self.assertEqual({'text': 't', 'other_info': {'address': 'a', 'description': 'd', 'zip_code': -1}}, body)
+
+    def test_endpoint_with_fallback(self):
+        body, _, status = execute_endpoint(
+            path='schema-compiler/fallback', headers={}, body={'code': 'abc'}, parameters={}
+        )
+        self.assertEqual(400, status)
+        self.assertIn('code', body)
+
+        body, _, status = execute_endpoint(
+            path='schema-compiler/fallback', headers={}, body={'code': 'ABC'}, parameters={'count': '7'}
+        )
+        self.assertEqual(200, status)
+        self.assertEqual({'code': 'ABC', 'count': 7}, body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import uuid
+import base64
+import unittest
+import dataclasses
+from decimal import Decimal
+from datetime import datetime, date
+import quickbe.serializers as sr
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler
+
+ORDER_ID = uuid.UUID('12345678-1234-5678-1234-567812345678')
+
+
+@dataclasses.dataclass
+class Item:
+    name: str
+    price: Decimal
+
+
+def sample() -> dict:
+    return {
+        'id': ORDER_ID,
+        'created': datetime(2022, 7, 25, 6, 18, 54),
+        'day': date(2022, 7, 25),
+        'total': Decimal('10.10'),
+        'items': [Item(name='pen', price=Decimal('1.5'))],
+        'tags': {'new'},
+    }
+
+
+EXPECTED = {
+    'id': str(ORDER_ID),
+    'created': '2022-07-25T06:18:54',
+    'day': '2022-07-25',
+    'total': '10.10',
+    'items': [{'name': 'pen', 'price': '1.5'}],
+    'tags': ['new'],
+}
+
+
+@endpoint(path='serializers-test/order')
+def get_order(session: HttpSession):
+    return sample()
+
+
+@endpoint(path='serializers-test/list')
+def get_list(session: HttpSession):
+    return [1, 2, 3]
+
+
+class SerializersTestCase(unittest.TestCase):
+
+    def test_stdlib_json(self):
+        self.assertEqual(EXPECTED, json.loads(sr._dumps_stdlib(sample())))
+
+    @unittest.skipIf(sr.orjson is None, 'orjson is not installed')
+    def test_fast_json(self):
+        self.assertIs(sr._dumps_orjson, sr.json_dumps)
+        self.assertEqual(EXPECTED, json.loads(sr._dumps_orjson(sample())))
+        self.assertEqual(json.loads(sr._dumps_stdlib({1: 'a'})), json.loads(sr._dumps_orjson({1: 'a'})))
+
+    def test_not_serializable(self):
+        with self.assertRaises(TypeError):
+            sr.json_dumps({'a': object()})
+
+    def test_negotiate(self):
+        self.assertEqual(sr.JSON_MIMETYPE, sr.negotiate(None)[0])
+        self.assertEqual(sr.JSON_MIMETYPE, sr.negotiate('*/*')[0])
+        self.assertEqual(sr.JSON_MIMETYPE, sr.negotiate('text/html, application/json;q=0.9')[0])
+        self.assertEqual(sr.JSON_MIMETYPE, sr.negotiate('image/png')[0])
+
+    def test_negotiate_custom(self):
+        sr.register_serializer(mimetype='text/x-test', func=lambda value: b'test', aliases=['text/x-test-alias'])
+        try:
+            self.assertEqual('text/x-test', sr.negotiate('application/json;q=0.5, text/x-test')[0])
+            self.assertEqual('text/x-test', sr.negotiate('text/x-test-alias')[0])
+            self.assertEqual(sr.JSON_MIMETYPE, sr.negotiate('text/x-test;q=0, application/json;q=0.1')[0])
+            self.assertEqual((b'test', 'text/x-test'), sr.serialize({'a': 1}, accept='text/x-test'))
+        finally:
+            sr.SERIALIZERS.pop('text/x-test')
+            sr.SERIALIZERS_ALIASES.pop('text/x-test-alias')
+
+    @unittest.skipIf(sr.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        payload, mimetype = sr.serialize(sample(), accept='application/x-msgpack')
+        self.assertEqual(sr.MSGPACK_MIMETYPE, mimetype)
+        self.assertEqual(EXPECTED, sr.msgpack.unpackb(payload))
+
+    def test_web_server(self):
+        client = WebServer.app.test_client()
+        response = client.get('/serializers-test/order')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(sr.JSON_MIMETYPE, response.content_type)
+        self.assertEqual(EXPECTED, response.json)
+
+        response = client.get('/serializers-test/list')
+        self.assertEqual([1, 2, 3], response.json)
+
+    def test_lambda(self):
+        result = aws_lambda_handler(event={'path': 'serializers-test/order', 'headers': {'accept': 'application/json'}})
+        self.assertEqual(200, result.get('statusCode'))
+        self.assertEqual(sr.JSON_MIMETYPE, result.get('headers').get('Content-Type'))
+        self.assertFalse(result.get('isBase64Encoded'))
+        self.assertEqual(EXPECTED, json.loads(result.get('body')))
+
+    @unittest.skipIf(sr.msgpack is None, 'msgpack is not installed')
+    def test_lambda_msgpack(self):
+        result = aws_lambda_handler(event={'path': 'serializers-test/list', 'headers': {'Accept': sr.MSGPACK_MIMETYPE}})
+        self.assertTrue(result.get('isBase64Encoded'))
+        self.assertEqual([1, 2, 3], sr.msgpack.unpackb(base64.b64decode(result.get('body'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import json
+import unittest
+from quickbe import endpoint, HttpSession, WebServer
+from quickbe import timing
+from quickbe.aws_lambda import aws_lambda_handler
+from quickbe.timing import ServerTiming
+
+
+def slow_filter(session: HttpSession):
+    time.sleep(0.02)
+
+
+@endpoint(path='server-timing-test/echo', validation={'name': {'type': 'string', 'required': True}})
+def echo(session: HttpSession):
+    time.sleep(0.03)
+    return {'name': session.get('name')}
+
+
+def parse_header(value: str) -> dict:
+    phases = {}
+    for part in value.split(', '):
+        name, _, duration = part.partition(';dur=')
+        phases[name] = float(duration)
+    return phases
+
+
+class ServerTimingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        timing.SERVER_TIMING = True
+
+    def tearDown(self):
+        timing.SERVER_TIMING = False
+
+    def test_nested_phase_is_not_counted_in_outer_phase(self):
+        server_timing = ServerTiming()
+        with server_timing.measure(name='validate'):
+            with server_timing.measure(name='parse'):
+                time.sleep(0.05)
+        phases = server_timing.phases
+        self.assertEqual(['parse', 'validate'], list(phases))
+        self.assertGreaterEqual(phases['parse'], 0.05)
+        self.assertLess(phases['validate'], 0.01)
+
+    def test_web_server_header(self):
+        WebServer.add_filter(slow_filter, paths=['server-timing-test'])
+        try:
+            response = WebServer.app.test_client().post('/server-timing-test/echo', json={'name': 'Dan'})
+        finally:
+            WebServer.web_filters.remove(slow_filter)
+        self.assertEqual(200, response.status_code)
+        phases = parse_header(response.headers['Server-Timing'])
+        self.assertEqual(['filters', 'parse', 'validate', 'handler', 'serialize', 'total'], list(phases))
+        self.assertGreaterEqual(phases['filters'], 20)
+        self.assertGreaterEqual(phases['handler'], 30)
+        self.assertGreaterEqual(phases['total'], 50)
+
+    def test_header_on_validation_errors(self):
+        response = WebServer.app.test_client().post('/server-timing-test/echo', json={})
+        self.assertEqual(400, response.status_code)
+        self.assertIn('validate', parse_header(response.headers['Server-Timing']))
+
+    def test_lambda_header(self):
+        response = aws_lambda_handler(event={
+            'path': '/server-timing-test/echo', 'body': json.dumps({'name': 'Dan'}), 'httpMethod': 'POST'
+        })
+        self.assertEqual(200, response['statusCode'])
+        phases = parse_header(response['headers']['Server-Timing'])
+        self.assertEqual(['parse', 'validate', 'handler', 'serialize', 'total'], list(phases))
+
+    def test_off_by_default(self):
+        timing.SERVER_TIMING = False
+        response = WebServer.app.test_client().post('/server-timing-test/echo', json={'name': 'Dan'})
+        self.assertNotIn('Server-Timing', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
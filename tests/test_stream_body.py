@@ -0,0 +1,145 @@
+import io
+import json
+import time
+import base64
+import unittest
+import tracemalloc
+from quickbe.streams import iter_records, InvalidRequestBody
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler, execute_endpoint
+
+RECORDS = [{'id': i, 'name': f'name {i}', 'tags': ['a', 'é'], 'score': i * 1.5} for i in range(100)]
+
+
+@endpoint(path='stream-body-test/ingest', stream_body=True, validation={
+    'id': {'type': 'integer', 'required': True, 'min': 0},
+    'name': {'type': 'string', 'required': True},
+    'source': {'type': 'string', 'default': 'upload'},
+})
+def ingest(session: HttpSession):
+    valid, invalid, sources = 0, [], set()
+    for index, (record, errors) in enumerate(session.validated_records()):
+        if errors is None:
+            valid += 1
+            sources.add(record['source'])
+        else:
+            invalid.append(index)
+    return {'valid': valid, 'invalid': invalid, 'sources': sorted(sources), 'batch': session.get('batch')}
+
+
+@endpoint(path='stream-body-test/count', stream_body=True)
+def count(session: HttpSession):
+    total = 0
+    for _ in session.records():
+        total += 1
+    return {'count': total}
+
+
+class GeneratedNdjson(io.RawIOBase):
+    """
+    Large NDJSON body produced while it is read, so only the parser can hold it in memory
+    """
+
+    def __init__(self, records_count: int):
+        self._lines = (json.dumps({'id': i, 'payload': 'x' * 200}).encode() + b'\n' for i in range(records_count))
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while len(self._pending) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._pending += line
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+class StreamBodyTestCase(unittest.TestCase):
+
+    def test_iter_records(self):
+        array = json.dumps(RECORDS, indent=2).encode()
+        ndjson = '\n'.join(json.dumps(record) for record in RECORDS).encode()
+        for chunk_size in [1, 7, 1024]:
+            self.assertEqual(RECORDS, list(iter_records(io.BytesIO(array), chunk_size=chunk_size)))
+            self.assertEqual(RECORDS, list(iter_records(io.BytesIO(ndjson), chunk_size=chunk_size)))
+        self.assertEqual([1, 22, 333], list(iter_records(b' [1, 22 ,333] ', chunk_size=2)))
+        self.assertEqual([], list(iter_records(b'')))
+        self.assertEqual([], list(iter_records(b'[]')))
+
+    def test_records_that_span_chunks(self):
+        records = [
+            {'text': 'quote " backslash \\ brackets ] } [ {', 'nested': [[1, {'a': '\\"]'}], []]},
+            'string, with ] comma', 12.5e3, True, None, [],
+        ]
+        body = json.dumps(records).encode()
+        for chunk_size in [1, 2, 3, 5, 64]:
+            self.assertEqual(records, list(iter_records(io.BytesIO(body), chunk_size=chunk_size)))
+
+        big_record = {'items': list(range(200000)), 'text': 'x' * 500000}
+        body = json.dumps([big_record, 1]).encode()
+        start = time.perf_counter()
+        self.assertEqual([big_record, 1], list(iter_records(io.BytesIO(body), chunk_size=64)))
+        self.assertEqual(
+            [big_record, 1],
+            list(iter_records(io.BytesIO(f'{json.dumps(big_record)}\n1'.encode()), chunk_size=64))
+        )
+        # Record is scanned once, not once per chunk
+        self.assertLess(time.perf_counter() - start, 2)
+
+    def test_invalid_body(self):
+        for body in [b'[1, 2', b'[1 2]', b'[1] 2', b'{"id": 1}\n{"id"', b'[\xff]']:
+            with self.assertRaises(InvalidRequestBody):
+                list(iter_records(body, chunk_size=3))
+        with self.assertRaises(InvalidRequestBody):
+            list(iter_records(b'["' + b'x' * 1000 + b'"]', chunk_size=10, max_record_size=100))
+
+    def test_web_server(self):
+        client = WebServer.app.test_client()
+        records = RECORDS[:10] + [{'id': -1, 'name': 'bad'}, {'name': 'no id'}]
+        for data in ['\n'.join(json.dumps(record) for record in records), json.dumps(records)]:
+            response = client.post('/stream-body-test/ingest?batch=b1', data=data)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({'valid': 10, 'invalid': [10, 11], 'sources': ['upload'], 'batch': 'b1'}, response.json)
+
+        response = client.post('/stream-body-test/count', data='[{"id": 1}, oops]')
+        self.assertEqual(400, response.status_code)
+
+    def test_aws_lambda(self):
+        body = '\n'.join(json.dumps(record) for record in RECORDS)
+        response = aws_lambda_handler(event={'path': '/stream-body-test/count', 'body': body})
+        self.assertEqual({'count': 100}, json.loads(response['body']))
+
+        response = aws_lambda_handler(event={
+            'path': '/stream-body-test/count', 'body': base64.b64encode(body.encode()).decode(), 'isBase64Encoded': True
+        })
+        self.assertEqual({'count': 100}, json.loads(response['body']))
+
+        body, _, status = execute_endpoint(path='stream-body-test/count', headers={}, body=RECORDS, parameters={})
+        self.assertEqual((200, {'count': 100}), (status, body))
+
+    def test_bounded_memory(self):
+        records_count = 50000
+        tracemalloc.start()
+        try:
+            body, _, status = execute_endpoint(
+                path='stream-body-test/count', headers={}, body=GeneratedNdjson(records_count=records_count),
+                parameters={}
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual({'count': records_count}, body)
+        # Body is ~11MB, parser keeps about one chunk
+        self.assertLess(peak, 2 * 1024**2)
+
+    def test_stream_body_can_not_be_cached(self):
+        with self.assertRaises(ValueError):
+            @endpoint(path='stream-body-test/cached', stream_body=True, cache=10)
+            def cached(session: HttpSession):
+                return None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import base64
+import unittest
+from quickbe.streams import StreamingBody, CsvEncoder, NdjsonEncoder, ResponseTooLarge
+from quickbe import endpoint, HttpSession, WebServer, aws_lambda_handler, execute_endpoint
+import quickbe.aws_lambda as aws_lambda
+
+ROWS = [{'id': i, 'name': f'name {i}', 'city': 'Tel Aviv, Israel'} for i in range(1000)]
+PRODUCED = []
+
+
+@endpoint(path='stream-response-test/rows')
+def rows(session: HttpSession):
+    session.stream(encoder=session.get('format', 'ndjson'), chunk_size=int(session.get('chunk_size', 1024)))
+
+    def generate():
+        for row in ROWS:
+            PRODUCED.append(row['id'])
+            yield row
+    return generate()
+
+
+@endpoint(path='stream-response-test/text')
+def text(session: HttpSession):
+    session.stream(mimetype='text/plain')
+    return (f'line {i}\n' for i in range(int(session.get('lines', 3))))
+
+
+@endpoint(path='stream-response-test/binary', compress=False)
+def binary(session: HttpSession):
+    session.stream(mimetype='application/octet-stream', chunk_size=0)
+    return iter([b'\x00\x01', b'\xff'])
+
+
+@endpoint(path='stream-response-test/cached', cache={'ttl': 60})
+def cached(session: HttpSession):
+    session.stream(mimetype='text/plain')
+    return iter(['a', 'b'])
+
+
+def _lambda_event(path: str, parameters: dict = None, headers: dict = None) -> dict:
+    return {'path': path, 'body': None, 'queryStringParameters': parameters or {}, 'headers': headers or {}}
+
+
+class StreamEncodersTestCase(unittest.TestCase):
+
+    def test_ndjson(self):
+        body = StreamingBody(iterable=iter(ROWS[:3]), encoder='ndjson').read()
+        self.assertEqual(ROWS[:3], [json.loads(line) for line in body.decode().splitlines()])
+
+    def test_csv_dicts(self):
+        body = StreamingBody(iterable=iter(ROWS), encoder=CsvEncoder(), chunk_size=100).read()
+        parsed = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(len(ROWS), len(parsed))
+        self.assertEqual({'id': '7', 'name': 'name 7', 'city': 'Tel Aviv, Israel'}, parsed[7])
+
+    def test_csv_lists(self):
+        encoder = CsvEncoder(fieldnames=['a', 'b'])
+        self.assertEqual(b'a,b\r\n1,2\r\n', encoder([1, 2]))
+        self.assertEqual(b'3,4\r\n', encoder([3, 4]))
+
+    def test_chunk_size(self):
+        chunks = list(StreamingBody(iterable=iter(['ab', 'cd', 'ef', 'g']), chunk_size=4).chunks())
+        self.assertEqual([b'abcd', b'efg'], chunks)
+        chunks = list(StreamingBody(iterable=iter(['ab', 'cd']), chunk_size=0).chunks())
+        self.assertEqual([b'ab', b'cd'], chunks)
+
+    def test_mimetypes(self):
+        self.assertEqual(NdjsonEncoder.mimetype, StreamingBody(iterable=iter([]), encoder='ndjson').mimetype)
+        self.assertEqual('text/csv', StreamingBody(iterable=iter([]), encoder='csv').mimetype)
+        self.assertEqual('application/octet-stream', StreamingBody(iterable=iter([])).mimetype)
+
+    def test_unknown_encoder(self):
+        with self.assertRaises(ValueError):
+            StreamingBody(iterable=iter([]), encoder='xml')
+
+    def test_item_without_encoder(self):
+        with self.assertRaises(TypeError):
+            StreamingBody(iterable=iter([{'a': 1}])).read()
+
+    def test_read_limit_closes_generator(self):
+        closed = []
+
+        def generate():
+            try:
+                while True:
+                    yield b'x' * 100
+            finally:
+                closed.append(True)
+        with self.assertRaises(ResponseTooLarge):
+            StreamingBody(iterable=generate(), chunk_size=0).read(limit=1000)
+        self.assertEqual([True], closed)
+
+
+class StreamResponseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = WebServer.app.test_client()
+        PRODUCED.clear()
+
+    def test_execute_endpoint_is_lazy(self):
+        body, _, status = execute_endpoint(path='stream-response-test/rows', headers={}, body={}, parameters={})
+        self.assertEqual(200, status)
+        self.assertIsInstance(body, StreamingBody)
+        self.assertEqual([], PRODUCED)
+        self.assertEqual(len(ROWS), len(body.read().splitlines()))
+
+    def test_flask_streams_ndjson(self):
+        response = self.client.get('/stream-response-test/rows', buffered=False)
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual('application/x-ndjson', response.mimetype)
+        self.assertIsNone(response.headers.get('Content-Length'))
+        chunks = response.iter_encoded()
+        next(chunks)
+        # Only rows of the first chunk are produced before it is sent
+        self.assertLess(len(PRODUCED), len(ROWS))
+        rest = b''.join(chunks)
+        self.assertGreater(len(rest), 0)
+        self.assertEqual(len(ROWS), len(PRODUCED))
+        response.close()
+
+    def test_flask_streams_csv(self):
+        response = self.client.get('/stream-response-test/rows?format=csv')
+        self.assertEqual('text/csv', response.mimetype)
+        parsed = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(ROWS), len(parsed))
+
+    def test_flask_text(self):
+        response = self.client.get('/stream-response-test/text')
+        self.assertEqual('text/plain', response.mimetype)
+        self.assertEqual(b'line 0\nline 1\nline 2\n', response.data)
+
+    def test_flask_compressed_stream(self):
+        response = self.client.get('/stream-response-test/rows', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', response.headers.get('Content-Encoding'))
+        import gzip
+        self.assertEqual(len(ROWS), len(gzip.decompress(response.data).splitlines()))
+
+    def test_stream_is_not_cached(self):
+        for _ in range(2):
+            response = self.client.get('/stream-response-test/cached')
+            self.assertEqual(b'ab', response.data)
+
+    def test_lambda_buffers_stream(self):
+        response = aws_lambda_handler(_lambda_event(path='/stream-response-test/rows', parameters={'format': 'csv'}))
+        self.assertEqual(200, response['statusCode'])
+        self.assertEqual('text/csv', response['headers']['Content-Type'])
+        self.assertFalse(response['isBase64Encoded'])
+        self.assertEqual(len(ROWS) + 1, len(response['body'].splitlines()))
+
+    def test_lambda_binary_stream(self):
+        response = aws_lambda_handler(_lambda_event(path='/stream-response-test/binary'))
+        self.assertTrue(response['isBase64Encoded'])
+        self.assertEqual(b'\x00\x01\xff', base64.b64decode(response['body']))
+
+    def test_lambda_payload_limit(self):
+        limit = aws_lambda.AWS_LAMBDA_MAX_PAYLOAD_SIZE
+        aws_lambda.AWS_LAMBDA_MAX_PAYLOAD_SIZE = 1000
+        try:
+            response = aws_lambda_handler(_lambda_event(path='/stream-response-test/rows'))
+        finally:
+            aws_lambda.AWS_LAMBDA_MAX_PAYLOAD_SIZE = limit
+        self.assertEqual(500, response['statusCode'])
+        self.assertIn('payload limit', json.loads(response['body']))
+        # Generator is closed once the limit is reached
+        self.assertLess(len(PRODUCED), len(ROWS))
+
+    def test_batch_item_stream(self):
+        response = self.client.post('/quickbe-batch', json=[{'path': 'stream-response-test/text'}])
+        self.assertEqual('line 0\nline 1\nline 2\n', response.json[0]['body'])
+
+
+if __name__ == '__main__':
+    unittest.main()
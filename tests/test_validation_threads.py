@@ -0,0 +1,61 @@
+import unittest
+from threading import Thread
+from quickbe import endpoint, execute_endpoint, HttpSession
+
+THREADS = 16
+REQUESTS_PER_THREAD = 150
+VALID_CODES = [f'ok-{i}' for i in range(THREADS)]
+
+
+@endpoint(path='validation-threads/cerberus', validation={
+    'code': {'type': 'string', 'regex': '^[a-z0-9-]+$', 'required': True, 'allowed': VALID_CODES},
+    'count': {'type': 'integer', 'coerce': int, 'default': 0}
+})
+def cerberus_fallback(session: HttpSession):
+    return {'code': session.get('code'), 'count': session.get('count')}
+
+
+@endpoint(path='validation-threads/compiled', validation={
+    'code': {'type': 'string', 'required': True, 'allowed': VALID_CODES},
+    'count': {'type': 'integer', 'default': 0}
+})
+def compiled(session: HttpSession):
+    return {'code': session.get('code'), 'count': session.get('count')}
+
+
+class ValidationThreadsTestCase(unittest.TestCase):
+
+    def hammer(self, path: str):
+        failures = []
+
+        def worker(thread_index: int):
+            for i in range(REQUESTS_PER_THREAD):
+                if i % 2 == 0:
+                    code = VALID_CODES[thread_index]
+                    body, _, status = execute_endpoint(
+                        path=path, headers={}, body={'code': code, 'count': i}, parameters={}
+                    )
+                    expected = (200, {'code': code, 'count': i})
+                else:
+                    code = f'bad-{thread_index}-{i}'
+                    body, _, status = execute_endpoint(path=path, headers={}, body={'code': code}, parameters={})
+                    expected = (400, {'code': [f'unallowed value {code}']})
+                if (status, body) != expected:
+                    failures.append(f'Expected {expected}, got {(status, body)}')
+
+        threads = [Thread(target=worker, args=(index,)) for index in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], failures[:10])
+
+    def test_cerberus_fallback_is_reentrant(self):
+        self.hammer(path='validation-threads/cerberus')
+
+    def test_compiled_validation_is_reentrant(self):
+        self.hammer(path='validation-threads/compiled')
+
+
+if __name__ == '__main__':
+    unittest.main()